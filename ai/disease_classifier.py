@@ -1,5 +1,6 @@
 # ai/disease_classifier.py
 import os
+import glob
 import pandas as pd
 import numpy as np
 import torch
@@ -24,9 +25,23 @@ np.random.seed(42)
 # -------------------------------
 # DATA LOADING AND PREPROCESSING
 # -------------------------------
+def read_dataset(file_path):
+    # CSV, Parquet/Arrow files, or a directory of prediction log files
+    if os.path.isdir(file_path):
+        files = sorted(glob.glob(os.path.join(file_path, '*.parquet')))
+        df = pd.concat([pd.read_parquet(f) for f in files], ignore_index=True)
+    elif file_path.endswith('.parquet'):
+        df = pd.read_parquet(file_path)
+    elif file_path.endswith(('.arrow', '.feather')):
+        df = pd.read_feather(file_path)
+    else:
+        df = pd.read_csv(file_path)
+    # Drop metadata columns of the prediction log (_logged_at, _scores, ...)
+    return df.drop(columns=[c for c in df.columns if c.startswith('_')])
+
 def load_and_preprocess_data(file_path):
-    # Load the CSV file
-    df = pd.read_csv(file_path)
+    # Load the dataset
+    df = read_dataset(file_path)
     
     # Store feature columns for later reference
     feature_columns = df.drop(['patient_id', 'diagnosis'], axis=1).columns.tolist()
@@ -225,9 +240,10 @@ def load_model_and_artifacts():
 # -------------------------------
 # PREDICTION FUNCTION FOR API
 # -------------------------------
-def predict_disease_api(model, scaler, label_encoder, feature_columns, input_data):
-    # Create DataFrame with correct feature order
-    input_df = pd.DataFrame([input_data], columns=feature_columns)
+def predict_batch_probabilities(model, scaler, feature_columns, input_df):
+    """Class probabilities (float32, label encoder order), one row per input record."""
+    # Keep the feature columns in training order
+    input_df = input_df.reindex(columns=feature_columns)
     
     # Preprocess sex feature
     input_df['sex'] = input_df['sex'].map({'M': 0, 'F': 1}).fillna(0)
@@ -241,10 +257,17 @@ def predict_disease_api(model, scaler, label_encoder, feature_columns, input_dat
     # Get predictions
     with torch.no_grad():
         probabilities = model.predict(input_tensor)
+    return probabilities.numpy()
+
+def predict_probabilities(model, scaler, feature_columns, input_data):
+    """Class probabilities (float32, label encoder order) for one input record."""
+    return predict_batch_probabilities(model, scaler, feature_columns, pd.DataFrame([input_data]))[0]
+
+def predict_disease_api(model, scaler, label_encoder, feature_columns, input_data):
+    probabilities = predict_probabilities(model, scaler, feature_columns, input_data)
     
     # Process output
     class_names = label_encoder.classes_
-    probabilities = probabilities.numpy()[0]
     confidence_scores = {class_names[i]: float(probabilities[i]) for i in range(len(class_names))}
     predicted_class = class_names[np.argmax(probabilities)]
     
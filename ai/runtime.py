@@ -0,0 +1,121 @@
+# -------------------------------
+# INFERENCE RESOURCE MANAGER
+# -------------------------------
+# Each worker process gets a share of the host's CPU budget: torch intra-op
+# threads and the OpenMP/BLAS pools used by NumPy and scikit-learn are all
+# limited to that share, so N workers together do not start N x cores
+# threads. Optionally each worker is pinned to its own slice of cores.
+#
+# OpenMP and BLAS read their *_NUM_THREADS variables once, when the library
+# is loaded, so `prepare` runs before anything imports NumPy or torch (at
+# the top of app/__init__.py) and `configure` runs from create_app, when a
+# worker starts and before the model is loaded. torch and threadpoolctl are
+# imported inside the methods for that reason.
+import fcntl
+import os
+
+THREAD_ENV_VARS = ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'NUMEXPR_NUM_THREADS')
+
+def available_cores():
+    return sorted(os.sched_getaffinity(0))
+
+def threads_per_worker(cores, workers):
+    return max(1, cores // max(1, workers))
+
+def thread_budget(cores=None, workers=1, threads=None):
+    """(cores, workers, threads per worker) for this host."""
+    host_cores = len(available_cores())
+    cores = min(cores or host_cores, host_cores)
+    workers = max(1, workers)
+    return cores, workers, threads or threads_per_worker(cores, workers)
+
+def _task_ids():
+    try:
+        return [int(tid) for tid in os.listdir('/proc/self/task')]
+    except OSError:
+        return [0]
+
+class InferenceRuntime:
+    def __init__(self):
+        self._pid = None
+        self._limits = None
+        self._slot_file = None
+        self.cores = None
+        self.workers = None
+        self.threads = None
+        self.cpus = None
+        self.slot = None
+
+    def prepare(self, cores=None, workers=1, threads=None):
+        """Export the per-worker thread count for the OpenMP/BLAS pools loaded after this call."""
+        _, _, threads = thread_budget(cores, workers, threads)
+        for name in THREAD_ENV_VARS:
+            os.environ[name] = str(threads)
+
+    def configure(self, cores=None, workers=1, threads=None, pin=False, slot_dir='/tmp'):
+        """Apply the thread budget to this process; cheap no-op if already done in this pid."""
+        if self._pid == os.getpid():
+            return self
+        import torch
+        from threadpoolctl import threadpool_limits
+
+        host_cpus = available_cores()
+        self.cores, self.workers, self.threads = thread_budget(cores, workers, threads)
+
+        for name in THREAD_ENV_VARS:
+            os.environ[name] = str(self.threads)
+        torch.set_num_threads(self.threads)
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            # Solo se puede fijar antes del primer trabajo paralelo de torch
+            pass
+        self._limits = threadpool_limits(limits=self.threads)
+
+        self.cpus = None
+        if pin:
+            self._pin(host_cpus, slot_dir)
+        self._pid = os.getpid()
+        return self
+
+    def _pin(self, host_cpus, slot_dir):
+        # Cada worker reclama una ranura con un lock de archivo (se libera al morir el proceso)
+        slots = max(1, self.cores // self.threads)
+        for slot in range(slots):
+            handle = open(os.path.join(slot_dir, f'medibax-cpu-slot-{slot}.lock'), 'w')
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                handle.close()
+                continue
+            if self._slot_file is not None:
+                self._slot_file.close()
+            self._slot_file = handle
+            self.slot = slot
+            self.cpus = host_cpus[slot * self.threads:(slot + 1) * self.threads]
+            # sched_setaffinity(0) solo fija el hilo que llama: se fijan todos los hilos
+            # ya creados, y los que se creen despues heredan la mascara de su creador
+            for tid in _task_ids():
+                try:
+                    os.sched_setaffinity(tid, self.cpus)
+                except ProcessLookupError:
+                    # El hilo termino entre el listado y la llamada
+                    pass
+            return
+        # Mas workers que ranuras: se queda sin fijar
+
+    def stats(self):
+        import torch
+        from threadpoolctl import threadpool_info
+        return {
+            'pid': self._pid,
+            'cores': self.cores,
+            'workers': self.workers,
+            'threads': self.threads,
+            'torch_threads': torch.get_num_threads(),
+            'pools': [{'api': pool['internal_api'], 'threads': pool['num_threads']} for pool in threadpool_info()],
+            'slot': self.slot,
+            'cpus': self.cpus,
+        }
+
+runtime = InferenceRuntime()
@@ -6,19 +6,44 @@ from flask_login import LoginManager
 from flask_cors import CORS
 from dotenv import load_dotenv
 from flask_jwt_extended import JWTManager
+from sqlalchemy import event
 load_dotenv()
 from config import Config
+from ai.runtime import runtime
+# Hilos por worker en el entorno antes de importar NumPy/torch: OpenMP y BLAS solo lo leen al cargarse
+runtime.prepare(cores=Config.INFERENCE_CPU_CORES, workers=Config.INFERENCE_WORKERS, threads=Config.INFERENCE_THREADS)
+import click
+from app.cache import EntityCache
+from app.audit import AuditTrail
+from app.prediction_log import PredictionLog
+from app.admission import AdmissionController
+from app.revocation import RevocationList
+from app.epi_stats import EpiStats
 
 db = SQLAlchemy()
 api = Api()
 bcrypt = Bcrypt()
 jwt = JWTManager()
 login_manager = LoginManager()
+cache = EntityCache()
+audit = AuditTrail()
+prediction_log = PredictionLog()
+admission = AdmissionController()
+revocation = RevocationList()
+epi_stats = EpiStats()
 
-def create_app():
+def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA foreign_keys=ON')
+    cursor.close()
+
+def create_app(config=None):
     app = Flask(__name__)
     
     app.config.from_object(Config)
+    # Valores que reemplazan a Config (p. ej. los procesos de la cola de trabajos)
+    if config:
+        app.config.update(config)
     
     # Inicializacion de servicios
     db.init_app(app)
@@ -26,12 +51,30 @@ def create_app():
     bcrypt.init_app(app)
     jwt.init_app(app)
     login_manager.init_app(app)
+    cache.init_app(app)
+    audit.init_app(app)
+    prediction_log.init_app(app)
+    admission.init_app(app)
+    revocation.init_app(app, jwt)
+    epi_stats.init_app(app)
     CORS(app, resources={r"/*": {"origins": "*"}})  
     
-    # Inicializacion de modelos
+    # Conexion a la base de datos; el esquema se crea con `flask schema upgrade`
+    from app.migrations import check_schema
     with app.app_context():
-        from app.models import User
-        db.create_all()
+        if db.engine.dialect.name == 'sqlite':
+            # SQLite solo aplica ON DELETE CASCADE con foreign_keys activado por conexion
+            event.listen(db.engine, 'connect', _enable_sqlite_foreign_keys)
+        check_schema(app)
+
+    # Presupuesto de hilos (y CPUs) del worker antes de cargar el modelo en app.ai.
+    # Los comandos de la CLI no fijan CPUs para no ocupar las ranuras de los workers.
+    runtime.configure(
+        cores=app.config.get('INFERENCE_CPU_CORES'),
+        workers=app.config.get('INFERENCE_WORKERS', 1),
+        threads=app.config.get('INFERENCE_THREADS'),
+        pin=app.config.get('INFERENCE_PIN_CPUS', False) and click.get_current_context(silent=True) is None,
+    )
     
     # Inicializacion de rutas
     from app.routes import init_routes
@@ -43,5 +86,20 @@ def create_app():
     init_expediente_routes(api)
     init_ai_routes(api)
 
+    from app.charts import init_charts
+    from app.public import init_public_routes
+    from app.migrations import init_migrations
+    from app.archive import init_archive
+    from app.jobs import init_jobs
+    from app.revocation import init_revocation
+    from app.epi_stats import init_epi_stats
+    init_charts(app)
+    init_migrations(app)
+    init_archive(app)
+    init_public_routes(app, api)
+    init_jobs(app, api)
+    init_revocation(app)
+    init_epi_stats(app)
+
     
     return app
\ No newline at end of file
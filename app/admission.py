@@ -0,0 +1,210 @@
+"""
+Admission control with per-namespace lanes.
+
+Every request routed to the `expediente`, `auth` or `AI` namespaces takes a
+slot in its lane before it runs. Each lane has its own concurrency limit,
+wait queue and wait budget; all lanes also share the worker's
+ADMISSION_MAX_CONCURRENT slots. Freed slots go to the waiting request with
+the best (priority, arrival) order, so expediente reads are served ahead of
+queued logins and predictions.
+
+A request is shed with 503 + Retry-After when its lane queue is full, when
+its expected wait (requests ahead / lane limit x the lane's smoothed service
+time) is over the lane budget, or when it actually waits longer than that.
+"""
+import math
+import threading
+import time
+from itertools import count
+
+import orjson
+from flask import Response, g, request
+
+EWMA_ALPHA = 0.2
+
+
+class Lane:
+    def __init__(self, name, priority, limit, queue, budget):
+        self.name = name
+        self.priority = priority
+        self.limit = limit
+        self.queue = queue
+        self.budget = budget
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.shed_queue_full = 0
+        self.shed_deadline = 0
+        self.service_time = 0.0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+
+    def observe(self, attr, value):
+        current = getattr(self, attr)
+        setattr(self, attr, value if current == 0.0 else current + EWMA_ALPHA * (value - current))
+
+    def stats(self):
+        return {
+            'priority': self.priority,
+            'limit': self.limit,
+            'queue_size': self.queue,
+            'budget_s': self.budget,
+            'active': self.active,
+            'queued': self.waiting,
+            'admitted': self.admitted,
+            'shed': self.shed_queue_full + self.shed_deadline,
+            'shed_queue_full': self.shed_queue_full,
+            'shed_deadline': self.shed_deadline,
+            'service_ms_ewma': self.service_time * 1000,
+            'wait_ms_ewma': self.wait_time * 1000,
+            'max_wait_ms': self.max_wait * 1000,
+        }
+
+
+class _Ticket:
+    __slots__ = ('lane', 'order', 'granted', 'started')
+
+    def __init__(self, lane, seq):
+        self.lane = lane
+        self.order = (lane.priority, seq)
+        self.granted = False
+        self.started = None
+
+
+class AdmissionController:
+    def __init__(self):
+        self.enabled = False
+        self.lanes = {}
+        self.max_concurrent = 0
+        self.active = 0
+        self._waiting = []
+        self._seq = count()
+        self._cond = threading.Condition()
+
+    def init_app(self, app):
+        self.enabled = app.config.get('ADMISSION_ENABLED', True)
+        self.max_concurrent = app.config.get('ADMISSION_MAX_CONCURRENT', 32)
+        self.lanes = {
+            name: Lane(name, **settings)
+            for name, settings in app.config.get('ADMISSION_LANES', {}).items()
+        }
+        if self.enabled:
+            app.before_request(self._before_request)
+            app.teardown_request(self._teardown_request)
+
+    def lane_for(self, endpoint):
+        # Los endpoints de flask_restx se llaman '<namespace>_<recurso>'
+        if not endpoint:
+            return None
+        return self.lanes.get(endpoint.split('_', 1)[0])
+
+    # -------------------------------
+    # HOOKS
+    # -------------------------------
+    def _before_request(self):
+        if request.method == 'OPTIONS':
+            return None
+        lane = self.lane_for(request.endpoint)
+        if lane is None:
+            return None
+        ticket, retry_after = self.acquire(lane)
+        if ticket is None:
+            body = orjson.dumps({'message': 'Service overloaded, retry later', 'lane': lane.name})
+            return Response(body, status=503, headers={'Retry-After': str(retry_after)}, mimetype='application/json')
+        g.admission_ticket = ticket
+        return None
+
+    def _teardown_request(self, exc):
+        ticket = g.pop('admission_ticket', None)
+        if ticket is not None:
+            self.release(ticket)
+
+    # -------------------------------
+    # SLOTS
+    # -------------------------------
+    def _has_slot(self, lane):
+        return lane.active < lane.limit and self.active < self.max_concurrent
+
+    def _grant(self, ticket):
+        ticket.granted = True
+        ticket.started = time.monotonic()
+        ticket.lane.active += 1
+        ticket.lane.admitted += 1
+        self.active += 1
+
+    def _expected_wait(self, lane):
+        ahead = sum(1 for ticket in self._waiting if ticket.order[0] <= lane.priority)
+        return (ahead + 1) / lane.limit * lane.service_time
+
+    def acquire(self, lane):
+        """Wait for a slot in `lane`. Returns (ticket, None) or (None, retry_after_seconds)."""
+        arrived = time.monotonic()
+        with self._cond:
+            ticket = _Ticket(lane, next(self._seq))
+            # Solo se adelanta si nadie con mejor orden puede usar el slot
+            if self._has_slot(lane) and not any(t.lane.active < t.lane.limit for t in self._waiting):
+                self._grant(ticket)
+                lane.observe('wait_time', 0.0)
+                return ticket, None
+
+            expected = self._expected_wait(lane)
+            if lane.waiting >= lane.queue:
+                lane.shed_queue_full += 1
+                return None, self._retry_after(expected)
+            if expected > lane.budget:
+                lane.shed_deadline += 1
+                return None, self._retry_after(expected)
+
+            deadline = arrived + lane.budget
+            self._waiting.append(ticket)
+            lane.waiting += 1
+            try:
+                while not ticket.granted:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        lane.shed_deadline += 1
+                        return None, self._retry_after(self._expected_wait(lane))
+                    self._cond.wait(remaining)
+            finally:
+                if not ticket.granted:
+                    self._waiting.remove(ticket)
+                lane.waiting -= 1
+
+        waited = ticket.started - arrived
+        lane.observe('wait_time', waited)
+        lane.max_wait = max(lane.max_wait, waited)
+        return ticket, None
+
+    def release(self, ticket):
+        with self._cond:
+            lane = ticket.lane
+            lane.active -= 1
+            self.active -= 1
+            lane.observe('service_time', time.monotonic() - ticket.started)
+            self._dispatch()
+
+    def _dispatch(self):
+        granted = False
+        for ticket in sorted(self._waiting, key=lambda t: t.order):
+            if self.active >= self.max_concurrent:
+                break
+            if ticket.lane.active < ticket.lane.limit:
+                self._waiting.remove(ticket)
+                self._grant(ticket)
+                granted = True
+        if granted:
+            self._cond.notify_all()
+
+    @staticmethod
+    def _retry_after(expected):
+        return max(1, math.ceil(expected))
+
+    def stats(self):
+        with self._cond:
+            return {
+                'enabled': self.enabled,
+                'max_concurrent': self.max_concurrent,
+                'active': self.active,
+                'queued': len(self._waiting),
+                'lanes': {name: lane.stats() for name, lane in self.lanes.items()},
+            }
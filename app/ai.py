@@ -1,6 +1,16 @@
 from flask_restx import Namespace, Resource, fields
-from flask import request
-from ai.disease_classifier import load_model_and_artifacts, predict_disease_api
+from flask import current_app, request
+from werkzeug.exceptions import HTTPException
+from ai.disease_classifier import load_model_and_artifacts, predict_probabilities, predict_batch_probabilities
+from app import db, prediction_log, epi_stats
+from app.conditional import conditional_response, make_etag
+from app.negotiation import negotiate, negotiated_response
+from app.validation import compile_model
+from app.models import Paciente
+from sqlalchemy import select
+from datetime import date, datetime, timedelta
+import numpy as np
+import pandas as pd
 import os
 
 # Initialize namespace
@@ -16,10 +26,14 @@ except Exception as e:
 
 # Load model artifacts once during startup
 model, scaler, label_encoder, feature_columns = load_model_and_artifacts()
+class_names = [str(name) for name in label_encoder.classes_]
+classes_etag = make_etag('classes', *class_names)
+prediction_log.configure(feature_columns, class_names)
+epi_stats.configure(class_names)
 
 # Define API models for Swagger documentation
 prediction_input = ai_ns.model('PredictionInput', {
-    'age': fields.Integer(required=True, example=35),
+    'age': fields.Integer(required=True, example=35, min=0, max=120),
     'sex': fields.String(required=True, enum=['M', 'F'], example='M'),
     'fever': fields.Integer(required=True, example=0, min=0, max=1),
     'sore_throat': fields.Integer(required=True, example=0, min=0, max=1),
@@ -59,55 +73,234 @@ prediction_input = ai_ns.model('PredictionInput', {
     'weight_loss': fields.Integer(required=True, example=0, min=0, max=1),
     'insomnia': fields.Integer(required=True, example=0, min=0, max=1),
     'sweating': fields.Integer(required=True, example=0, min=0, max=1),
-    'symptom_duration_days': fields.Integer(required=True, example=3)
+    'symptom_duration_days': fields.Integer(required=True, example=3, min=0, max=365),
+    'id_paciente': fields.Integer(min=1, description='Patient being evaluated; counted in /api/ai/stats by region')
 })
 
+# Validador compilado una vez; revisa requeridos, banderas 0/1, rangos y sexo
+prediction_validator = compile_model(prediction_input)
+
 prediction_response = ai_ns.model('PredictionResponse', {
     'predicted_disease': fields.String,
     'confidence_scores': fields.Raw(example={'disease1': 0.95, 'disease2': 0.05})
 })
 
+def parse_top_k(value):
+    if value is None:
+        return None
+    try:
+        top_k = int(value)
+    except ValueError:
+        raise ValueError("top_k must be an integer")
+    if not 1 <= top_k <= len(class_names):
+        raise ValueError(f"top_k must be between 1 and {len(class_names)}")
+    return top_k
+
+def prediction_response_for(probabilities, top_k=None):
+    """Negotiated prediction response; the columnar variant sends class indices and float32 scores."""
+    best = int(np.argmax(probabilities))
+    order = np.argsort(probabilities)[::-1][:top_k] if top_k else np.arange(len(probabilities))
+
+    def columnar():
+        body = {'predicted': best, 'scores': probabilities[order]}
+        if top_k:
+            body['classes'] = order.tolist()
+        return body
+
+    return negotiated_response({
+        'predicted_disease': class_names[best],
+        'confidence_scores': {class_names[i]: float(probabilities[i]) for i in order}
+    }, columnar=columnar)
+
+def batch_prediction_response_for(probabilities, top_k=None):
+    """Negotiated response for an array payload: one prediction per record, in order."""
+    best = probabilities.argmax(axis=1)
+    order = np.argsort(-probabilities, axis=1, kind='stable')[:, :top_k] if top_k else None
+
+    def columnar():
+        # scores: matriz float32 por filas (n_registros x n_clases, o x top_k)
+        if order is None:
+            return {'predicted': best.tolist(), 'scores': probabilities}
+        return {'predicted': best.tolist(), 'scores': np.take_along_axis(probabilities, order, axis=1),
+                'classes': order.tolist()}
+
+    def rows():
+        for i, row in enumerate(probabilities):
+            indices = order[i] if order is not None else range(len(row))
+            yield {
+                'predicted_disease': class_names[best[i]],
+                'confidence_scores': {class_names[j]: float(row[j]) for j in indices}
+            }
+
+    return negotiated_response(list(rows()), columnar=columnar)
+
+def validate_prediction_payload(data, max_items=None):
+    """Normalize `sex` and return the validation errors of one record or a list of records."""
+    for record in data if isinstance(data, list) else [data]:
+        if isinstance(record, dict) and isinstance(record.get('sex'), str):
+            record['sex'] = record['sex'].upper()
+    return prediction_validator.validate(data, many=True, max_items=max_items)
+
+def patient_regions(records, many):
+    """(estado, ciudad) of each record's paciente, None without `id_paciente`; plus errors for unknown ones."""
+    ids = {record['id_paciente'] for record in records if record.get('id_paciente') is not None}
+    known = {}
+    if ids:
+        # Una sola consulta por lote, sin importar cuantos registros traiga
+        known = {id_paciente: (estado, ciudad) for id_paciente, estado, ciudad in db.session.execute(
+            select(Paciente.id_paciente, Paciente.estado, Paciente.ciudad).where(Paciente.id_paciente.in_(ids))
+        )}
+    regions, errors = [], {}
+    for i, record in enumerate(records):
+        id_paciente = record.get('id_paciente')
+        region = known.get(id_paciente) if id_paciente is not None else None
+        if id_paciente is not None and region is None:
+            errors[f'[{i}].id_paciente' if many else 'id_paciente'] = 'Patient not found'
+        regions.append(region)
+    return regions, errors
+
+def record_predictions(records, probabilities, regions):
+    """Feed the prediction log and the epidemiological counts."""
+    for record, row, region in zip(records, probabilities, regions):
+        prediction_log.record(record, row, id_paciente=record.get('id_paciente'))
+        if region is not None:
+            epi_stats.record(int(row.argmax()), *region)
+
+def parse_day(value, name):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a date (YYYY-MM-DD)")
+
 @ai_ns.route('/predict')
 class DiseasePredictor(Resource):
     @ai_ns.expect(prediction_input)
-    @ai_ns.marshal_with(prediction_response)
-    @ai_ns.doc(responses={
+    @ai_ns.response(200, 'Success', prediction_response)
+    @ai_ns.doc(params={'top_k': 'Only return the k most likely diseases'}, responses={
         400: 'Invalid input format',
         500: 'Internal server error'
     })
     def post(self):
         """
         Make disease prediction based on symptoms
+
+        Send one record or a list of up to PREDICT_MAX_BATCH records; a list
+        gets a list of predictions in the same order. Every invalid field is
+        reported in `errors` (keys like `[3].fever` for lists).
+
+        Send `Accept: application/msgpack` for MessagePack, or
+        `application/vnd.medibax.columnar+json` / `+msgpack` for class indices
+        and float32 scores (names are listed by GET /api/ai/classes).
         """
         try:
-            data = request.json
-            
-            # Validate required features
-            missing_features = [feat for feat in feature_columns if feat not in data]
-            if missing_features:
-                ai_ns.abort(400, f"Missing required features: {missing_features}")
+            top_k = parse_top_k(request.args.get('top_k'))
+            data = request.get_json(silent=True)
 
-            # Ensure proper data types
-            try:
-                data['sex'] = str(data['sex']).upper()
-            except KeyError:
-                ai_ns.abort(400, "Sex field is required")
+            # Todos los errores de validacion en una sola respuesta
+            errors = validate_prediction_payload(data, current_app.config.get('PREDICT_MAX_BATCH', 1000))
+            if errors:
+                ai_ns.abort(400, 'Input payload validation failed', errors=errors)
+
+            many = isinstance(data, list)
+            records = data if many else [data]
+            regions, errors = patient_regions(records, many)
+            if errors:
+                ai_ns.abort(400, 'Input payload validation failed', errors=errors)
 
             # Make prediction
-            prediction = predict_disease_api(
+            if many:
+                probabilities = predict_batch_probabilities(
+                    model=model,
+                    scaler=scaler,
+                    feature_columns=feature_columns,
+                    input_df=pd.DataFrame(data)
+                )
+                record_predictions(records, probabilities, regions)
+                return batch_prediction_response_for(probabilities, top_k)
+
+            probabilities = predict_probabilities(
                 model=model,
                 scaler=scaler,
-                label_encoder=label_encoder,
                 feature_columns=feature_columns,
                 input_data=data
             )
+            record_predictions(records, [probabilities], regions)
             
-            return prediction
+            return prediction_response_for(probabilities, top_k)
 
+        except HTTPException:
+            raise
         except ValueError as ve:
             ai_ns.abort(400, str(ve))
         except Exception as e:
             ai_ns.abort(500, str(e))
 
+@ai_ns.route('/classes')
+class DiseaseClasses(Resource):
+    @ai_ns.doc(responses={304: 'Not modified'})
+    def get(self):
+        """
+        Disease names in model order (the index space of columnar predictions)
+        """
+        return conditional_response(make_etag(classes_etag, negotiate()), None,
+                                    lambda: negotiated_response({'classes': class_names}))
+
+@ai_ns.route('/stats')
+class DiseaseStats(Resource):
+    @ai_ns.doc(params={
+        'desde': 'First day (YYYY-MM-DD, inclusive; default 30 days before hasta)',
+        'hasta': 'Last day (YYYY-MM-DD, exclusive; default tomorrow, UTC)',
+        'estado': 'Only patients of this estado',
+        'ciudad': 'Only patients of this ciudad (requires estado)',
+        'disease': 'Only this predicted disease',
+        'group_by': 'day (default), estado or ciudad',
+    }, responses={400: 'Invalid parameters'})
+    def get(self):
+        """
+        Predicted disease counts by region and day
+
+        Counts predictions made with an `id_paciente`, by the paciente's
+        estado/ciudad and the UTC day of the prediction. Answered from
+        in-memory counters, without reading predictions or pacientes.
+        """
+        args = request.args
+        try:
+            hasta = parse_day(args['hasta'], 'hasta') if 'hasta' in args else datetime.utcnow().date() + timedelta(days=1)
+            desde = parse_day(args['desde'], 'desde') if 'desde' in args else hasta - timedelta(days=30)
+        except ValueError as ve:
+            ai_ns.abort(400, str(ve))
+        max_days = current_app.config.get('EPI_STATS_MAX_DAYS', 366)
+        if not 0 < (hasta - desde).days <= max_days:
+            ai_ns.abort(400, f"desde must be before hasta and the range at most {max_days} days")
+        estado, ciudad = args.get('estado'), args.get('ciudad')
+        if ciudad is not None and estado is None:
+            ai_ns.abort(400, "ciudad requires estado")
+        group_by = args.get('group_by', 'day')
+        if group_by not in ('day', 'estado', 'ciudad'):
+            ai_ns.abort(400, "group_by must be day, estado or ciudad")
+        disease = args.get('disease')
+        if disease is not None and disease not in class_names:
+            ai_ns.abort(400, f"Unknown disease: {disease}")
+
+        total, groups = epi_stats.query(desde, hasta, estado, ciudad, group_by)
+        indices = [class_names.index(disease)] if disease else range(len(class_names))
+
+        def summary(counts):
+            return {
+                'total': int(sum(counts[i] for i in indices)),
+                'by_disease': {class_names[i]: int(counts[i]) for i in indices if counts[i]},
+            }
+
+        return negotiated_response({
+            'desde': desde.isoformat(),
+            'hasta': hasta.isoformat(),
+            'estado': estado,
+            'ciudad': ciudad,
+            'group_by': group_by,
+            **summary(total),
+            'groups': {group: summary(counts) for group, counts in groups.items()
+                       if any(counts[i] for i in indices)},
+        })
+
 def init_ai_routes(api_instance):
     api_instance.add_namespace(ai_ns)
\ No newline at end of file
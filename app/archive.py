@@ -0,0 +1,84 @@
+"""
+Hot/cold archival of the clinical history tables.
+
+`flask archive run` moves rows older than ARCHIVE_AFTER_DAYS from
+`modificaciones_expedientes` and `historias_clinicas` into their `_archivo`
+tables in small batches: each batch picks primary keys from the fecha index,
+copies them with INSERT ... SELECT and deletes them in its own short
+transaction, so the hot table is never locked for long. Readers fall through
+to the archive only when a request can reach rows older than the cutoff
+(see `app/pagination.py` and `app/conditional.py`).
+"""
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import delete, insert, select
+
+from . import db
+from .models import ARCHIVE_MODELS, ModificacionExpediente, HistoriaClinica
+
+archive_cli = AppGroup('archive', help='Archivo historico de tablas clinicas.')
+
+FECHA_COLUMNS = {
+    ModificacionExpediente: ModificacionExpediente.fecha_modificacion,
+    HistoriaClinica: HistoriaClinica.fecha_registro,
+}
+
+
+def archive_cutoff():
+    """Rows with fecha before this may live in the archive tables."""
+    return datetime.utcnow() - timedelta(days=current_app.config.get('ARCHIVE_AFTER_DAYS', 730))
+
+
+def may_reach_archive(model, desde=None):
+    return model in ARCHIVE_MODELS and (desde is None or desde < archive_cutoff())
+
+
+def archive_model(model, cutoff, batch_size=1000, pause=0.1, max_batches=None, log=print):
+    archive = ARCHIVE_MODELS[model]
+    fecha = FECHA_COLUMNS[model]
+    pk = model.__mapper__.primary_key[0]
+    hot, cold = model.__table__, archive.__table__
+    columns = [column.name for column in hot.columns]
+    moved = batches = 0
+    while max_batches is None or batches < max_batches:
+        ids = db.session.execute(
+            select(pk).where(fecha < cutoff).order_by(fecha).limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            break
+        db.session.execute(insert(cold).from_select(
+            columns, select(*(hot.c[name] for name in columns)).where(hot.c[pk.key].in_(ids))))
+        db.session.execute(delete(hot).where(hot.c[pk.key].in_(ids)))
+        db.session.commit()
+        moved += len(ids)
+        batches += 1
+        log(f'  {hot.name}: {moved} filas archivadas')
+        if pause:
+            time.sleep(pause)
+    return moved
+
+
+@archive_cli.command('run')
+@click.option('--table', 'tables', multiple=True, type=click.Choice([m.__tablename__ for m in ARCHIVE_MODELS]),
+              help='Tabla a archivar (por defecto todas).')
+@click.option('--batch-size', type=int, help='Filas por lote (por defecto ARCHIVE_BATCH_SIZE).')
+@click.option('--max-batches', type=int, help='Detenerse despues de este numero de lotes.')
+def run_command(tables, batch_size, max_batches):
+    """Mueve al archivo las filas mas antiguas que ARCHIVE_AFTER_DAYS."""
+    cutoff = archive_cutoff()
+    batch_size = batch_size or current_app.config.get('ARCHIVE_BATCH_SIZE', 1000)
+    pause = current_app.config.get('ARCHIVE_PAUSE', 0.1)
+    click.echo(f'Archivando filas anteriores a {cutoff.isoformat()}')
+    for model in ARCHIVE_MODELS:
+        if tables and model.__tablename__ not in tables:
+            continue
+        moved = archive_model(model, cutoff, batch_size, pause, max_batches, log=click.echo)
+        click.echo(f'{model.__tablename__}: {moved} filas archivadas')
+
+
+def init_archive(app):
+    app.cli.add_command(archive_cli)
@@ -0,0 +1,263 @@
+"""
+Write-behind audit trail for paciente and expediente mutations.
+
+`audit.record()` appends the event to a per-process journal file (so it
+survives a crash) and puts it on a bounded in-memory queue. A background
+thread rotates the journal and persists the queued events into
+`modificaciones_expedientes` with batched multi-row inserts, so write
+endpoints never pay an extra commit for auditing. If the queue is full the
+event is kept only in the journal and the flusher reads that segment back
+from disk instead. Segments that fail to persist are retried, and journals
+left behind by dead processes are replayed on startup.
+
+Events are rows of `modificaciones_expedientes`, which are removed with
+their expediente by ON DELETE CASCADE, so deletions are not audited here.
+Events about a paciente are resolved to its expedientes when they are
+recorded, not when they are flushed: an expediente created in between does
+not receive earlier events.
+"""
+import atexit
+import glob
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+import orjson
+from sqlalchemy import insert, select
+
+logger = logging.getLogger(__name__)
+
+DESCRIPCION_MAX = 120
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class AuditTrail:
+    def __init__(self):
+        self.app = None
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pid = None
+        self._boot = None
+        self._journal = None
+        self._thread = None
+        self._overflow = False
+        self.recorded = 0
+        self.spilled = 0
+        self.persisted = 0
+        self.batches = 0
+        self.failures = 0
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('AUDIT_ENABLED', True)
+        self.queue = queue.Queue(maxsize=app.config.get('AUDIT_QUEUE_SIZE', 10000))
+        self.batch_size = app.config.get('AUDIT_BATCH_SIZE', 500)
+        self.flush_interval = app.config.get('AUDIT_FLUSH_INTERVAL', 2.0)
+        self.fsync = app.config.get('AUDIT_FSYNC', False)
+        self.spill_dir = app.config.get('AUDIT_SPILL_DIR', '/tmp/medibax_audit')
+
+    # -------------------------------
+    # PRODUCTOR
+    # -------------------------------
+    @staticmethod
+    def expedientes_of(paciente_ids):
+        """{id_paciente: [id_expediente, ...]} for the given pacientes, in one query."""
+        from . import db
+        from .models import Expediente
+        by_paciente = {}
+        for id_expediente, id_paciente in db.session.execute(
+                select(Expediente.id_expediente, Expediente.id_paciente)
+                .where(Expediente.id_paciente.in_(paciente_ids))):
+            by_paciente.setdefault(id_paciente, []).append(id_expediente)
+        return by_paciente
+
+    def record(self, descripcion, id_expediente=None, id_paciente=None, id_expedientes=None):
+        """
+        Queue an audit event for an expediente. Events with only `id_paciente` are
+        recorded on each of its current expedientes (or on `id_expedientes`, when the
+        caller already resolved them); a paciente without expedientes records nothing.
+        """
+        if not self.enabled:
+            return
+        if id_expedientes is None:
+            if id_expediente is not None:
+                id_expedientes = [id_expediente]
+            else:
+                id_expedientes = self.expedientes_of([id_paciente]).get(id_paciente, [])
+        if not id_expedientes:
+            return
+        event = {
+            'id_expedientes': list(id_expedientes),
+            'descripcion': descripcion[:DESCRIPCION_MAX],
+            'fecha_modificacion': datetime.utcnow().isoformat(),
+        }
+        line = orjson.dumps(event) + b'\n'
+        with self._lock:
+            self._ensure_started()
+            self._journal.write(line)
+            self._journal.flush()
+            if self.fsync:
+                os.fsync(self._journal.fileno())
+            self.recorded += 1
+            try:
+                self.queue.put_nowait(event)
+            except queue.Full:
+                # El evento ya esta en el journal; el flusher lo leera desde disco.
+                self.spilled += 1
+                self._overflow = True
+        if self.queue.qsize() >= self.batch_size:
+            self._wakeup.set()
+
+    def _owner(self):
+        # PID y un nonce por arranque: un proceso reiniciado con el mismo PID (PID 1 en un
+        # contenedor) no confunde el journal del proceso anterior con el suyo.
+        return f'audit-{self._pid}-{self._boot}'
+
+    def _journal_path(self):
+        return os.path.join(self.spill_dir, f'{self._owner()}.journal')
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        # Primer uso en este proceso (o despues de un fork): journal y flusher propios.
+        os.makedirs(self.spill_dir, exist_ok=True)
+        self._pid = os.getpid()
+        self._boot = os.urandom(4).hex()
+        self.queue = queue.Queue(maxsize=self.queue.maxsize)
+        self._journal = open(self._journal_path(), 'ab')
+        self._thread = threading.Thread(target=self._run, name='audit-flusher', daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    # -------------------------------
+    # FLUSHER
+    # -------------------------------
+    def _run(self):
+        self.replay()
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Audit flush failed')
+
+    def flush(self):
+        with self._flush_lock:
+            self._flush()
+
+    def _flush(self):
+        with self._lock:
+            if self._journal is None or self._journal.tell() == 0:
+                return
+            self._journal.close()
+            segment = f'{self._journal_path()}.{time.time_ns()}.pending'
+            os.rename(self._journal_path(), segment)
+            self._journal = open(self._journal_path(), 'ab')
+            events = []
+            while True:
+                try:
+                    events.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            overflow, self._overflow = self._overflow, False
+
+        if overflow:
+            events = self._read_segment(segment)
+        if self._persist_segment(segment, events):
+            self._retry_pending()
+
+    def _persist_segment(self, segment, events):
+        try:
+            self.persist(events)
+        except Exception:
+            self.failures += 1
+            logger.exception('Could not persist audit segment %s; it will be retried', segment)
+            return False
+        os.remove(segment)
+        return True
+
+    @staticmethod
+    def _read_segment(path):
+        with open(path, 'rb') as f:
+            return [orjson.loads(line) for line in f if line.strip()]
+
+    def _retry_pending(self):
+        for segment in sorted(glob.glob(f'{self._journal_path()}.*.pending')):
+            if not self._persist_segment(segment, self._read_segment(segment)):
+                return
+
+    def replay(self):
+        """Persist journals and pending segments left by processes that are no longer running."""
+        with self._flush_lock:
+            self._replay()
+
+    def _replay(self):
+        for path in sorted(glob.glob(os.path.join(self.spill_dir, 'audit-*.journal*'))):
+            owner = os.path.basename(path).split('.', 1)[0]
+            if owner == self._owner():
+                continue
+            pid = int(owner.split('-')[1])
+            # Mismo PID con otro nonce: un arranque anterior de este PID, que ya no corre
+            if pid != os.getpid() and _pid_alive(pid):
+                continue
+            self._persist_segment(path, self._read_segment(path))
+
+    def persist(self, events):
+        """Insert `events` into modificaciones_expedientes in multi-row batches."""
+        if not events:
+            return
+        from . import db
+        from .models import Expediente, ModificacionExpediente
+        from .charts import refresh_section
+
+        with self.app.app_context():
+            expediente_ids = {target for event in events for target in event['id_expedientes']}
+            if not expediente_ids:
+                return
+            # Los expedientes ya eliminados (y sus auditorias, por cascada) se descartan.
+            existing = set(db.session.execute(
+                select(Expediente.id_expediente).where(Expediente.id_expediente.in_(expediente_ids))
+            ).scalars())
+
+            rows = []
+            for event in events:
+                fecha = datetime.fromisoformat(event['fecha_modificacion'])
+                rows.extend({'id_expediente': target, 'descripcion': event['descripcion'],
+                             'fecha_modificacion': fecha}
+                            for target in event['id_expedientes'] if target in existing)
+
+            table = ModificacionExpediente.__table__
+            for start in range(0, len(rows), self.batch_size):
+                db.session.execute(insert(table).values(rows[start:start + self.batch_size]))
+            if rows:
+                refresh_section(db.session, ModificacionExpediente, {row['id_expediente'] for row in rows})
+            db.session.commit()
+            db.session.remove()
+        self.persisted += len(rows)
+        self.batches += 1
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'queued': self.queue.qsize() if self.app else 0,
+            'recorded': self.recorded,
+            'spilled_to_disk': self.spilled,
+            'persisted_rows': self.persisted,
+            'batches': self.batches,
+            'failures': self.failures,
+        }
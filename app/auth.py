@@ -1,7 +1,10 @@
 from flask import request, jsonify
 from flask_restx import Namespace, Resource, fields
 from app.models import User, Paciente, Expediente
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
+from app import revocation
+from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity, get_jwt
+from flask_jwt_extended.exceptions import JWTExtendedException
+from jwt.exceptions import PyJWTError
 import re
 
 auth = Namespace('auth', description='Auth operations')
@@ -52,7 +55,7 @@ class SignUp(Resource):
         new_Expediente = Expediente.create_expediente(
             id_paciente=new_Paciente.id_paciente, descripcion="Primer expediente"
         )
-        access_token = create_access_token(identity=new_user.id_usuario)
+        access_token = create_access_token(identity=str(new_user.id_usuario))
 
         return {'message': 'User created successfully', 'user': new_user.email, 'access_token': access_token}, 201
 @auth.route('/login')
@@ -72,7 +75,7 @@ class Login(Resource):
         user = User.query.filter_by(email=email).first()
 
         if user and user.check_password(password):
-            access_token = create_access_token(identity=user.id_usuario)
+            access_token = create_access_token(identity=str(user.id_usuario))
             return {'message': 'Login successful', 'user': user.email, 'access_token': access_token, 'user_id': user.id_usuario}, 200
 
         return {'message': 'Invalid email or password'}, 401
@@ -81,7 +84,8 @@ class Login(Resource):
 class Logout(Resource):
     @jwt_required()
     def post(self):
-        # No need to logout with JWT; just remove the token on the client side
+        # El token queda revocado por su jti hasta que expire (ver app/revocation.py)
+        revocation.revoke(get_jwt())
         return {'message': 'Logout successful'}, 200
 
 @auth.route('/protected')
@@ -91,5 +95,12 @@ class Protected(Resource):
         current_user = get_jwt_identity()
         return {'message': f'Hello, user {current_user}'}, 200
 
+def jwt_error(error):
+    # Sin esto flask_restx responde 500; al relanzar, su error_router delega en los
+    # manejadores de JWTManager (401 token ausente/invalido/revocado, 422, ...).
+    raise error
+
 def init_auth_routes(api):
+    api.errorhandler(JWTExtendedException)(jwt_error)
+    api.errorhandler(PyJWTError)(jwt_error)
     api.add_namespace(auth)
\ No newline at end of file
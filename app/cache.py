@@ -0,0 +1,290 @@
+"""
+Read-through cache for hot single-entity lookups.
+
+Entries are plain dicts of column values, so they can live in the in-process
+LRU or in a SQLite file shared by every worker on the host. Cached rows are
+turned back into session-attached instances with ``merge(load=False)``, which
+issues no SQL.
+
+Models collect the keys of the rows they update or delete from
+``after_update`` and ``after_delete`` mapper events, which run during the
+flush, and the keys are dropped only when the session's transaction ends
+(``after_commit`` / ``after_rollback``, see ``app/models.py``). Dropping them
+at flush time would let a concurrent reader cache the old row again before
+the commit.
+
+Invalidations also bump a per-key generation. A miss records the key's
+generation before calling the loader and only stores the loaded row if the
+generation is unchanged, so a row read just before a concurrent commit is
+not cached over that commit's invalidation.
+
+The ``memory`` backend lives in each worker process and invalidations only
+reach the worker that made the write: with several workers, the others keep
+serving the old row for up to CACHE_TTL seconds. Use ``shared`` (the
+default) unless the API runs in a single process.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.util import identity_key
+
+
+class LRUBackend:
+    """In-process LRU with a per-entry TTL."""
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        # Generacion de las claves invalidadas, acotada como las entradas; las
+        # olvidadas toman el piso (la mayor descartada), asi nunca retroceden
+        self._generations = OrderedDict()
+        self._counter = 0
+        self._floor = 0
+        self._lock = threading.Lock()
+
+    def generation(self, key):
+        with self._lock:
+            return self._generations.get(key, self._floor)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry[0] > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, value, generation=None):
+        """Store `value`; with `generation`, only if the key was not invalidated since it was read."""
+        with self._lock:
+            if generation is not None and self._generations.get(key, self._floor) != generation:
+                return
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+                self._counter += 1
+                self._generations[key] = self._counter
+                self._generations.move_to_end(key)
+            while len(self._generations) > self.max_entries:
+                self._floor = self._generations.popitem(last=False)[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generations.clear()
+            self._counter += 1
+            self._floor = self._counter
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SharedBackend:
+    """SQLite-file store shared by all worker processes on the same host."""
+
+    PRUNE_EVERY = 1000
+
+    def __init__(self, path, max_entries, ttl, table='cache'):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.table = table
+        self._local = threading.local()
+        self._writes = 0
+        conn = self._connection()
+        conn.execute(
+            f'CREATE TABLE IF NOT EXISTS {table} '
+            '(key TEXT PRIMARY KEY, stored_at REAL, value BLOB, generation INTEGER NOT NULL DEFAULT 0)'
+        )
+        # Archivos creados antes de la columna generation
+        if 'generation' not in {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}:
+            try:
+                conn.execute(f'ALTER TABLE {table} ADD COLUMN generation INTEGER NOT NULL DEFAULT 0')
+            except sqlite3.OperationalError:
+                pass  # otro worker la agrego primero
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        row = self._connection().execute(f'SELECT stored_at, value FROM {self.table} WHERE key = ?', (key,)).fetchone()
+        # Sin valor: clave invalidada (la fila solo guarda su generacion)
+        if row is None or row[1] is None or time.time() - row[0] > self.ttl:
+            return None
+        return row[0], pickle.loads(row[1])
+
+    def generation(self, key):
+        row = self._connection().execute(f'SELECT generation FROM {self.table} WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else 0
+
+    def set(self, key, value, generation=None):
+        """Store `value`; with `generation`, only if the key was not invalidated since it was read."""
+        conn = self._connection()
+        params = (time.time(), pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        if generation:
+            conn.execute(f'UPDATE {self.table} SET stored_at = ?, value = ? WHERE key = ? AND generation = ?',
+                         (*params, key, generation))
+        else:
+            conn.execute(
+                f'INSERT INTO {self.table} (key, stored_at, value) VALUES (?, ?, ?) '
+                'ON CONFLICT (key) DO UPDATE SET stored_at = excluded.stored_at, value = excluded.value'
+                + (f' WHERE {self.table}.generation = 0' if generation == 0 else ''),
+                (key, *params))
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY == 0:
+            self._prune(conn)
+
+    def _prune(self, conn):
+        conn.execute(f'DELETE FROM {self.table} WHERE stored_at < ?', (time.time() - self.ttl,))
+        conn.execute(
+            f'DELETE FROM {self.table} WHERE key IN '
+            f'(SELECT key FROM {self.table} ORDER BY stored_at DESC LIMIT -1 OFFSET ?)',
+            (self.max_entries,)
+        )
+
+    def delete(self, *keys):
+        if keys:
+            now = time.time()
+            self._connection().executemany(
+                f'INSERT INTO {self.table} (key, stored_at, value, generation) VALUES (?, ?, NULL, 1) '
+                'ON CONFLICT (key) DO UPDATE SET stored_at = excluded.stored_at, value = NULL, '
+                f'generation = {self.table}.generation + 1',
+                [(key, now) for key in keys])
+
+    def clear(self):
+        self._connection().execute(f'DELETE FROM {self.table}')
+
+    def __len__(self):
+        return self._connection().execute(f'SELECT COUNT(*) FROM {self.table} WHERE value IS NOT NULL').fetchone()[0]
+
+
+def create_backend(kind, max_entries, ttl, path=None, table='cache'):
+    """Build a cache backend from its config name: 'memory', 'shared' or 'none'."""
+    if kind == 'memory':
+        return LRUBackend(max_entries, ttl)
+    if kind == 'shared':
+        return SharedBackend(path, max_entries, ttl, table=table)
+    if kind in (None, '', 'none'):
+        return None
+    raise ValueError(f'Unknown cache backend: {kind}')
+
+
+class EntityCache:
+    """Read-through cache for model rows, configured from the app config."""
+
+    def __init__(self):
+        self.backend = None
+        self.db = None
+        self._lock = threading.Lock()
+        self._reset_stats()
+
+    def init_app(self, app):
+        from . import db
+        self.db = db
+        self.backend = create_backend(
+            app.config.get('CACHE_BACKEND', 'shared'),
+            app.config.get('CACHE_MAX_ENTRIES', 10000),
+            app.config.get('CACHE_TTL', 300),
+            app.config.get('CACHE_SHARED_PATH'),
+        )
+
+    def _reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._age_total = 0.0
+        self.max_age_served = 0.0
+
+    def get_entity(self, model, key, loader):
+        """Return the `model` instance cached under `key`, calling `loader()` on a miss."""
+        if self.backend is None:
+            return loader()
+        entry = self.backend.get(key)
+        if entry is None:
+            with self._lock:
+                self.misses += 1
+            generation = self.backend.generation(key)
+            instance = loader()
+            if instance is not None:
+                self.backend.set(key, self._columns(model, instance), generation=generation)
+            return instance
+
+        stored_at, values = entry
+        age = time.time() - stored_at
+        with self._lock:
+            self.hits += 1
+            self._age_total += age
+            self.max_age_served = max(self.max_age_served, age)
+        return self._attach(model, values)
+
+    def invalidate(self, *keys):
+        if self.backend is None:
+            return
+        self.backend.delete(*keys)
+        with self._lock:
+            self.invalidations += len(keys)
+
+    def invalidate_on_commit(self, session, *keys):
+        """Invalidate `keys` when `session` ends its current transaction."""
+        session.info.setdefault('cache_invalidate', set()).update(keys)
+
+    def invalidate_pending(self, session):
+        keys = session.info.pop('cache_invalidate', None)
+        if keys:
+            self.invalidate(*keys)
+
+    def clear(self):
+        if self.backend is not None:
+            self.backend.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'backend': type(self.backend).__name__ if self.backend is not None else None,
+            'entries': len(self.backend) if self.backend is not None else 0,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+            'invalidations': self.invalidations,
+            'avg_age_served': self._age_total / self.hits if self.hits else 0.0,
+            'max_age_served': self.max_age_served,
+        }
+
+    @staticmethod
+    def _columns(model, instance):
+        return {attr.key: getattr(instance, attr.key) for attr in model.__mapper__.column_attrs}
+
+    def _attach(self, model, values):
+        session = self.db.session
+        pk = tuple(values[column.key] for column in model.__mapper__.primary_key)
+        existing = session.identity_map.get(identity_key(model, pk))
+        if existing is not None:
+            return existing
+        instance = model.__mapper__.class_manager.new_instance()
+        for attr, value in values.items():
+            set_committed_value(instance, attr, value)
+        make_transient_to_detached(instance)
+        return session.merge(instance, load=False)
@@ -0,0 +1,451 @@
+"""
+Materialized patient charts.
+
+Each paciente has one pre-serialized JSON document in `documentos_pacientes`
+holding the paciente row, its expedientes and every expediente's
+modificaciones, historias clinicas and antecedentes. Documents are patched
+incrementally from the session's `after_flush` event, inside the same
+transaction as the write, so reading a chart is a single primary-key lookup.
+The document rows are read with SELECT ... FOR UPDATE before being patched,
+so concurrent writes to the same paciente are applied one after the other.
+
+`flask charts rebuild` backfills documents from the normalized tables and
+`flask charts check` compares them against those tables.
+"""
+from datetime import datetime
+
+import click
+import orjson
+from flask.cli import AppGroup
+from sqlalchemy import delete, event, insert, inspect, select, update
+
+from . import db
+from .models import (
+    Paciente, Expediente, ModificacionExpediente, HistoriaClinica,
+    AntecedentesPersonales, AntecedentesFamiliares, DocumentoPaciente, ARCHIVE_MODELS
+)
+from .serializers import encoder_for
+
+# Secciones hijas de cada expediente dentro del documento
+SECTIONS = {
+    ModificacionExpediente: 'modificaciones',
+    HistoriaClinica: 'historias_clinicas',
+    AntecedentesPersonales: 'antecedentes_personales',
+    AntecedentesFamiliares: 'antecedentes_familiares',
+}
+
+charts_cli = AppGroup('charts', help='Documentos materializados de expedientes de pacientes.')
+
+
+def _pk_name(model):
+    return model.__mapper__.primary_key[0].key
+
+
+def _select_dicts(conn, model, *criteria):
+    encoder = encoder_for(model)
+    pk = model.__mapper__.primary_key[0]
+    return [encoder.to_dict(row) for row in conn.execute(encoder.select(*criteria, order_by=pk))]
+
+
+def _section_dicts(conn, model, expediente_ids):
+    """Rows of one section for `expediente_ids`, including archived ones."""
+    rows = _select_dicts(conn, model, model.id_expediente.in_(expediente_ids))
+    archive = ARCHIVE_MODELS.get(model)
+    if archive is not None:
+        pk_name = _pk_name(model)
+        rows += _select_dicts(conn, archive, archive.id_expediente.in_(expediente_ids))
+        rows.sort(key=lambda row: row[pk_name])
+    return rows
+
+
+def _empty_expediente(row):
+    entry = dict(row)
+    for section in SECTIONS.values():
+        entry[section] = []
+    return entry
+
+
+def build_charts(conn, paciente_ids):
+    """Build the chart documents of `paciente_ids` from the normalized tables."""
+    docs = {
+        row['id_paciente']: {'paciente': row, 'expedientes': []}
+        for row in _select_dicts(conn, Paciente, Paciente.id_paciente.in_(paciente_ids))
+    }
+    expedientes = {}
+    for row in _select_dicts(conn, Expediente, Expediente.id_paciente.in_(list(docs))):
+        entry = expedientes[row['id_expediente']] = _empty_expediente(row)
+        docs[row['id_paciente']]['expedientes'].append(entry)
+    if expedientes:
+        for model, section in SECTIONS.items():
+            for row in _section_dicts(conn, model, list(expedientes)):
+                expedientes[row['id_expediente']][section].append(row)
+    return docs
+
+
+def build_chart(conn, id_paciente):
+    return build_charts(conn, [id_paciente]).get(id_paciente)
+
+
+def _store(conn, id_paciente, doc, exists):
+    body = orjson.dumps(doc).decode('utf-8')
+    now = datetime.utcnow()
+    table = DocumentoPaciente.__table__
+    if exists:
+        conn.execute(update(table).where(table.c.id_paciente == id_paciente).values(
+            documento=body, version=table.c.version + 1, updated_at=now))
+    else:
+        conn.execute(insert(table).values(id_paciente=id_paciente, documento=body, version=1, updated_at=now))
+
+
+def _load(conn, paciente_ids, lock=False):
+    """Stored documents of `paciente_ids`; with `lock`, their rows stay locked until the transaction ends."""
+    table = DocumentoPaciente.__table__
+    query = select(table.c.id_paciente, table.c.documento).where(table.c.id_paciente.in_(paciente_ids))
+    if lock:
+        # Lectura-modificacion-escritura: sin el bloqueo, dos transacciones sobre el mismo
+        # paciente parchean la misma version y la ultima en confirmar pierde las secciones de la otra.
+        query = query.order_by(table.c.id_paciente).with_for_update()
+    rows = conn.execute(query)
+    return {id_paciente: orjson.loads(documento) for id_paciente, documento in rows}
+
+
+def get_chart(id_paciente):
+    """Return (documento, version, updated_at) for a paciente, building it on first access."""
+    table = DocumentoPaciente.__table__
+    row = db.session.execute(
+        select(table.c.documento, table.c.version, table.c.updated_at).where(table.c.id_paciente == id_paciente)
+    ).first()
+    if row is not None:
+        return row
+    conn = db.session.connection()
+    doc = build_chart(conn, id_paciente)
+    if doc is None:
+        return None
+    _store(conn, id_paciente, doc, exists=False)
+    db.session.commit()
+    return get_chart(id_paciente)
+
+
+# -------------------------------
+# MANTENIMIENTO INCREMENTAL
+# -------------------------------
+class _Changes:
+    """Writes collected from one flush, grouped so each table is read once."""
+
+    def __init__(self):
+        self.pacientes_upserted = set()
+        self.pacientes_deleted = set()
+        self.expedientes_upserted = set()
+        self.expedientes_deleted = {}   # id_expediente -> id_paciente
+        self.children_upserted = {model: set() for model in SECTIONS}
+        self.children_deleted = {model: set() for model in SECTIONS}
+        self.touched_expedientes = set()
+        self.touched_pacientes = set()
+
+    def __bool__(self):
+        return bool(self.touched_pacientes or self.touched_expedientes)
+
+
+def _history_values(instance, attr):
+    history = inspect(instance).attrs[attr].history
+    return {value for value in history.sum() if value is not None}
+
+
+def _collect(session):
+    changes = _Changes()
+    upserts = list(session.new) + [obj for obj in session.dirty if session.is_modified(obj)]
+    for obj in upserts:
+        if isinstance(obj, Paciente):
+            changes.pacientes_upserted.add(obj.id_paciente)
+            changes.touched_pacientes.add(obj.id_paciente)
+        elif isinstance(obj, Expediente):
+            changes.expedientes_upserted.add(obj.id_expediente)
+            changes.touched_pacientes |= _history_values(obj, 'id_paciente')
+        elif type(obj) in SECTIONS:
+            changes.children_upserted[type(obj)].add(getattr(obj, _pk_name(type(obj))))
+            changes.touched_expedientes |= _history_values(obj, 'id_expediente')
+    for obj in session.deleted:
+        if isinstance(obj, Paciente):
+            changes.pacientes_deleted.add(obj.id_paciente)
+            changes.touched_pacientes.add(obj.id_paciente)
+        elif isinstance(obj, Expediente):
+            changes.expedientes_deleted[obj.id_expediente] = obj.id_paciente
+            changes.touched_pacientes |= _history_values(obj, 'id_paciente')
+        elif type(obj) in SECTIONS:
+            changes.children_deleted[type(obj)].add(getattr(obj, _pk_name(type(obj))))
+            changes.touched_expedientes |= _history_values(obj, 'id_expediente')
+    return changes
+
+
+def _remove_child(doc, section, pk_name, pk):
+    for entry in doc['expedientes']:
+        entry[section] = [row for row in entry[section] if row[pk_name] != pk]
+
+
+def _tokens(doc):
+    return {entry['token_unico'] for entry in doc['expedientes'] if entry.get('token_unico')}
+
+
+def apply_changes(conn, changes):
+    """Patch the stored documents affected by `changes`.
+
+    Returns a list of (id_paciente, documento or None if deleted, previous expediente tokens).
+    """
+    written = []
+    expediente_owner = dict(changes.expedientes_deleted)
+    pending = changes.touched_expedientes - set(expediente_owner)
+    if pending:
+        expediente_owner.update(conn.execute(
+            select(Expediente.id_expediente, Expediente.id_paciente).where(Expediente.id_expediente.in_(pending))
+        ).all())
+    paciente_ids = (changes.touched_pacientes
+                    | {id_paciente for id_paciente in expediente_owner.values() if id_paciente is not None})
+    paciente_ids -= changes.pacientes_deleted
+    if changes.pacientes_deleted:
+        for id_paciente, doc in _load(conn, changes.pacientes_deleted, lock=True).items():
+            written.append((id_paciente, None, _tokens(doc)))
+        conn.execute(delete(DocumentoPaciente.__table__).where(
+            DocumentoPaciente.__table__.c.id_paciente.in_(changes.pacientes_deleted)))
+    if not paciente_ids:
+        return written
+
+    docs = _load(conn, paciente_ids, lock=True)
+    previous_tokens = {id_paciente: _tokens(doc) for id_paciente, doc in docs.items()}
+    missing = paciente_ids - set(docs)
+    if missing:
+        # Pacientes sin documento (nuevos o sin backfill): se construyen completos.
+        for id_paciente, doc in build_charts(conn, list(missing)).items():
+            _store(conn, id_paciente, doc, exists=False)
+            written.append((id_paciente, doc, set()))
+    if not docs:
+        return written
+
+    if changes.pacientes_upserted & set(docs):
+        for row in _select_dicts(conn, Paciente, Paciente.id_paciente.in_(changes.pacientes_upserted & set(docs))):
+            docs[row['id_paciente']]['paciente'] = row
+
+    for id_expediente, id_paciente in changes.expedientes_deleted.items():
+        if id_paciente in docs:
+            doc = docs[id_paciente]
+            doc['expedientes'] = [e for e in doc['expedientes'] if e['id_expediente'] != id_expediente]
+
+    if changes.expedientes_upserted:
+        for row in _select_dicts(conn, Expediente, Expediente.id_expediente.in_(changes.expedientes_upserted)):
+            doc = docs.get(row['id_paciente'])
+            for other in docs.values():
+                if other is not doc:
+                    other['expedientes'] = [e for e in other['expedientes'] if e['id_expediente'] != row['id_expediente']]
+            if doc is None:
+                continue
+            entry = next((e for e in doc['expedientes'] if e['id_expediente'] == row['id_expediente']), None)
+            if entry is None:
+                doc['expedientes'].append(_empty_expediente(row))
+                doc['expedientes'].sort(key=lambda e: e['id_expediente'])
+            else:
+                entry.update(row)
+
+    for model, section in SECTIONS.items():
+        pk_name = _pk_name(model)
+        for pk in changes.children_deleted[model]:
+            for doc in docs.values():
+                _remove_child(doc, section, pk_name, pk)
+        upserted = changes.children_upserted[model]
+        if not upserted:
+            continue
+        for row in _select_dicts(conn, model, model.__mapper__.primary_key[0].in_(upserted)):
+            for doc in docs.values():
+                _remove_child(doc, section, pk_name, row[pk_name])
+            doc = docs.get(expediente_owner.get(row['id_expediente']))
+            if doc is None:
+                continue
+            for entry in doc['expedientes']:
+                if entry['id_expediente'] == row['id_expediente']:
+                    entry[section].append(row)
+                    entry[section].sort(key=lambda r: r[pk_name])
+
+    for id_paciente, doc in docs.items():
+        _store(conn, id_paciente, doc, exists=True)
+        written.append((id_paciente, doc, previous_tokens[id_paciente]))
+    return written
+
+
+# Funciones llamadas con (id_paciente, documento, tokens previos) cuando se confirma
+# una transaccion que modifico documentos.
+_commit_listeners = []
+
+
+def on_chart_committed(listener):
+    _commit_listeners.append(listener)
+    return listener
+
+
+@event.listens_for(db.session, 'after_flush')
+def _maintain_charts(session, flush_context):
+    changes = _collect(session)
+    if changes:
+        written = apply_changes(session.connection(), changes)
+        session.info.setdefault('charts_written', []).extend(written)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _notify_charts(session):
+    for written in session.info.pop('charts_written', ()):
+        for listener in _commit_listeners:
+            listener(*written)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_charts(session):
+    session.info.pop('charts_written', None)
+
+
+def refresh_section(session, model, expediente_ids):
+    """Reload one child section of the given expedientes after a Core-level write.
+
+    Core `insert()`/`update()` statements bypass the flush events, so callers that
+    write child rows in bulk use this to bring the affected documents up to date.
+    """
+    conn = session.connection()
+    section = SECTIONS[model]
+    owners = dict(conn.execute(
+        select(Expediente.id_expediente, Expediente.id_paciente).where(Expediente.id_expediente.in_(expediente_ids))
+    ).all())
+    docs = _load(conn, set(owners.values()), lock=True)
+    if not docs:
+        return
+    rows = {}
+    for row in _section_dicts(conn, model, [e for e, p in owners.items() if p in docs]):
+        rows.setdefault(row['id_expediente'], []).append(row)
+    written = []
+    for id_paciente, doc in docs.items():
+        previous = _tokens(doc)
+        for entry in doc['expedientes']:
+            if entry['id_expediente'] in owners:
+                entry[section] = rows.get(entry['id_expediente'], [])
+        _store(conn, id_paciente, doc, exists=True)
+        written.append((id_paciente, doc, previous))
+    session.info.setdefault('charts_written', []).extend(written)
+
+
+def refresh_pacientes(session, paciente_ids):
+    """Reload the paciente section of the given documents after a Core-level UPDATE."""
+    conn = session.connection()
+    docs = _load(conn, set(paciente_ids), lock=True)
+    if not docs:
+        return
+    written = []
+    for row in _select_dicts(conn, Paciente, Paciente.id_paciente.in_(list(docs))):
+        doc = docs[row['id_paciente']]
+        doc['paciente'] = row
+        _store(conn, row['id_paciente'], doc, exists=True)
+        written.append((row['id_paciente'], doc, _tokens(doc)))
+    session.info.setdefault('charts_written', []).extend(written)
+
+
+def forget_pacientes(session, tokens_by_paciente):
+    """Notify listeners about pacientes removed with a Core DELETE.
+
+    The documents themselves go away with the ON DELETE CASCADE of their foreign key.
+    """
+    session.info.setdefault('charts_written', []).extend(
+        (id_paciente, None, set(tokens)) for id_paciente, tokens in tokens_by_paciente.items()
+    )
+
+
+def drop_expedientes(session, expedientes):
+    """Remove expedientes deleted with a Core DELETE ({id_expediente: id_paciente}) from their documents."""
+    conn = session.connection()
+    docs = _load(conn, set(expedientes.values()), lock=True)
+    written = []
+    for id_paciente, doc in docs.items():
+        previous = _tokens(doc)
+        doc['expedientes'] = [e for e in doc['expedientes'] if e['id_expediente'] not in expedientes]
+        _store(conn, id_paciente, doc, exists=True)
+        written.append((id_paciente, doc, previous))
+    session.info.setdefault('charts_written', []).extend(written)
+
+
+# -------------------------------
+# BACKFILL Y VERIFICACION
+# -------------------------------
+def _paciente_batches(batch_size, id_paciente=None):
+    if id_paciente is not None:
+        yield [id_paciente]
+        return
+    last = 0
+    while True:
+        ids = db.session.execute(
+            select(Paciente.id_paciente).where(Paciente.id_paciente > last)
+            .order_by(Paciente.id_paciente).limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            return
+        yield ids
+        last = ids[-1]
+
+
+def rebuild(batch_size=500, id_paciente=None):
+    total = 0
+    for ids in _paciente_batches(batch_size, id_paciente):
+        conn = db.session.connection()
+        existing = set(_load(conn, ids, lock=True))
+        for pid, doc in build_charts(conn, ids).items():
+            _store(conn, pid, doc, exists=pid in existing)
+            total += 1
+        db.session.commit()
+    return total
+
+
+def check(batch_size=500, id_paciente=None, repair=False):
+    """Compare stored documents against the normalized tables."""
+    report = {'checked': 0, 'missing': [], 'stale': [], 'orphaned': []}
+    for ids in _paciente_batches(batch_size, id_paciente):
+        conn = db.session.connection()
+        stored = _load(conn, ids, lock=repair)
+        for pid, doc in build_charts(conn, ids).items():
+            report['checked'] += 1
+            if pid not in stored:
+                report['missing'].append(pid)
+            elif stored[pid] != orjson.loads(orjson.dumps(doc)):
+                report['stale'].append(pid)
+            else:
+                continue
+            if repair:
+                _store(conn, pid, doc, exists=pid in stored)
+        db.session.commit()
+    table = DocumentoPaciente.__table__
+    report['orphaned'] = db.session.execute(
+        select(table.c.id_paciente).where(~table.c.id_paciente.in_(select(Paciente.id_paciente)))
+    ).scalars().all()
+    if repair and report['orphaned']:
+        db.session.execute(delete(table).where(table.c.id_paciente.in_(report['orphaned'])))
+        db.session.commit()
+    return report
+
+
+@charts_cli.command('rebuild')
+@click.option('--paciente', 'id_paciente', type=int, help='Reconstruir solo este paciente.')
+@click.option('--batch-size', default=500, show_default=True)
+def rebuild_command(id_paciente, batch_size):
+    """Reconstruye los documentos desde las tablas normalizadas."""
+    click.echo(f'{rebuild(batch_size, id_paciente)} documentos reconstruidos')
+
+
+@charts_cli.command('check')
+@click.option('--paciente', 'id_paciente', type=int, help='Verificar solo este paciente.')
+@click.option('--batch-size', default=500, show_default=True)
+@click.option('--repair', is_flag=True, help='Reescribir los documentos inconsistentes.')
+def check_command(id_paciente, batch_size, repair):
+    """Compara los documentos contra las tablas normalizadas."""
+    report = check(batch_size, id_paciente, repair)
+    click.echo(f"{report['checked']} pacientes verificados: {len(report['missing'])} sin documento, "
+               f"{len(report['stale'])} desactualizados, {len(report['orphaned'])} huerfanos")
+    for key in ('missing', 'stale', 'orphaned'):
+        if report[key]:
+            click.echo(f"  {key}: {report[key][:20]}{' ...' if len(report[key]) > 20 else ''}")
+    if repair:
+        click.echo('Documentos reparados')
+
+
+def init_charts(app):
+    app.cli.add_command(charts_cli)
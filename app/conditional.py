@@ -0,0 +1,80 @@
+"""
+Conditional GET support (ETag / Last-Modified) for single-record endpoints.
+
+Validators are computed from a narrow SELECT of the row's version columns
+(the `version` counter of mutable rows, creation timestamps), so a request
+that carries a matching `If-None-Match` or `If-Modified-Since` is answered
+with 304 without loading or serializing the full row. Timestamps alone are
+not enough for the ETag: DATETIME has one-second resolution on MySQL, so two
+updates within the same second would share it.
+"""
+import hashlib
+from datetime import datetime, timezone
+
+from flask import Response, request
+from sqlalchemy import select
+
+from . import db
+from .models import ARCHIVE_MODELS
+from .serializers import encoder_for, json_response
+
+
+def make_etag(*parts):
+    return hashlib.blake2b(repr(parts).encode('utf-8'), digest_size=12).hexdigest()
+
+
+def _http_date(value):
+    return value.replace(tzinfo=timezone.utc, microsecond=0) if value.tzinfo is None else value.replace(microsecond=0)
+
+
+def is_not_modified(etag, last_modified=None):
+    # If-None-Match takes precedence over If-Modified-Since (RFC 9110, 13.2.2).
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if last_modified is not None and request.if_modified_since is not None:
+        return _http_date(last_modified) <= request.if_modified_since
+    return False
+
+
+def _set_validators(response, etag, last_modified):
+    # Validators come from version columns rather than the body bytes, so they are weak.
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = _http_date(last_modified)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+def conditional_response(etag, last_modified, build):
+    """Return 304 when the client's validators match, otherwise `build()` with validators attached."""
+    if is_not_modified(etag, last_modified):
+        return _set_validators(Response(status=304), etag, last_modified)
+    return _set_validators(build(), etag, last_modified)
+
+
+def conditional_row(model, pk_value, version_columns, not_found_message):
+    """Conditional GET of one row of `model`, versioned by `version_columns`."""
+    tablename = model.__tablename__
+    pk = model.__mapper__.primary_key[0]
+    version = db.session.execute(select(*version_columns).where(pk == pk_value)).first()
+    if version is None and model in ARCHIVE_MODELS:
+        # Fila movida al archivo historico: mismas columnas, mismo ETag.
+        model = ARCHIVE_MODELS[model]
+        version_columns = [getattr(model, column.key) for column in version_columns]
+        pk = model.__mapper__.primary_key[0]
+        version = db.session.execute(select(*version_columns).where(pk == pk_value)).first()
+    if version is None:
+        return {'message': not_found_message}, 404
+
+    etag = make_etag(tablename, pk_value, *version)
+    last_modified = next((value for value in version if isinstance(value, datetime)), None)
+    encoder = encoder_for(model)
+
+    def build():
+        rows = encoder.rows(pk == pk_value)
+        if not rows:
+            return json_response({'message': not_found_message}, status=404)
+        return json_response(encoder.to_raw(rows[0]))
+
+    return conditional_response(etag, last_modified, build)
@@ -0,0 +1,302 @@
+"""
+Live epidemiological counts of predicted diseases by region and day.
+
+Every prediction made for a known paciente (`id_paciente` in the
+/api/ai/predict payload) adds one to the counter of its predicted class
+under (estado, ciudad, day), and to the estado and national roll-ups. The
+counters are one int64 array per (estado, ciudad, day) in memory, so
+`/api/ai/stats` sums at most one array per day in the range, whatever the
+number of predictions behind them. Predictions without a paciente are not
+counted.
+
+Increments are also kept as pending deltas. A background thread upserts
+them every EPI_STATS_CHECKPOINT_INTERVAL seconds into a small SQLite file
+(one row per day, estado, ciudad and class) shared by every worker on the
+host, and every EPI_STATS_REFRESH_INTERVAL seconds reloads the file so
+each worker also sees the counts of the others.
+
+`flask epi rebuild` recomputes the file from the closed prediction log
+files (see app/prediction_log.py), for backfill or after losing it. It
+replaces the file, so run it with the API stopped: deltas still pending in
+running workers would be added again on top.
+"""
+import atexit
+import glob
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime
+
+import click
+import numpy as np
+from flask.cli import AppGroup
+
+logger = logging.getLogger(__name__)
+
+epi_cli = AppGroup('epi', help='Conteos epidemiologicos de predicciones.')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS conteos (
+    dia INTEGER NOT NULL,
+    estado TEXT NOT NULL,
+    ciudad TEXT NOT NULL,
+    clase TEXT NOT NULL,
+    n INTEGER NOT NULL,
+    PRIMARY KEY (dia, estado, ciudad, clase)
+) WITHOUT ROWID
+"""
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+UPSERT = ('INSERT INTO conteos (dia, estado, ciudad, clase, n) VALUES (?, ?, ?, ?, ?) '
+          'ON CONFLICT (dia, estado, ciudad, clase) DO UPDATE SET n = n + excluded.n')
+
+
+def connect(path):
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute(SCHEMA)
+    return conn
+
+
+class EpiStats:
+    def __init__(self):
+        self.app = None
+        self.enabled = False
+        self.class_names = None
+        self._index = {}
+        self._counts = {}
+        self._regions = set()
+        self._pending = Counter()
+        self._lock = threading.Lock()
+        self._checkpoint_lock = threading.RLock()
+        self._wakeup = threading.Event()
+        self._pid = None
+        self._refreshed_at = 0.0
+        self.recorded = 0
+        self.checkpoints = 0
+        self.refreshes = 0
+        self.failures = 0
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('EPI_STATS_ENABLED', True)
+        self.path = app.config.get('EPI_STATS_PATH', '/tmp/medibax_epi.sqlite')
+        self.checkpoint_interval = app.config.get('EPI_STATS_CHECKPOINT_INTERVAL', 10.0)
+        self.refresh_interval = app.config.get('EPI_STATS_REFRESH_INTERVAL', 30.0)
+        self.max_days = app.config.get('EPI_STATS_MAX_DAYS', 366)
+
+    def configure(self, class_names):
+        """Set the class names of the loaded model (the order of `label_encoder.classes_`)."""
+        self.class_names = list(class_names)
+        self._index = {name: i for i, name in enumerate(self.class_names)}
+
+    # -------------------------------
+    # CONTEO
+    # -------------------------------
+    def _add(self, counts, estado, ciudad, dia, clase, n):
+        # Hoja (estado, ciudad), total del estado (estado, None) y nacional (None, None)
+        for key in ((estado, ciudad, dia), (estado, None, dia), (None, None, dia)):
+            array = counts.get(key)
+            if array is None:
+                array = counts[key] = np.zeros(len(self.class_names), dtype=np.int64)
+            array[clase] += n
+
+    def record(self, clase, estado, ciudad, when=None):
+        """Count one prediction of class index `clase` for a paciente of (estado, ciudad)."""
+        if not self.enabled or self.class_names is None:
+            return
+        if self._pid != os.getpid():
+            self._start()
+        estado, ciudad = estado or '', ciudad or ''
+        dia = (when or datetime.utcnow()).toordinal()
+        with self._lock:
+            self._add(self._counts, estado, ciudad, dia, clase, 1)
+            self._regions.add((estado, ciudad))
+            self._pending[(dia, estado, ciudad, clase)] += 1
+            self.recorded += 1
+
+    def _start(self):
+        with self._checkpoint_lock:
+            if self._pid == os.getpid():
+                return
+            # Primer uso en este proceso (o despues de un fork): conteos del archivo e hilo propio
+            self._pending = Counter()
+            self._pid = os.getpid()
+            self.refresh()
+            threading.Thread(target=self._run, name='epi-stats-checkpoint', daemon=True).start()
+            atexit.register(self.checkpoint)
+
+    # -------------------------------
+    # CHECKPOINT
+    # -------------------------------
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.checkpoint_interval)
+            self._wakeup.clear()
+            try:
+                self.checkpoint()
+                if time.monotonic() - self._refreshed_at >= self.refresh_interval:
+                    self.refresh()
+            except Exception:
+                self.failures += 1
+                logger.exception('Epidemiological stats checkpoint failed')
+
+    def checkpoint(self):
+        """Add the pending deltas to the shared file."""
+        with self._checkpoint_lock:
+            with self._lock:
+                pending, self._pending = self._pending, Counter()
+            if not pending:
+                return
+            rows = [(dia, estado, ciudad, self.class_names[clase], n)
+                    for (dia, estado, ciudad, clase), n in pending.items()]
+            try:
+                conn = connect(self.path)
+                with conn:
+                    conn.execute('BEGIN IMMEDIATE')
+                    conn.executemany(UPSERT, rows)
+                conn.close()
+            except Exception:
+                # Se reintentan en el siguiente checkpoint
+                with self._lock:
+                    self._pending.update(pending)
+                raise
+            self.checkpoints += 1
+
+    def refresh(self):
+        """Reload every count from the shared file, plus this worker's pending deltas."""
+        # Con el lock de checkpoint, ningun delta pasa al archivo entre la lectura y el cambio
+        with self._checkpoint_lock:
+            conn = connect(self.path)
+            rows = conn.execute('SELECT dia, estado, ciudad, clase, n FROM conteos').fetchall()
+            conn.close()
+            counts, regions = {}, set()
+            for dia, estado, ciudad, clase, n in rows:
+                index = self._index.get(clase)
+                if index is None:
+                    # Clase de un modelo anterior
+                    continue
+                self._add(counts, estado, ciudad, dia, index, n)
+                regions.add((estado, ciudad))
+            with self._lock:
+                for (dia, estado, ciudad, clase), n in self._pending.items():
+                    self._add(counts, estado, ciudad, dia, clase, n)
+                    regions.add((estado, ciudad))
+                self._counts, self._regions = counts, regions
+            self._refreshed_at = time.monotonic()
+            self.refreshes += 1
+
+    # -------------------------------
+    # CONSULTA
+    # -------------------------------
+    def query(self, desde, hasta, estado=None, ciudad=None, group_by='day'):
+        """
+        Counts per class for days in [desde, hasta) and a region (all of Mexico
+        by default). `group_by` is 'day', 'estado' or 'ciudad'; returns
+        (totals array, {group: array}).
+        """
+        if self._pid != os.getpid() and self.enabled:
+            self._start()
+        days = range(desde.toordinal(), hasta.toordinal())
+        counts = self._counts
+        if group_by == 'day':
+            keys = {date.fromordinal(dia).isoformat(): [(estado, ciudad, dia)] for dia in days}
+        else:
+            with self._lock:
+                regions = list(self._regions)
+            if group_by == 'estado':
+                names = sorted({e for e, _ in regions if estado is None or e == estado})
+                keys = {e: [(e, None, dia) for dia in days] for e in names}
+            else:
+                names = sorted((e, c) for e, c in regions if estado is None or e == estado)
+                keys = {f'{e}/{c}': [(e, c, dia) for dia in days] for e, c in names}
+        zero = np.zeros(len(self.class_names), dtype=np.int64)
+        groups = {}
+        for group, group_keys in keys.items():
+            total = zero.copy()
+            for key in group_keys:
+                array = counts.get(key)
+                if array is not None:
+                    total += array
+            if total.any():
+                groups[group] = total
+        return sum(groups.values(), zero.copy()), groups
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'recorded': self.recorded,
+            'pending': sum(self._pending.values()),
+            'regions': len(self._regions),
+            'counters': len(self._counts),
+            'checkpoints': self.checkpoints,
+            'refreshes': self.refreshes,
+            'failures': self.failures,
+        }
+
+
+# -------------------------------
+# RECONSTRUCCION
+# -------------------------------
+def rebuild(path, log_dir, log=print):
+    """Recompute the counts file from the closed prediction log files. Returns predictions counted."""
+    import pyarrow.parquet as pq
+    from sqlalchemy import select
+    from . import db
+    from .models import Paciente
+
+    files = sorted(glob.glob(os.path.join(log_dir, '*.parquet')))
+    totals = Counter()
+    regiones = {}
+    for file_path in files:
+        table = pq.read_table(file_path, columns=['patient_id', 'diagnosis', '_logged_at'])
+        frame = table.to_pandas()
+        frame = frame[frame['patient_id'].notna()]
+        if frame.empty:
+            continue
+        frame['patient_id'] = frame['patient_id'].astype('int64')
+        nuevos = [int(i) for i in frame['patient_id'].unique() if int(i) not in regiones]
+        for start in range(0, len(nuevos), 1000):
+            lote = nuevos[start:start + 1000]
+            rows = db.session.execute(
+                select(Paciente.id_paciente, Paciente.estado, Paciente.ciudad)
+                .where(Paciente.id_paciente.in_(lote))
+            ).all()
+            regiones.update({id_paciente: (estado or '', ciudad or '') for id_paciente, estado, ciudad in rows})
+        # Pacientes eliminados desde la prediccion: no se cuentan
+        frame = frame[frame['patient_id'].isin(regiones.keys())]
+        frame = frame.assign(
+            dia=frame['_logged_at'].values.astype('datetime64[D]').astype(np.int64) + EPOCH_ORDINAL,
+            estado=frame['patient_id'].map({i: region[0] for i, region in regiones.items()}),
+            ciudad=frame['patient_id'].map({i: region[1] for i, region in regiones.items()}),
+        )
+        for (dia, estado, ciudad, clase), n in frame.groupby(['dia', 'estado', 'ciudad', 'diagnosis']).size().items():
+            totals[(int(dia), estado, ciudad, clase)] += int(n)
+        log(f'{os.path.basename(file_path)}: {len(frame)} predicciones')
+
+    conn = connect(path)
+    with conn:
+        conn.execute('BEGIN IMMEDIATE')
+        conn.execute('DELETE FROM conteos')
+        conn.executemany(UPSERT, [(*key, n) for key, n in totals.items()])
+    conn.close()
+    return sum(totals.values())
+
+
+@epi_cli.command('rebuild')
+@click.option('--log-dir', help='Directorio del registro de predicciones (por defecto PREDICTION_LOG_DIR).')
+def rebuild_command(log_dir):
+    """Recalcula los conteos desde el registro de predicciones (archivos cerrados)."""
+    from flask import current_app
+    config = current_app.config
+    total = rebuild(config.get('EPI_STATS_PATH', '/tmp/medibax_epi.sqlite'),
+                    log_dir or config.get('PREDICTION_LOG_DIR', '/tmp/medibax_predictions'), log=click.echo)
+    click.echo(f'Conteos reconstruidos: {total} predicciones')
+
+
+def init_epi_stats(app):
+    app.cli.add_command(epi_cli)
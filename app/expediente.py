@@ -3,62 +3,107 @@ from flask import request, jsonify, send_file
 import qrcode
 import io
 import uuid
+from sqlalchemy.exc import IntegrityError
+from . import db, audit
+from .serializers import list_response, json_response
+from .conditional import conditional_row, conditional_response, make_etag
+from .charts import get_chart
+from .pagination import page_response, PAGE_PARAMS, DEFAULT_LIMIT, MAX_LIMIT
+from .validation import compile_model, validated
 from .models import Paciente, Expediente, ModificacionExpediente, HistoriaClinica, AntecedentesPersonales, AntecedentesFamiliares, User
 
 expediente = Namespace('expediente', description='Expediente operations')
 
 # Modelos de datos
+# Formatos: CURP de 18 caracteres y telefono de 10 a 14 digitos con + opcional (cabe en la columna String(15))
+CURP_PATTERN = r'^[A-Z]{4}[0-9]{6}[HMX][A-Z]{5}[A-Z0-9][0-9]$'
+TELEFONO_PATTERN = r'^\+?[0-9]{10,14}$'
+
 paciente_model = expediente.model('Paciente', {
-    'nombre': fields.String(),
-    'nombre_segundo': fields.String(),
-    'apellido_paterno': fields.String(),
-    'apellido_materno': fields.String(),
-    'curp': fields.String(),
-    'telefono': fields.String(),
-    'direccion': fields.String(),
-    'estado': fields.String(),
-    'ciudad': fields.String(),
-    'estado_civil': fields.String(),
-    'ocupacion': fields.String(),
-    'id_usuario': fields.Integer(required=True, description='ID del usuario asociado'),
+    'nombre': fields.String(max_length=120),
+    'nombre_segundo': fields.String(max_length=120),
+    'apellido_paterno': fields.String(max_length=120),
+    'apellido_materno': fields.String(max_length=120),
+    'curp': fields.String(pattern=CURP_PATTERN, example='GOMC800101HJCMRR09'),
+    'telefono': fields.String(pattern=TELEFONO_PATTERN, example='3312345678'),
+    'direccion': fields.String(max_length=120),
+    'estado': fields.String(max_length=120),
+    'ciudad': fields.String(max_length=120),
+    'estado_civil': fields.String(max_length=120),
+    'ocupacion': fields.String(max_length=120),
+    'id_usuario': fields.Integer(required=True, min=1, description='ID del usuario asociado'),
 })
 
 expediente_model = expediente.model('Expediente', {
-    'id_paciente': fields.Integer(required=True, description='ID del paciente asociado'),
-    'descripcion': fields.String(),
+    'id_paciente': fields.Integer(required=True, min=1, description='ID del paciente asociado'),
+    'descripcion': fields.String(max_length=120),
 })
 
 modificacion_expediente_model = expediente.model('ModificacionExpediente', {
-    'id_expediente': fields.Integer(required=True, description='ID del expediente asociado'),
-    'descripcion': fields.String(),
+    'id_expediente': fields.Integer(required=True, min=1, description='ID del expediente asociado'),
+    'descripcion': fields.String(max_length=120),
 })
 
 historia_clinica_model = expediente.model('HistoriaClinica', {
-    'id_expediente': fields.Integer(required=True, description='ID del expediente asociado'),
-    'motivo_consulta': fields.String(),
+    'id_expediente': fields.Integer(required=True, min=1, description='ID del expediente asociado'),
+    'motivo_consulta': fields.String(max_length=120),
 })
 
 antecedente_personal_model = expediente.model('AntecedentePersonal', {
-    'id_expediente': fields.Integer(required=True, description='ID del expediente asociado'),
-    'descripcion': fields.String(),
+    'id_expediente': fields.Integer(required=True, min=1, description='ID del expediente asociado'),
+    'descripcion': fields.String(max_length=120),
 })
 
 antecedente_familiar_model = expediente.model('AntecedenteFamiliar', {
-    'id_expediente': fields.Integer(required=True, description='ID del expediente asociado'),
-    'descripcion': fields.String(),
+    'id_expediente': fields.Integer(required=True, min=1, description='ID del expediente asociado'),
+    'descripcion': fields.String(max_length=120),
+})
+
+bulk_delete_model = expediente.model('BulkDeletePacientes', {
+    'ids': fields.List(fields.Integer, description='IDs de pacientes a eliminar'),
+    'id_usuario': fields.Integer(description='Eliminar todos los pacientes de este usuario'),
+})
+
+paciente_patch_model = expediente.model('PacientePatch', {
+    campo: paciente_model[campo] for campo in Paciente.PATCHABLE_FIELDS
+}, strict=True)
+
+bulk_patch_model = expediente.model('BulkPatchPacientes', {
+    'pacientes': fields.List(fields.Raw, description='Cambios con id_paciente y los campos a modificar'),
 })
 
+PAGE_PARAMS_DOC = {
+    'id_expediente': 'Solo registros de este expediente',
+    'desde': 'Fecha mínima (ISO 8601, inclusiva)',
+    'hasta': 'Fecha máxima (ISO 8601, exclusiva)',
+    'limit': f'Registros por página (1-{MAX_LIMIT}, por defecto {DEFAULT_LIMIT})',
+    'cursor': 'Cursor next_cursor de la página anterior',
+}
+
+BULK_MAX_IDS = 1000
+BULK_PATCH_MAX = 5000
+
+
+paciente_patch_validator = compile_model(paciente_patch_model)
+
+
+def _validar_patch(data, errores, prefijo=''):
+    if isinstance(data, dict) and not data:
+        errores[prefijo[:-1] or 'payload'] = 'Se requiere al menos un campo'
+        return
+    paciente_patch_validator.check(data, errores, prefijo)
+
 
 # Endpoints para Paciente (ya definidos)
 @expediente.route('/paciente')
 class PacienteList(Resource):
     @expediente.doc('list_pacientes')
     def get(self):
-        pacientes = Paciente.query.all()
-        return [paciente.as_dict() for paciente in pacientes], 200
+        return list_response(Paciente)
 
     @expediente.doc('create_paciente')
     @expediente.expect(paciente_model)
+    @validated(paciente_model)
     def post(self):
         data = request.get_json()
 
@@ -87,13 +132,11 @@ class PacienteList(Resource):
 class PacienteResource(Resource):
     @expediente.doc('get_paciente')
     def get(self, id_paciente):
-        paciente = Paciente.get_paciente_by_id(id_paciente)
-        if not paciente:
-            return {'message': 'Paciente no encontrado'}, 404
-        return paciente.as_dict(), 200
+        return conditional_row(Paciente, id_paciente, [Paciente.version, Paciente.updated_at], 'Paciente no encontrado')
 
     @expediente.doc('update_paciente')
     @expediente.expect(paciente_model)
+    @validated(paciente_model, partial=True)
     def put(self, id_paciente):
         data = request.get_json()
         paciente = Paciente.get_paciente_by_id(id_paciente)
@@ -113,27 +156,106 @@ class PacienteResource(Resource):
             estado_civil=data.get('estado_civil'),
             ocupacion=data.get('ocupacion')
         )
+        campos = [campo for campo in paciente_model if campo != 'id_usuario' and data.get(campo)]
+        audit.record(f"Paciente actualizado: {', '.join(campos)}", id_paciente=id_paciente)
+        return {'message': 'Paciente actualizado exitosamente'}, 200
+
+    @expediente.doc('patch_paciente')
+    @expediente.expect(paciente_patch_model)
+    def patch(self, id_paciente):
+        data = request.get_json(silent=True)
+        errores = {}
+        _validar_patch(data, errores)
+        if errores:
+            return {'message': 'Datos inválidos', 'errors': errores}, 400
+        try:
+            actualizado = Paciente.patch_paciente(id_paciente, **data)
+        except IntegrityError:
+            db.session.rollback()
+            return {'message': 'El CURP ya está registrado'}, 409
+        if not actualizado:
+            return {'message': 'Paciente no encontrado'}, 404
+        audit.record(f"Paciente actualizado: {', '.join(data)}", id_paciente=id_paciente)
         return {'message': 'Paciente actualizado exitosamente'}, 200
 
     @expediente.doc('delete_paciente')
     def delete(self, id_paciente):
-        paciente = Paciente.get_paciente_by_id(id_paciente)
-        if not paciente:
+        if not Paciente.delete_pacientes(ids=[id_paciente]):
             return {'message': 'Paciente no encontrado'}, 404
-        paciente.delete_paciente()
         return {'message': 'Paciente eliminado exitosamente'}, 200
 
+@expediente.route('/paciente/<int:id_paciente>/chart')
+class PacienteChart(Resource):
+    @expediente.doc('get_paciente_chart')
+    def get(self, id_paciente):
+        chart = get_chart(id_paciente)
+        if chart is None:
+            return {'message': 'Paciente no encontrado'}, 404
+        documento, version, updated_at = chart
+        return conditional_response(make_etag('chart', id_paciente, version), updated_at,
+                                    lambda: json_response(documento.encode('utf-8')))
+
+@expediente.route('/paciente/bulk_patch')
+class PacienteBulkPatch(Resource):
+    @expediente.doc('bulk_patch_pacientes')
+    @expediente.expect(bulk_patch_model)
+    def post(self):
+        data = request.get_json() or {}
+        cambios = data.get('pacientes')
+        if not isinstance(cambios, list) or not cambios or len(cambios) > BULK_PATCH_MAX:
+            return {'message': f'pacientes debe ser una lista de 1 a {BULK_PATCH_MAX} cambios'}, 400
+        errores = {}
+        for i, cambio in enumerate(cambios):
+            if not isinstance(cambio, dict) or not isinstance(cambio.get('id_paciente'), int):
+                errores[f'[{i}].id_paciente'] = 'Se requiere id_paciente entero'
+                continue
+            _validar_patch({k: v for k, v in cambio.items() if k != 'id_paciente'}, errores, f'[{i}].')
+        if errores:
+            return {'message': 'Cambios inválidos', 'errores': errores}, 400
+
+        try:
+            actualizados, no_encontrados = Paciente.patch_pacientes(cambios)
+        except IntegrityError:
+            db.session.rollback()
+            return {'message': 'Algún CURP ya está registrado; no se aplicó ningún cambio'}, 409
+        expedientes = audit.expedientes_of(actualizados) if actualizados else {}
+        for cambio in cambios:
+            if cambio['id_paciente'] in actualizados:
+                campos = [k for k in cambio if k != 'id_paciente']
+                audit.record(f"Paciente actualizado: {', '.join(campos)}",
+                             id_expedientes=expedientes.get(cambio['id_paciente'], []))
+        return {'message': 'Pacientes actualizados exitosamente', 'actualizados': actualizados,
+                'no_encontrados': no_encontrados}, 200
+
+
+@expediente.route('/paciente/bulk_delete')
+class PacienteBulkDelete(Resource):
+    @expediente.doc('bulk_delete_pacientes')
+    @expediente.expect(bulk_delete_model)
+    def post(self):
+        data = request.get_json() or {}
+        ids = data.get('ids')
+        id_usuario = data.get('id_usuario')
+        if (ids is None) == (id_usuario is None):
+            return {'message': 'Se requiere ids o id_usuario'}, 400
+        if ids is not None and (not isinstance(ids, list) or len(ids) > BULK_MAX_IDS
+                                or not all(isinstance(i, int) for i in ids)):
+            return {'message': f'ids debe ser una lista de hasta {BULK_MAX_IDS} enteros'}, 400
+
+        eliminados = Paciente.delete_pacientes(ids=ids, id_usuario=id_usuario)
+        return {'message': 'Pacientes eliminados exitosamente', 'eliminados': eliminados}, 200
+
 
 # Endpoints para Expediente
 @expediente.route('/expediente')
 class ExpedienteList(Resource):
     @expediente.doc('list_expedientes')
     def get(self):
-        expedientes = Expediente.query.all()
-        return [expediente.as_dict() for expediente in expedientes], 200
+        return list_response(Expediente)
 
     @expediente.doc('create_expediente')
     @expediente.expect(expediente_model)
+    @validated(expediente_model)
     def post(self):
         data = request.get_json()
         expediente = Expediente(
@@ -142,37 +264,35 @@ class ExpedienteList(Resource):
         )
         db.session.add(expediente)
         db.session.commit()
+        audit.record('Expediente creado', id_expediente=expediente.id_expediente)
         return {'message': 'Expediente creado exitosamente', 'id_expediente': expediente.id_expediente}, 201
 
 @expediente.route('/expediente/<int:id_expediente>')
 class ExpedienteResource(Resource):
     @expediente.doc('get_expediente')
     def get(self, id_expediente):
-        expediente = Expediente.get_expediente_by_id(id_expediente)
-        if not expediente:
-            return {'message': 'Expediente no encontrado'}, 404
-        return expediente.as_dict(), 200
+        return conditional_row(Expediente, id_expediente, [Expediente.version, Expediente.fecha_creacion],
+                               'Expediente no encontrado')
 
     @expediente.doc('delete_expediente')
     def delete(self, id_expediente):
-        expediente = Expediente.get_expediente_by_id(id_expediente)
-        if not expediente:
+        if not Expediente.delete_expediente(id_expediente):
             return {'message': 'Expediente no encontrado'}, 404
-        db.session.delete(expediente)
-        db.session.commit()
         return {'message': 'Expediente eliminado exitosamente'}, 200
 
 
 # Endpoints para ModificacionExpediente
 @expediente.route('/modificacion')
 class ModificacionExpedienteList(Resource):
-    @expediente.doc('list_modificaciones')
+    @expediente.doc('list_modificaciones', params=PAGE_PARAMS_DOC)
     def get(self):
-        modificaciones = ModificacionExpediente.query.all()
-        return [modificacion.as_dict() for modificacion in modificaciones], 200
+        if any(param in request.args for param in PAGE_PARAMS):
+            return page_response(ModificacionExpediente, ModificacionExpediente.fecha_modificacion, request.args)
+        return list_response(ModificacionExpediente)
 
     @expediente.doc('create_modificacion')
     @expediente.expect(modificacion_expediente_model)
+    @validated(modificacion_expediente_model)
     def post(self):
         data = request.get_json()
         modificacion = ModificacionExpediente.create_modificacion_expediente(
@@ -185,22 +305,22 @@ class ModificacionExpedienteList(Resource):
 class ModificacionExpedienteResource(Resource):
     @expediente.doc('get_modificacion')
     def get(self, id_modificacion):
-        modificacion = ModificacionExpediente.get_modificacion_by_id(id_modificacion)
-        if not modificacion:
-            return {'message': 'Modificación no encontrada'}, 404
-        return modificacion.as_dict(), 200
+        return conditional_row(ModificacionExpediente, id_modificacion, [ModificacionExpediente.fecha_modificacion],
+                               'Modificación no encontrada')
 
 
 # Endpoints para HistoriaClinica
 @expediente.route('/historia_clinica')
 class HistoriaClinicaList(Resource):
-    @expediente.doc('list_historias_clinicas')
+    @expediente.doc('list_historias_clinicas', params=PAGE_PARAMS_DOC)
     def get(self):
-        historias_clinicas = HistoriaClinica.query.all()
-        return [historia_clinica.as_dict() for historia_clinica in historias_clinicas], 200
+        if any(param in request.args for param in PAGE_PARAMS):
+            return page_response(HistoriaClinica, HistoriaClinica.fecha_registro, request.args)
+        return list_response(HistoriaClinica)
 
     @expediente.doc('create_historia_clinica')
     @expediente.expect(historia_clinica_model)
+    @validated(historia_clinica_model)
     def post(self):
         data = request.get_json()
         historia_clinica = HistoriaClinica(
@@ -209,28 +329,29 @@ class HistoriaClinicaList(Resource):
         )
         db.session.add(historia_clinica)
         db.session.commit()
+        audit.record('Historia clínica registrada', id_expediente=historia_clinica.id_expediente)
         return {'message': 'Historia clínica creada exitosamente', 'id_historia_clinica': historia_clinica.id_historia_clinica}, 201
 
 @expediente.route('/historia_clinica/<int:id_historia_clinica>')
 class HistoriaClinicaResource(Resource):
     @expediente.doc('get_historia_clinica')
     def get(self, id_historia_clinica):
-        historia_clinica = HistoriaClinica.get_historia_clinica_by_id(id_historia_clinica)
-        if not historia_clinica:
-            return {'message': 'Historia clínica no encontrada'}, 404
-        return historia_clinica.as_dict(), 200
+        return conditional_row(HistoriaClinica, id_historia_clinica, [HistoriaClinica.fecha_registro],
+                               'Historia clínica no encontrada')
 
 
 # Endpoints para AntecedentesPersonales
 @expediente.route('/antecedente_personal')
 class AntecedentePersonalList(Resource):
-    @expediente.doc('list_antecedentes_personales')
+    @expediente.doc('list_antecedentes_personales', params=PAGE_PARAMS_DOC)
     def get(self):
-        antecedentes_personales = AntecedentesPersonales.query.all()
-        return [antecedente.as_dict() for antecedente in antecedentes_personales], 200
+        if any(param in request.args for param in PAGE_PARAMS):
+            return page_response(AntecedentesPersonales, AntecedentesPersonales.fecha_registro, request.args)
+        return list_response(AntecedentesPersonales)
 
     @expediente.doc('create_antecedente_personal')
     @expediente.expect(antecedente_personal_model)
+    @validated(antecedente_personal_model)
     def post(self):
         data = request.get_json()
         antecedente_personal = AntecedentesPersonales(
@@ -239,28 +360,29 @@ class AntecedentePersonalList(Resource):
         )
         db.session.add(antecedente_personal)
         db.session.commit()
+        audit.record('Antecedente personal registrado', id_expediente=antecedente_personal.id_expediente)
         return {'message': 'Antecedente personal creado exitosamente', 'id_antecedente_personal': antecedente_personal.id_antecedente_personal}, 201
 
 @expediente.route('/antecedente_personal/<int:id_antecedente_personal>')
 class AntecedentePersonalResource(Resource):
     @expediente.doc('get_antecedente_personal')
     def get(self, id_antecedente_personal):
-        antecedente_personal = AntecedentesPersonales.query.filter_by(id_antecedente_personal=id_antecedente_personal).first()
-        if not antecedente_personal:
-            return {'message': 'Antecedente personal no encontrado'}, 404
-        return antecedente_personal.as_dict(), 200
+        return conditional_row(AntecedentesPersonales, id_antecedente_personal, [AntecedentesPersonales.fecha_registro],
+                               'Antecedente personal no encontrado')
 
 
 # Endpoints para AntecedentesFamiliares
 @expediente.route('/antecedente_familiar')
 class AntecedenteFamiliarList(Resource):
-    @expediente.doc('list_antecedentes_familiares')
+    @expediente.doc('list_antecedentes_familiares', params=PAGE_PARAMS_DOC)
     def get(self):
-        antecedentes_familiares = AntecedentesFamiliares.query.all()
-        return [antecedente.as_dict() for antecedente in antecedentes_familiares], 200
+        if any(param in request.args for param in PAGE_PARAMS):
+            return page_response(AntecedentesFamiliares, AntecedentesFamiliares.fecha_registro, request.args)
+        return list_response(AntecedentesFamiliares)
 
     @expediente.doc('create_antecedente_familiar')
     @expediente.expect(antecedente_familiar_model)
+    @validated(antecedente_familiar_model)
     def post(self):
         data = request.get_json()
         antecedente_familiar = AntecedentesFamiliares(
@@ -269,16 +391,40 @@ class AntecedenteFamiliarList(Resource):
         )
         db.session.add(antecedente_familiar)
         db.session.commit()
+        audit.record('Antecedente familiar registrado', id_expediente=antecedente_familiar.id_expediente)
         return {'message': 'Antecedente familiar creado exitosamente', 'id_antecedente_familiar': antecedente_familiar.id_antecedente_familiar}, 201
 
 @expediente.route('/antecedente_familiar/<int:id_antecedente_familiar>')
 class AntecedenteFamiliarResource(Resource):
     @expediente.doc('get_antecedente_familiar')
     def get(self, id_antecedente_familiar):
-        antecedente_familiar = AntecedentesFamiliares.query.filter_by(id_antecedente_familiar=id_antecedente_familiar).first()
-        if not antecedente_familiar:
-            return {'message': 'Antecedente familiar no encontrado'}, 404
-        return antecedente_familiar.as_dict(), 200
+        return conditional_row(AntecedentesFamiliares, id_antecedente_familiar, [AntecedentesFamiliares.fecha_registro],
+                               'Antecedente familiar no encontrado')
+
+def asegurar_token(expediente):
+    """Asigna un token_unico al expediente si aun no tiene uno."""
+    if not expediente.token_unico:
+        expediente.token_unico = str(uuid.uuid4())
+        db.session.commit()
+        audit.record('Token único generado', id_expediente=expediente.id_expediente)
+    return expediente.token_unico
+
+def generar_qr_png(token_unico):
+    """PNG del código QR con la URL pública del expediente."""
+    url_publica = f"https://medibax.com/expediente/{token_unico}"
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=10,
+        border=4,
+    )
+    qr.add_data(url_publica)
+    qr.make(fit=True)
+    
+    img = qr.make_image(fill='black', back_color='white')
+    img_io = io.BytesIO()
+    img.save(img_io, 'PNG')
+    return img_io.getvalue()
 
 @expediente.route('/exportar_qr/<int:id_expediente>', methods=['GET'])
 class ExportarQR(Resource):
@@ -288,29 +434,8 @@ class ExportarQR(Resource):
             return {'message': 'Expediente no encontrado'}, 404
         
         # Usar el token único existente o generar uno nuevo si no existe
-        if not expediente.token_unico:
-            expediente.token_unico = str(uuid.uuid4())
-            db.session.commit()
-        
-        # Crear la URL pública del expediente
-        url_publica = f"https://medibax.com/expediente/{expediente.token_unico}"
-        
-        # Generar el código QR basado en la URL
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4,
-        )
-        qr.add_data(url_publica)
-        qr.make(fit=True)
-        
-        img = qr.make_image(fill='black', back_color='white')
-        img_io = io.BytesIO()
-        img.save(img_io, 'PNG')
-        img_io.seek(0)
-        
-        return send_file(img_io, mimetype='image/png', as_attachment=True, download_name='expediente_qr.png')
+        png = generar_qr_png(asegurar_token(expediente))
+        return send_file(io.BytesIO(png), mimetype='image/png', as_attachment=True, download_name='expediente_qr.png')
     
 def init_expediente_routes(api_instance):
     api_instance.add_namespace(expediente)
\ No newline at end of file
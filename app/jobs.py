@@ -0,0 +1,620 @@
+"""
+Background jobs for batch work that does not fit in a request.
+
+Jobs are rows in a local SQLite queue (JOBS_DB_PATH); `flask jobs worker`
+runs a pool of processes that claim queued jobs one at a time, report
+progress and write their results under JOBS_RESULTS_DIR/<job id>/. Clients
+submit and poll jobs through the `/api/jobs` namespace. Cancellation is
+cooperative: a running job stops at its next progress report. Idle workers
+requeue running jobs whose worker died or has not reported progress for
+JOBS_HEARTBEAT_TIMEOUT seconds.
+
+Job kinds:
+
+* ``predict_batch``: disease predictions for every row of an uploaded CSV or
+  Parquet file, written as CSV.
+* ``export``: a full table as CSV or JSON lines, streamed in chunks.
+* ``qr_batch``: a ZIP with the QR code of each requested expediente.
+"""
+import csv
+import io
+import logging
+import multiprocessing
+import os
+import shutil
+import signal
+import sqlite3
+import threading
+import time
+import uuid
+import zipfile
+from datetime import datetime
+
+import click
+import orjson
+from flask import current_app, request, send_file
+from flask.cli import AppGroup
+from flask_jwt_extended import get_jwt_identity, jwt_required
+from flask_restx import Namespace, Resource, fields
+from sqlalchemy import func, select
+
+from . import db
+from .validation import validated
+
+logger = logging.getLogger(__name__)
+
+jobs_ns = Namespace('jobs', description='Background batch jobs', path='/api/jobs')
+jobs_cli = AppGroup('jobs', help='Cola de trabajos en segundo plano.')
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = 'queued', 'running', 'done', 'failed', 'cancelled'
+FINISHED = (DONE, FAILED, CANCELLED)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    params TEXT NOT NULL,
+    owner TEXT,
+    status TEXT NOT NULL,
+    processed INTEGER NOT NULL DEFAULT 0,
+    total INTEGER,
+    message TEXT,
+    result TEXT,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    worker_pid INTEGER,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    heartbeat_at REAL
+);
+CREATE INDEX IF NOT EXISTS ix_jobs_status_created ON jobs (status, created_at);
+CREATE INDEX IF NOT EXISTS ix_jobs_owner_created ON jobs (owner, created_at);
+'''
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobQueue:
+    """SQLite-backed job table shared by the web workers and the job workers on one host."""
+
+    def __init__(self):
+        self.path = None
+        self.results_dir = None
+        self.heartbeat_timeout = None
+        self._local = threading.local()
+
+    def init_app(self, app):
+        self.path = app.config.get('JOBS_DB_PATH', '/tmp/medibax_jobs.sqlite')
+        self.results_dir = app.config.get('JOBS_RESULTS_DIR', '/tmp/medibax_jobs')
+        self.heartbeat_timeout = app.config.get('JOBS_HEARTBEAT_TIMEOUT', 600)
+        os.makedirs(self.results_dir, exist_ok=True)
+        self._connection().executescript(SCHEMA)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def job_dir(self, job_id):
+        return os.path.join(self.results_dir, job_id)
+
+    # -------------------------------
+    # CLIENTES
+    # -------------------------------
+    def submit(self, kind, params, owner=None, job_id=None):
+        job_id = job_id or str(uuid.uuid4())
+        self._connection().execute(
+            'INSERT INTO jobs (id, kind, params, owner, status, created_at) VALUES (?, ?, ?, ?, ?, ?)',
+            (job_id, kind, orjson.dumps(params).decode('utf-8'), owner, QUEUED, time.time()))
+        return job_id
+
+    def get(self, job_id):
+        row = self._connection().execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def list(self, owner, limit=50):
+        rows = self._connection().execute(
+            'SELECT * FROM jobs WHERE owner = ? ORDER BY created_at DESC LIMIT ?', (owner, limit))
+        return [dict(row) for row in rows]
+
+    def cancel(self, job_id):
+        """Cancel a queued job now, or ask a running one to stop. Returns the new status."""
+        conn = self._connection()
+        conn.execute(
+            'UPDATE jobs SET status = ?, finished_at = ? WHERE id = ? AND status = ?',
+            (CANCELLED, time.time(), job_id, QUEUED))
+        conn.execute('UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = ?', (job_id, RUNNING))
+        return self.get(job_id)['status']
+
+    def purge(self, older_than):
+        """Delete finished jobs (and their files) finished before `older_than` (epoch seconds)."""
+        conn = self._connection()
+        ids = [row[0] for row in conn.execute(
+            f'SELECT id FROM jobs WHERE status IN ({",".join("?" * len(FINISHED))}) AND finished_at < ?',
+            (*FINISHED, older_than))]
+        for job_id in ids:
+            shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+        conn.executemany('DELETE FROM jobs WHERE id = ?', [(job_id,) for job_id in ids])
+        return len(ids)
+
+    # -------------------------------
+    # WORKERS
+    # -------------------------------
+    def claim(self):
+        """Atomically take the oldest queued job for this process."""
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT * FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1', (QUEUED,)).fetchone()
+            if row is None:
+                conn.execute('COMMIT')
+                return None
+            now = time.time()
+            conn.execute('UPDATE jobs SET status = ?, worker_pid = ?, started_at = ?, heartbeat_at = ? WHERE id = ?',
+                         (RUNNING, os.getpid(), now, now, row['id']))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return dict(row)
+
+    def progress(self, job_id, processed, total=None):
+        """Record progress; raises JobCancelled if a cancellation was requested or the job was requeued."""
+        conn = self._connection()
+        conn.execute(
+            'UPDATE jobs SET processed = ?, total = COALESCE(?, total), heartbeat_at = ? WHERE id = ? AND worker_pid = ?',
+            (processed, total, time.time(), job_id, os.getpid()))
+        row = conn.execute('SELECT cancel_requested, worker_pid FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row['cancel_requested'] or row['worker_pid'] != os.getpid():
+            raise JobCancelled()
+
+    def finish(self, job_id, status, message=None, result=None):
+        # Un trabajo devuelto a la cola por recover() ya no pertenece a este proceso
+        self._connection().execute(
+            'UPDATE jobs SET status = ?, message = ?, result = ?, finished_at = ? WHERE id = ? AND worker_pid = ?',
+            (status, message, result, time.time(), job_id, os.getpid()))
+
+    def recover(self):
+        """Requeue jobs left running by workers that no longer exist or stopped reporting progress."""
+        conn = self._connection()
+        rows = conn.execute('SELECT id, worker_pid, heartbeat_at FROM jobs WHERE status = ?', (RUNNING,)).fetchall()
+        expired = time.time() - self.heartbeat_timeout if self.heartbeat_timeout else None
+        stale = [(row['id'], row['worker_pid']) for row in rows
+                 if row['worker_pid'] is None or not _pid_alive(row['worker_pid'])
+                 or (expired is not None and (row['heartbeat_at'] or 0) < expired)]
+        for job_id, worker_pid in stale:
+            logger.warning('Requeueing job %s left running by worker %s', job_id, worker_pid)
+        # Los que ya tenian cancelacion pedida se dan por cancelados
+        conn.executemany(
+            'UPDATE jobs SET status = CASE WHEN cancel_requested THEN ? ELSE ? END, worker_pid = NULL, processed = 0 '
+            'WHERE id = ? AND status = ? AND worker_pid IS ?',
+            [(CANCELLED, QUEUED, job_id, RUNNING, worker_pid) for job_id, worker_pid in stale])
+        return len(stale)
+
+
+job_queue = JobQueue()
+
+
+# -------------------------------
+# TIPOS DE TRABAJO
+# -------------------------------
+class JobContext:
+    def __init__(self, job):
+        self.job = job
+        self.id = job['id']
+        self.params = orjson.loads(job['params'])
+        self.dir = job_queue.job_dir(self.id)
+        os.makedirs(self.dir, exist_ok=True)
+
+    def progress(self, processed, total=None):
+        job_queue.progress(self.id, processed, total)
+
+    def path(self, name):
+        return os.path.join(self.dir, name)
+
+
+def _cell(value):
+    # pandas lee como float las columnas enteras con celdas vacias
+    if value != value:
+        return None
+    if value.__class__ is float and value.is_integer():
+        return int(value)
+    return value
+
+
+def _validate_frame(frame, chunk_size, max_errors=10):
+    """Check every row with the compiled validator used by `/predict`; raises ValueError with the first errors."""
+    from .ai import prediction_input, prediction_validator
+
+    columns = [name for name in prediction_input if name in frame.columns]
+    errors = {}
+    for start in range(0, len(frame), chunk_size):
+        records = [{name: _cell(value) for name, value in record.items()}
+                   for record in frame.iloc[start:start + chunk_size][columns].to_dict('records')]
+        for key, message in prediction_validator.validate(records, many=True).items():
+            index, _, rest = key[1:].partition(']')
+            errors[f'[{start + int(index)}]{rest}'] = message
+        if len(errors) >= max_errors:
+            break
+    if errors:
+        first = list(errors.items())[:max_errors]
+        raise ValueError('Input validation failed: ' + '; '.join(f'{key}: {message}' for key, message in first))
+
+
+def run_predict_batch(ctx):
+    import pandas as pd
+    from ai.disease_classifier import predict_batch_probabilities
+    from .ai import class_names, feature_columns, model, scaler
+
+    source = ctx.path(ctx.params['input'])
+    frame = pd.read_parquet(source) if source.endswith('.parquet') else pd.read_csv(source)
+    missing = [column for column in feature_columns if column not in frame.columns]
+    if missing:
+        raise ValueError(f'Missing required features: {missing}')
+    frame['sex'] = frame['sex'].astype(str).str.upper()
+
+    chunk_size = current_app.config.get('JOBS_PREDICT_CHUNK', 5000)
+    _validate_frame(frame, chunk_size)
+    output = ctx.path('predictions.csv')
+    ctx.progress(0, len(frame))
+    with open(output, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['row', 'predicted_disease', 'confidence'])
+        for start in range(0, len(frame), chunk_size):
+            chunk = frame.iloc[start:start + chunk_size]
+            probabilities = predict_batch_probabilities(model, scaler, feature_columns, chunk)
+            best = probabilities.argmax(axis=1)
+            for offset, (index, score) in enumerate(zip(best, probabilities[range(len(best)), best])):
+                writer.writerow([start + offset, class_names[index], f'{score:.6f}'])
+            ctx.progress(start + len(chunk))
+    return 'predictions.csv'
+
+
+def _export_models():
+    from .models import (
+        Paciente, Expediente, ModificacionExpediente, HistoriaClinica,
+        AntecedentesPersonales, AntecedentesFamiliares
+    )
+    return {model.__tablename__: model for model in (
+        Paciente, Expediente, ModificacionExpediente, HistoriaClinica, AntecedentesPersonales, AntecedentesFamiliares
+    )}
+
+
+def _export_sources(model):
+    """Row encoders whose rows make up the full table, archived rows included, in the same column order."""
+    from .models import ARCHIVE_MODELS
+    from .serializers import RowEncoder, encoder_for
+
+    encoder = encoder_for(model)
+    sources = [(encoder, model)]
+    archive = ARCHIVE_MODELS.get(model)
+    if archive is not None:
+        sources.append((RowEncoder(archive, [archive.__table__.c[name] for name in encoder.names]), archive))
+    return encoder, sources
+
+
+def run_export(ctx):
+    model = _export_models()[ctx.params['tabla']]
+    formato = ctx.params.get('formato', 'csv')
+    encoder, sources = _export_sources(model)
+    total = sum(db.session.execute(select(func.count()).select_from(source.__table__)).scalar()
+                for _, source in sources)
+    ctx.progress(0, total)
+    name = f"{model.__tablename__}.{'jsonl' if formato == 'jsonl' else 'csv'}"
+    processed = 0
+    with open(ctx.path(name), 'wb') as f:
+        if formato == 'csv':
+            text = io.TextIOWrapper(f, encoding='utf-8', newline='')
+            writer = csv.writer(text)
+            writer.writerow(encoder.names)
+        for source_encoder, source in sources:
+            to_raw = source_encoder.to_raw
+            for chunk in source_encoder.stream(order_by=source.__mapper__.primary_key[0]):
+                if formato == 'csv':
+                    writer.writerows(chunk)
+                else:
+                    f.write(b''.join(orjson.dumps(to_raw(row)) + b'\n' for row in chunk))
+                processed += len(chunk)
+                ctx.progress(processed)
+        if formato == 'csv':
+            text.flush()
+            text.detach()
+    db.session.remove()
+    return name
+
+
+def run_qr_batch(ctx):
+    from .expediente import asegurar_token, generar_qr_png
+    from .models import Expediente
+
+    ids = ctx.params['id_expedientes']
+    ctx.progress(0, len(ids))
+    with zipfile.ZipFile(ctx.path('qr.zip'), 'w', zipfile.ZIP_STORED) as archive:
+        for processed, id_expediente in enumerate(ids, 1):
+            expediente = db.session.get(Expediente, id_expediente)
+            if expediente is not None:
+                archive.writestr(f'expediente_{id_expediente}_qr.png', generar_qr_png(asegurar_token(expediente)))
+            if processed % 50 == 0 or processed == len(ids):
+                ctx.progress(processed)
+    db.session.remove()
+    return 'qr.zip'
+
+
+JOB_KINDS = {
+    'predict_batch': run_predict_batch,
+    'export': run_export,
+    'qr_batch': run_qr_batch,
+}
+
+
+def run_job(job):
+    ctx = JobContext(job)
+    try:
+        result = JOB_KINDS[job['kind']](ctx)
+    except JobCancelled:
+        job_queue.finish(ctx.id, CANCELLED, 'Cancelled while running')
+    except Exception as e:
+        logger.exception('Job %s (%s) failed', ctx.id, job['kind'])
+        db.session.rollback()
+        job_queue.finish(ctx.id, FAILED, str(e)[:500])
+    else:
+        job_queue.finish(ctx.id, DONE, result=result)
+
+
+def work(app, poll_interval=1.0, max_jobs=None):
+    """Claim and run jobs until interrupted (or `max_jobs` have run)."""
+    done = 0
+    with app.app_context():
+        while max_jobs is None or done < max_jobs:
+            job = job_queue.claim()
+            if job is None:
+                if max_jobs is not None:
+                    return done
+                # Sin trabajo pendiente: devolver a la cola los de workers caidos o colgados
+                job_queue.recover()
+                time.sleep(poll_interval)
+                continue
+            run_job(job)
+            done += 1
+    return done
+
+
+def _worker_process(poll_interval):
+    from . import create_app
+    # Sin click en el proceso hijo: sin esto fijaria CPUs y tomaria las ranuras de los workers web
+    app = create_app({'INFERENCE_PIN_CPUS': False})
+    signal.signal(signal.SIGTERM, lambda *_: os._exit(0))
+    work(app, poll_interval)
+
+
+# -------------------------------
+# CLI
+# -------------------------------
+@jobs_cli.command('worker')
+@click.option('--processes', type=int, help='Procesos trabajadores (por defecto JOBS_WORKERS).')
+def worker_command(processes):
+    """Ejecuta trabajos de la cola con un grupo de procesos."""
+    processes = processes or current_app.config.get('JOBS_WORKERS', 2)
+    poll_interval = current_app.config.get('JOBS_POLL_INTERVAL', 1.0)
+    requeued = job_queue.recover()
+    if requeued:
+        click.echo(f'{requeued} trabajos huerfanos devueltos a la cola')
+    ctx = multiprocessing.get_context('spawn')
+    pool = [ctx.Process(target=_worker_process, args=(poll_interval,), name=f'job-worker-{i}')
+            for i in range(processes)]
+    for process in pool:
+        process.start()
+    click.echo(f'{processes} procesos trabajadores en ejecucion')
+    try:
+        for process in pool:
+            process.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in pool:
+            process.terminate()
+        for process in pool:
+            process.join()
+        job_queue.recover()
+
+
+@jobs_cli.command('purge')
+@click.option('--days', type=float, default=7, help='Antiguedad minima de los trabajos terminados.')
+def purge_command(days):
+    """Elimina trabajos terminados y sus resultados."""
+    click.echo(f'{job_queue.purge(time.time() - days * 86400)} trabajos eliminados')
+
+
+# -------------------------------
+# API
+# -------------------------------
+job_model = jobs_ns.model('Job', {
+    'id': fields.String,
+    'kind': fields.String,
+    'status': fields.String(enum=[QUEUED, RUNNING, DONE, FAILED, CANCELLED]),
+    'processed': fields.Integer,
+    'total': fields.Integer,
+    'progress': fields.Float,
+    'message': fields.String,
+    'result_url': fields.String,
+})
+
+export_model = jobs_ns.model('ExportJob', {
+    'tabla': fields.String(required=True, enum=['pacientes', 'expedientes', 'modificaciones_expedientes',
+                                                'historias_clinicas', 'antecedentes_personales',
+                                                'antecedentes_familiares']),
+    'formato': fields.String(enum=['csv', 'jsonl'], default='csv'),
+}, strict=True)
+
+qr_model = jobs_ns.model('QRJob', {
+    'id_expedientes': fields.List(fields.Integer(min=1)),
+    'id_paciente': fields.Integer(min=1),
+}, strict=True)
+
+
+def _iso(timestamp):
+    return datetime.utcfromtimestamp(timestamp).isoformat() if timestamp else None
+
+
+def job_status(job):
+    total = job['total']
+    return {
+        'id': job['id'],
+        'kind': job['kind'],
+        'status': job['status'],
+        'processed': job['processed'],
+        'total': total,
+        'progress': (job['processed'] / total if total else (1.0 if job['status'] == DONE else 0.0)),
+        'message': job['message'],
+        'created_at': _iso(job['created_at']),
+        'started_at': _iso(job['started_at']),
+        'finished_at': _iso(job['finished_at']),
+        'result_url': f"/api/jobs/{job['id']}/result" if job['status'] == DONE else None,
+    }
+
+
+def _owned(job_id):
+    job = job_queue.get(job_id)
+    if job is None or job['owner'] != str(get_jwt_identity()):
+        jobs_ns.abort(404, 'Job not found')
+    return job
+
+
+def _accepted(job_id):
+    return job_status(job_queue.get(job_id)), 202, {'Location': f'/api/jobs/{job_id}'}
+
+
+@jobs_ns.route('')
+class JobList(Resource):
+    @jwt_required()
+    @jobs_ns.doc('list_jobs')
+    def get(self):
+        """Jobs submitted by the current user, newest first"""
+        return [job_status(job) for job in job_queue.list(str(get_jwt_identity()))]
+
+
+@jobs_ns.route('/predict_batch')
+class PredictBatchJob(Resource):
+    @jwt_required()
+    @jobs_ns.doc('submit_predict_batch', responses={202: 'Accepted', 400: 'Invalid input'})
+    def post(self):
+        """
+        Predict every row of a CSV or Parquet file
+
+        Send the file as multipart field `file`, or JSON `{"records": [...]}`.
+        """
+        job_id = str(uuid.uuid4())
+        os.makedirs(job_queue.job_dir(job_id), exist_ok=True)
+        upload = request.files.get('file')
+        if upload is not None:
+            name = 'input.parquet' if upload.filename.endswith('.parquet') else 'input.csv'
+            upload.save(os.path.join(job_queue.job_dir(job_id), name))
+        else:
+            data = request.get_json(silent=True)
+            records = data.get('records') if isinstance(data, dict) else None
+            if not records or not isinstance(records, list):
+                os.rmdir(job_queue.job_dir(job_id))
+                return {'message': 'Send a CSV/Parquet file or a non-empty "records" list'}, 400
+            from app.ai import validate_prediction_payload
+            errors = validate_prediction_payload(records)
+            if errors:
+                os.rmdir(job_queue.job_dir(job_id))
+                return {'message': 'Input payload validation failed', 'errors': errors}, 400
+            import pandas as pd
+            name = 'input.csv'
+            pd.DataFrame(records).to_csv(os.path.join(job_queue.job_dir(job_id), name), index=False)
+        job_queue.submit('predict_batch', {'input': name}, owner=str(get_jwt_identity()), job_id=job_id)
+        return _accepted(job_id)
+
+
+@jobs_ns.route('/export')
+class ExportJob(Resource):
+    @jwt_required()
+    @jobs_ns.expect(export_model)
+    @jobs_ns.doc('submit_export', responses={202: 'Accepted', 400: 'Invalid input'})
+    @validated(export_model)
+    def post(self):
+        """Export a full table as CSV or JSON lines"""
+        data = request.get_json()
+        params = {'tabla': data['tabla'], 'formato': data.get('formato') or 'csv'}
+        return _accepted(job_queue.submit('export', params, owner=str(get_jwt_identity())))
+
+
+@jobs_ns.route('/qr')
+class QRJob(Resource):
+    @jwt_required()
+    @jobs_ns.expect(qr_model)
+    @jobs_ns.doc('submit_qr_batch', responses={202: 'Accepted', 400: 'Invalid input'})
+    @validated(qr_model)
+    def post(self):
+        """Generate the QR codes of many expedientes as one ZIP"""
+        from .models import Expediente
+
+        data = request.get_json()
+        ids = list(data.get('id_expedientes') or [])
+        if data.get('id_paciente') is not None:
+            ids += db.session.execute(
+                select(Expediente.id_expediente).where(Expediente.id_paciente == data['id_paciente'])
+            ).scalars().all()
+        if not ids:
+            return {'message': 'Send id_expedientes or an id_paciente with expedientes'}, 400
+        limit = current_app.config.get('JOBS_QR_MAX', 100000)
+        if len(ids) > limit:
+            return {'message': f'At most {limit} expedientes per job'}, 400
+        return _accepted(job_queue.submit('qr_batch', {'id_expedientes': ids}, owner=str(get_jwt_identity())))
+
+
+@jobs_ns.route('/<string:job_id>')
+class JobResource(Resource):
+    @jwt_required()
+    @jobs_ns.doc('get_job', responses={404: 'Job not found'})
+    def get(self, job_id):
+        """Status and progress of a job"""
+        return job_status(_owned(job_id))
+
+    @jwt_required()
+    @jobs_ns.doc('cancel_job', responses={404: 'Job not found', 409: 'Job already finished'})
+    def delete(self, job_id):
+        """Cancel a queued or running job"""
+        job = _owned(job_id)
+        if job['status'] in FINISHED:
+            return {'message': f"Job already {job['status']}"}, 409
+        job_queue.cancel(job_id)
+        return job_status(job_queue.get(job_id)), 202
+
+
+@jobs_ns.route('/<string:job_id>/result')
+class JobResult(Resource):
+    @jwt_required()
+    @jobs_ns.doc('get_job_result', responses={404: 'Job not found', 409: 'Job not finished'})
+    def get(self, job_id):
+        """Download the result file of a finished job"""
+        job = _owned(job_id)
+        if job['status'] != DONE:
+            return {'message': f"Job is {job['status']}"}, 409
+        return send_file(os.path.join(job_queue.job_dir(job_id), job['result']), as_attachment=True,
+                         download_name=job['result'])
+
+
+def init_jobs(app, api_instance):
+    job_queue.init_app(app)
+    app.cli.add_command(jobs_cli)
+    api_instance.add_namespace(jobs_ns)
@@ -0,0 +1,199 @@
+"""
+Versioned schema migrations.
+
+Each migration is a (version, description, function) entry applied in order
+by `flask schema upgrade`; the applied version is stored in `schema_version`.
+An empty database gets the current schema in one pass and is stamped with
+every version. Migrations must be idempotent (create with checkfirst, etc.)
+so they can run against databases whose tables were created by the old
+`db.create_all()` at startup.
+
+Workers no longer create tables when they boot: `check_schema` only reads
+the stored version and warns (or fails, with SCHEMA_CHECK=error) if it is
+behind the code. `flask schema check` compares every table and column of
+the models against the database, without reflecting it on each boot.
+"""
+import logging
+from datetime import datetime
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, func, insert, inspect, select, text
+
+from . import db, models  # noqa: F401 (registra las tablas en db.metadata)
+
+logger = logging.getLogger(__name__)
+
+schema_cli = AppGroup('schema', help='Migraciones versionadas del esquema.')
+
+_metadata = MetaData()
+schema_version = Table(
+    'schema_version', _metadata,
+    Column('version', Integer, primary_key=True),
+    Column('descripcion', String(200)),
+    Column('applied_at', DateTime, default=datetime.utcnow),
+)
+
+
+def _create_indexes(conn, *names):
+    tables = db.metadata.tables.values()
+    indexes = {index.name: index for table in tables for index in table.indexes}
+    for name in names:
+        indexes[name].create(bind=conn, checkfirst=True)
+
+
+def _indices_expediente_fecha(conn):
+    _create_indexes(
+        conn,
+        'ix_modificaciones_expediente_fecha', 'ix_modificaciones_fecha',
+        'ix_historias_clinicas_expediente_fecha', 'ix_historias_clinicas_fecha',
+        'ix_antecedentes_personales_expediente_fecha', 'ix_antecedentes_personales_fecha',
+        'ix_antecedentes_familiares_expediente_fecha', 'ix_antecedentes_familiares_fecha',
+    )
+
+
+def _tablas_archivo(conn):
+    for name in ('modificaciones_expedientes_archivo', 'historias_clinicas_archivo'):
+        db.metadata.tables[name].create(bind=conn, checkfirst=True)
+
+
+def _tokens_revocados(conn):
+    db.metadata.tables['tokens_revocados'].create(bind=conn, checkfirst=True)
+
+
+def _documentos_pacientes(conn):
+    # documento es LONGTEXT en MySQL (with_variant en el modelo)
+    db.metadata.tables['documentos_pacientes'].create(bind=conn, checkfirst=True)
+
+
+def _indice_tokens_revocado_en(conn):
+    _create_indexes(conn, 'ix_tokens_revocados_revocado_en')
+
+
+def _add_column(conn, table, ddl):
+    column = ddl.split()[0]
+    if column not in {c['name'] for c in inspect(conn).get_columns(table)}:
+        conn.execute(text(f'ALTER TABLE {table} ADD COLUMN {ddl}'))
+
+
+def _columnas_version(conn):
+    # Los documentos (charts) existentes no traen la columna: `flask charts rebuild` despues de aplicarla
+    for table in ('pacientes', 'expedientes'):
+        _add_column(conn, table, 'version INTEGER NOT NULL DEFAULT 1')
+
+
+MIGRATIONS = [
+    (1, 'Indices (id_expediente, fecha) y (fecha) en tablas hijas de expedientes', _indices_expediente_fecha),
+    (2, 'Tablas de archivo historico de modificaciones e historias clinicas', _tablas_archivo),
+    (3, 'Tabla de tokens JWT revocados', _tokens_revocados),
+    (4, 'Tabla de documentos (charts) de pacientes', _documentos_pacientes),
+    (5, 'Indice (revocado_en) en tokens_revocados', _indice_tokens_revocado_en),
+    (6, 'Contador de version en pacientes y expedientes (ETag)', _columnas_version),
+]
+
+
+def current_version(conn):
+    if not inspect(conn).has_table(schema_version.name):
+        return 0
+    return conn.execute(select(func.max(schema_version.c.version))).scalar() or 0
+
+
+def _is_empty(conn):
+    return not set(db.metadata.tables) & set(inspect(conn).get_table_names())
+
+
+def upgrade(target=None, log=print, engine=None):
+    """Apply pending migrations up to `target` on `engine` (the app's by default); returns the versions applied."""
+    target = target or MIGRATIONS[-1][0]
+    engine = engine or db.engine
+    with engine.begin() as conn:
+        if _is_empty(conn):
+            # Base de datos nueva: esquema actual completo y todas las versiones marcadas.
+            log('Base de datos vacia: creando el esquema completo')
+            db.metadata.create_all(conn)
+            schema_version.create(conn, checkfirst=True)
+            now = datetime.utcnow()
+            conn.execute(insert(schema_version), [
+                {'version': version, 'descripcion': descripcion, 'applied_at': now}
+                for version, descripcion, _ in MIGRATIONS
+            ])
+            return [version for version, _, _ in MIGRATIONS]
+        schema_version.create(conn, checkfirst=True)
+    applied = []
+    for version, descripcion, migrate in MIGRATIONS:
+        if version > target:
+            break
+        with engine.begin() as conn:
+            if version <= current_version(conn):
+                continue
+            log(f'Aplicando migracion {version}: {descripcion}')
+            migrate(conn)
+            conn.execute(insert(schema_version).values(version=version, descripcion=descripcion,
+                                                       applied_at=datetime.utcnow()))
+        applied.append(version)
+    return applied
+
+
+@schema_cli.command('upgrade')
+@click.option('--to', 'target', type=int, help='Version destino (por defecto la ultima).')
+def upgrade_command(target):
+    """Aplica las migraciones pendientes."""
+    applied = upgrade(target, log=click.echo)
+    click.echo(f'Esquema en la version {applied[-1]}' if applied else 'El esquema ya esta actualizado')
+
+
+@schema_cli.command('current')
+def current_command():
+    """Muestra la version actual del esquema."""
+    with db.engine.connect() as conn:
+        click.echo(f'Version actual: {current_version(conn)} (ultima: {MIGRATIONS[-1][0]})')
+
+
+def missing_schema(conn):
+    """Tables and columns the models declare that the database does not have."""
+    inspector = inspect(conn)
+    existing = set(inspector.get_table_names())
+    missing = []
+    for name, table in db.metadata.tables.items():
+        if name not in existing:
+            missing.append(name)
+            continue
+        columns = {column['name'] for column in inspector.get_columns(name)}
+        missing += [f'{name}.{column.name}' for column in table.columns if column.name not in columns]
+    return missing
+
+
+@schema_cli.command('check')
+def check_command():
+    """Verifica que existan todas las tablas y columnas de los modelos."""
+    with db.engine.connect() as conn:
+        version = current_version(conn)
+        missing = missing_schema(conn)
+    click.echo(f'Version actual: {version} (ultima: {MIGRATIONS[-1][0]})')
+    if missing:
+        raise click.ClickException(f'Faltan tablas o columnas: {", ".join(missing)}')
+    click.echo('Todas las tablas y columnas de los modelos existen')
+
+
+def check_schema(app):
+    """
+    Compare the stored schema version with the code's. Runs at startup, inside an
+    app context; the full table/column check is `flask schema check`.
+    """
+    mode = app.config.get('SCHEMA_CHECK', 'warn')
+    if mode == 'off':
+        return
+    with db.engine.connect() as conn:
+        version = current_version(conn)
+    latest = MIGRATIONS[-1][0]
+    if version >= latest:
+        return
+    message = f'Esquema en la version {version}, se requiere la {latest}: ejecute `flask schema upgrade`'
+    # Los comandos de la CLI (incluido `flask schema upgrade`) solo advierten.
+    if mode == 'error' and click.get_current_context(silent=True) is None:
+        raise RuntimeError(message)
+    logger.warning(message)
+
+
+def init_migrations(app):
+    app.cli.add_command(schema_cli)
@@ -1,6 +1,8 @@
-from . import db, bcrypt, login_manager
+from . import db, bcrypt, login_manager, cache
+from .serializers import encoder_for
 import uuid
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, event, inspect, select, delete, update, bindparam, literal_column
+from sqlalchemy.dialects.mysql import LONGTEXT
 from flask_login import UserMixin
 from datetime import datetime
 
@@ -42,7 +44,8 @@ class User(UserMixin, db.Model):
     
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    user_id = int(user_id)
+    return cache.get_entity(User, f'usuario:{user_id}', lambda: User.query.get(user_id))
 
 
 class Paciente(db.Model):
@@ -61,9 +64,12 @@ class Paciente(db.Model):
     estado_civil = db.Column(db.String(120))
     ocupacion = db.Column(db.String(120))
     id_usuario = db.Column(db.Integer, db.ForeignKey('usuarios.id_usuario', ondelete='CASCADE'))
-    usuario = db.relationship('User', backref=db.backref('pacientes', lazy=True))
+    usuario = db.relationship('User', backref=db.backref('pacientes', lazy=True, passive_deletes=True))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Contador de versiones para el ETag: updated_at tiene resolucion de segundos en MySQL
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1',
+                        onupdate=literal_column('version') + 1)
     
     def __init__(self, nombre, apellido_paterno, apellido_materno, curp, telefono, direccion, estado, ciudad, estado_civil, ocupacion, id_usuario, nombre_segundo=None):
         self.nombre = nombre
@@ -88,7 +94,8 @@ class Paciente(db.Model):
     
     @staticmethod
     def get_paciente_by_id(id_paciente):
-        return Paciente.query.filter_by(id_paciente=id_paciente).first()
+        return cache.get_entity(Paciente, f'paciente:{id_paciente}',
+                                lambda: Paciente.query.filter_by(id_paciente=id_paciente).first())
     
     @staticmethod
     def get_paciente_by_curp(curp):
@@ -120,9 +127,89 @@ class Paciente(db.Model):
         db.session.commit()
         return self
     
+    # Campos que se pueden modificar con PATCH (None limpia el campo)
+    PATCHABLE_FIELDS = ('nombre', 'nombre_segundo', 'apellido_paterno', 'apellido_materno', 'curp', 'telefono',
+                        'direccion', 'estado', 'ciudad', 'estado_civil', 'ocupacion')
+
+    @staticmethod
+    def patch_paciente(id_paciente, **values):
+        # Un solo UPDATE con las columnas recibidas, sin SELECT previo; el rowcount indica si existe.
+        from .charts import refresh_pacientes
+        result = db.session.execute(
+            update(Paciente.__table__).where(Paciente.__table__.c.id_paciente == id_paciente).values(**values)
+        )
+        if result.rowcount == 0:
+            db.session.rollback()
+            return False
+        refresh_pacientes(db.session, [id_paciente])
+        db.session.commit()
+        cache.invalidate(f'paciente:{id_paciente}')
+        return True
+
+    @staticmethod
+    def patch_pacientes(cambios):
+        # Actualizacion masiva en una transaccion: un executemany por cada combinacion de columnas.
+        from .charts import refresh_pacientes
+        table = Paciente.__table__
+        ids = {cambio['id_paciente'] for cambio in cambios}
+        existentes = set(db.session.execute(
+            select(table.c.id_paciente).where(table.c.id_paciente.in_(ids))
+        ).scalars())
+
+        grupos = {}
+        for cambio in cambios:
+            if cambio['id_paciente'] in existentes:
+                columnas = tuple(sorted(k for k in cambio if k != 'id_paciente'))
+                grupos.setdefault(columnas, []).append(
+                    {'b_id_paciente': cambio['id_paciente'], **{k: cambio[k] for k in columnas}})
+        for columnas, params in grupos.items():
+            stmt = (update(table).where(table.c.id_paciente == bindparam('b_id_paciente'))
+                    .values({columna: bindparam(columna) for columna in columnas}))
+            db.session.execute(stmt, params)
+        if existentes:
+            refresh_pacientes(db.session, existentes)
+        db.session.commit()
+        cache.invalidate(*(f'paciente:{id_paciente}' for id_paciente in existentes))
+        return sorted(existentes), sorted(ids - existentes)
+
     def delete_paciente(self):
-        db.session.delete(self)
+        Paciente.delete_pacientes(ids=[self.id_paciente])
+
+    @staticmethod
+    def delete_pacientes(ids=None, id_usuario=None):
+        # Un solo DELETE por lote: expedientes, registros hijos y documentos se eliminan
+        # en la base de datos por ON DELETE CASCADE, sin cargarlos en memoria.
+        from .charts import forget_pacientes
+        if ids is not None:
+            criteria = Paciente.id_paciente.in_(ids)
+        elif id_usuario is not None:
+            criteria = Paciente.id_usuario == id_usuario
+        else:
+            raise ValueError("Se requiere una lista de ids o un id_usuario.")
+
+        affected = db.session.execute(
+            select(Paciente.id_paciente, Expediente.id_expediente, Expediente.token_unico)
+            .outerjoin(Expediente, Expediente.id_paciente == Paciente.id_paciente)
+            .where(criteria)
+        ).all()
+        if not affected:
+            return []
+        paciente_ids = sorted({row.id_paciente for row in affected})
+        db.session.execute(delete(Paciente).where(Paciente.id_paciente.in_(paciente_ids)),
+                           execution_options={'synchronize_session': False})
+
+        tokens = {id_paciente: set() for id_paciente in paciente_ids}
+        keys = [f'paciente:{id_paciente}' for id_paciente in paciente_ids]
+        for row in affected:
+            if row.id_expediente is not None:
+                keys.append(f'expediente:{row.id_expediente}')
+                if row.token_unico:
+                    tokens[row.id_paciente].add(row.token_unico)
+                    keys.append(f'expediente:token:{row.token_unico}')
+        forget_pacientes(db.session, tokens)
         db.session.commit()
+        cache.invalidate(*keys)
+        return paciente_ids
         
     def as_dict(self):
         result = {c.name: getattr(self, c.name) for c in self.__table__.columns}
@@ -136,10 +223,13 @@ class Expediente(db.Model):
         
     id_expediente = db.Column(db.Integer, primary_key=True, index=True)
     id_paciente = db.Column(db.Integer, db.ForeignKey('pacientes.id_paciente', ondelete='CASCADE'))
-    paciente = db.relationship('Paciente', backref=db.backref('expedientes', lazy=True))
+    paciente = db.relationship('Paciente', backref=db.backref('expedientes', lazy=True, passive_deletes=True))
     fecha_creacion = db.Column(db.DateTime, default=datetime.utcnow)
     descripcion = db.Column(db.String(120))
     token_unico = db.Column(db.String(36), unique=True)  # Campo para almacenar el token único
+    # Contador de versiones para el ETag; lo incrementa cada UPDATE en la base de datos
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1',
+                        onupdate=literal_column('version') + 1)
     
     def __init__(self, id_paciente, descripcion, token_unico=None):
         self.id_paciente = id_paciente
@@ -156,11 +246,30 @@ class Expediente(db.Model):
     
     @staticmethod
     def get_expediente_by_id(id_expediente):
-        return Expediente.query.filter_by(id_expediente=id_expediente).first()
+        return cache.get_entity(Expediente, f'expediente:{id_expediente}',
+                                lambda: Expediente.query.filter_by(id_expediente=id_expediente).first())
+    
+    @staticmethod
+    def delete_expediente(id_expediente):
+        # Los registros hijos se eliminan por ON DELETE CASCADE en la base de datos.
+        from .charts import drop_expedientes
+        row = db.session.execute(
+            select(Expediente.id_paciente, Expediente.token_unico).where(Expediente.id_expediente == id_expediente)
+        ).first()
+        if row is None:
+            return False
+        db.session.execute(delete(Expediente).where(Expediente.id_expediente == id_expediente),
+                           execution_options={'synchronize_session': False})
+        drop_expedientes(db.session, {id_expediente: row.id_paciente})
+        db.session.commit()
+        cache.invalidate(f'expediente:{id_expediente}', *([f'expediente:token:{row.token_unico}'] if row.token_unico else []))
+        return True
     
     @staticmethod
     def get_expediente_by_token(token_unico):
-        return Expediente.query.filter_by(token_unico=token_unico).first()  # Método para obtener expediente por token
+        # Método para obtener expediente por token
+        return cache.get_entity(Expediente, f'expediente:token:{token_unico}',
+                                lambda: Expediente.query.filter_by(token_unico=token_unico).first())
     
     def as_dict(self):
         return {
@@ -170,22 +279,60 @@ class Expediente(db.Model):
             'descripcion': self.descripcion,
             'token_unico': self.token_unico  # Incluir el token en la representación del diccionario
         }
+
+# Invalidacion del cache de entidades: las claves se juntan durante el flush
+# y se eliminan al terminar la transaccion (ver app/cache.py)
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _invalidate_user(mapper, connection, target):
+    cache.invalidate_on_commit(inspect(target).session, f'usuario:{target.id_usuario}')
+
+
+@event.listens_for(Paciente, 'after_update')
+@event.listens_for(Paciente, 'after_delete')
+def _invalidate_paciente(mapper, connection, target):
+    cache.invalidate_on_commit(inspect(target).session, f'paciente:{target.id_paciente}')
+
+
+@event.listens_for(Expediente, 'after_update')
+@event.listens_for(Expediente, 'after_delete')
+def _invalidate_expediente(mapper, connection, target):
+    tokens = set(inspect(target).attrs.token_unico.history.sum()) | {target.token_unico}
+    cache.invalidate_on_commit(inspect(target).session, f'expediente:{target.id_expediente}',
+                               *(f'expediente:token:{token}' for token in tokens if token))
+
+
+# Tambien despues de un rollback: una lectura de esta misma sesion pudo guardar la fila sin confirmar
+@event.listens_for(db.session, 'after_commit')
+@event.listens_for(db.session, 'after_rollback')
+def _invalidate_cache(session):
+    cache.invalidate_pending(session)
+
+
 class ModificacionExpediente(db.Model):
     __tablename__ = 'modificaciones_expedientes'
+    __table_args__ = (
+        db.Index('ix_modificaciones_expediente_fecha', 'id_expediente', 'fecha_modificacion'),
+        db.Index('ix_modificaciones_fecha', 'fecha_modificacion'),
+    )
     
     id_modificacion = db.Column(db.Integer, primary_key=True, index=True)
     id_expediente = db.Column(db.Integer, db.ForeignKey('expedientes.id_expediente', ondelete='CASCADE'))
-    expediente = db.relationship('Expediente', backref=db.backref('modificaciones', lazy=True))
+    expediente = db.relationship('Expediente', backref=db.backref('modificaciones', lazy=True, passive_deletes=True))
     fecha_modificacion = db.Column(db.DateTime, default=datetime.utcnow)
     descripcion = db.Column(db.String(120))
     
     @staticmethod
     def get_modificacion_by_id(id_modificacion):
-        return ModificacionExpediente.query.filter_by(id_modificacion=id_modificacion).first()
+        return (ModificacionExpediente.query.filter_by(id_modificacion=id_modificacion).first()
+                or ModificacionExpedienteArchivo.query.filter_by(id_modificacion=id_modificacion).first())
     
     @staticmethod
-    def get_modificaciones_by_expediente(id_expediente):
-        return ModificacionExpediente.query.filter_by(id_expediente=id_expediente).all()
+    def get_modificaciones_by_expediente(id_expediente, incluir_archivo=False):
+        modificaciones = ModificacionExpediente.query.filter_by(id_expediente=id_expediente).all()
+        if incluir_archivo:
+            modificaciones += ModificacionExpedienteArchivo.query.filter_by(id_expediente=id_expediente).all()
+        return modificaciones
     
     @staticmethod
     def create_modificacion_expediente(id_expediente, descripcion):
@@ -193,37 +340,126 @@ class ModificacionExpediente(db.Model):
         db.session.add(modificacion)
         db.session.commit()
         return modificacion
+
+    def as_dict(self):
+        return encoder_for(type(self)).from_instance(self)
     
 
 class HistoriaClinica(db.Model):
     __tablename__ = 'historias_clinicas'
+    __table_args__ = (
+        db.Index('ix_historias_clinicas_expediente_fecha', 'id_expediente', 'fecha_registro'),
+        db.Index('ix_historias_clinicas_fecha', 'fecha_registro'),
+    )
     
     id_historia_clinica = db.Column(db.Integer, primary_key=True, index=True)
     id_expediente = db.Column(db.Integer, db.ForeignKey('expedientes.id_expediente', ondelete='CASCADE'))
-    expediente = db.relationship('Expediente', backref=db.backref('historias_clinicas', lazy=True))
+    expediente = db.relationship('Expediente', backref=db.backref('historias_clinicas', lazy=True, passive_deletes=True))
     motivo_consulta = db.Column(db.String(120))
     fecha_registro = db.Column(db.DateTime, default=datetime.utcnow)
     
     @staticmethod
     def get_historia_clinica_by_id(id_historia_clinica):
-        return HistoriaClinica.query.filter_by(id_historia_clinica=id_historia_clinica).first()
+        return (HistoriaClinica.query.filter_by(id_historia_clinica=id_historia_clinica).first()
+                or HistoriaClinicaArchivo.query.filter_by(id_historia_clinica=id_historia_clinica).first())
+
+    def as_dict(self):
+        return encoder_for(type(self)).from_instance(self)
     
 
 class AntecedentesPersonales(db.Model):
     __tablename__ = 'antecedentes_personales'
+    __table_args__ = (
+        db.Index('ix_antecedentes_personales_expediente_fecha', 'id_expediente', 'fecha_registro'),
+        db.Index('ix_antecedentes_personales_fecha', 'fecha_registro'),
+    )
     
     id_antecedente_personal = db.Column(db.Integer, primary_key=True, index=True)
     id_expediente = db.Column(db.Integer, db.ForeignKey('expedientes.id_expediente', ondelete='CASCADE'))
-    expediente = db.relationship('Expediente', backref=db.backref('antecedentes_personales', lazy=True))
+    expediente = db.relationship('Expediente', backref=db.backref('antecedentes_personales', lazy=True, passive_deletes=True))
     descripcion = db.Column(db.String(120))
     fecha_registro = db.Column(db.DateTime, default=datetime.utcnow)    
+
+    def as_dict(self):
+        return encoder_for(type(self)).from_instance(self)
     
     
 class AntecedentesFamiliares(db.Model):
     __tablename__ = 'antecedentes_familiares'
+    __table_args__ = (
+        db.Index('ix_antecedentes_familiares_expediente_fecha', 'id_expediente', 'fecha_registro'),
+        db.Index('ix_antecedentes_familiares_fecha', 'fecha_registro'),
+    )
     
     id_antecedente_familiar = db.Column(db.Integer, primary_key=True, index=True)
     id_expediente = db.Column(db.Integer, db.ForeignKey('expedientes.id_expediente', ondelete='CASCADE'))
-    expediente = db.relationship('Expediente', backref=db.backref('antecedentes_familiares', lazy=True))
+    expediente = db.relationship('Expediente', backref=db.backref('antecedentes_familiares', lazy=True, passive_deletes=True))
+    descripcion = db.Column(db.String(120))
+    fecha_registro = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def as_dict(self):
+        return encoder_for(type(self)).from_instance(self)
+
+# -------------------------------
+# ARCHIVO HISTORICO (ver app/archive.py)
+# -------------------------------
+class ModificacionExpedienteArchivo(db.Model):
+    __tablename__ = 'modificaciones_expedientes_archivo'
+    __table_args__ = (
+        db.Index('ix_modificaciones_archivo_expediente_fecha', 'id_expediente', 'fecha_modificacion'),
+        db.Index('ix_modificaciones_archivo_fecha', 'fecha_modificacion'),
+    )
+
+    id_modificacion = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    id_expediente = db.Column(db.Integer, db.ForeignKey('expedientes.id_expediente', ondelete='CASCADE'))
+    fecha_modificacion = db.Column(db.DateTime)
     descripcion = db.Column(db.String(120))
-    fecha_registro = db.Column(db.DateTime, default=datetime.utcnow)
\ No newline at end of file
+
+    def as_dict(self):
+        return encoder_for(type(self)).from_instance(self)
+
+
+class HistoriaClinicaArchivo(db.Model):
+    __tablename__ = 'historias_clinicas_archivo'
+    __table_args__ = (
+        db.Index('ix_historias_clinicas_archivo_expediente_fecha', 'id_expediente', 'fecha_registro'),
+        db.Index('ix_historias_clinicas_archivo_fecha', 'fecha_registro'),
+    )
+
+    id_historia_clinica = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    id_expediente = db.Column(db.Integer, db.ForeignKey('expedientes.id_expediente', ondelete='CASCADE'))
+    motivo_consulta = db.Column(db.String(120))
+    fecha_registro = db.Column(db.DateTime)
+
+    def as_dict(self):
+        return encoder_for(type(self)).from_instance(self)
+
+
+# Tabla activa -> tabla de archivo
+ARCHIVE_MODELS = {
+    ModificacionExpediente: ModificacionExpedienteArchivo,
+    HistoriaClinica: HistoriaClinicaArchivo,
+}
+
+
+# -------------------------------
+# TOKENS REVOCADOS (ver app/revocation.py)
+# -------------------------------
+class TokenRevocado(db.Model):
+    __tablename__ = 'tokens_revocados'
+
+    id_token = db.Column(db.Integer, primary_key=True)
+    jti = db.Column(db.String(36), nullable=False, unique=True)
+    id_usuario = db.Column(db.Integer, db.ForeignKey('usuarios.id_usuario', ondelete='CASCADE'), index=True)
+    expira = db.Column(db.DateTime, nullable=False, index=True)
+    revocado_en = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+
+class DocumentoPaciente(db.Model):
+    __tablename__ = 'documentos_pacientes'
+
+    # Expediente clinico completo del paciente, desnormalizado y serializado (ver app/charts.py)
+    id_paciente = db.Column(db.Integer, db.ForeignKey('pacientes.id_paciente', ondelete='CASCADE'), primary_key=True)
+    documento = db.Column(db.Text().with_variant(LONGTEXT, 'mysql'), nullable=False)
+    version = db.Column(db.Integer, nullable=False, default=1)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,109 @@
+"""
+Response format negotiation and compression for the heavy endpoints.
+
+The body format is chosen from the `Accept` header:
+
+* ``application/json`` (default) and ``application/msgpack`` carry the usual
+  structure, MessagePack without the text overhead.
+* ``application/vnd.medibax.columnar+json`` / ``+msgpack`` send repeated keys
+  once: lists become ``{'columns': [...], 'rows': [[...], ...]}`` and
+  predictions carry class indices plus a float32 score array (raw
+  little-endian bytes in MessagePack) instead of a dict keyed by disease name.
+
+Bodies of at least COMPRESSION_MIN_SIZE bytes are compressed with brotli or
+gzip according to `Accept-Encoding`.
+"""
+import gzip
+from datetime import date, datetime
+
+import msgpack
+import numpy as np
+import orjson
+from flask import Response, current_app, request
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional; sin el solo se ofrece gzip
+    brotli = None
+
+JSON = 'application/json'
+MSGPACK = 'application/msgpack'
+COLUMNAR_JSON = 'application/vnd.medibax.columnar+json'
+COLUMNAR_MSGPACK = 'application/vnd.medibax.columnar+msgpack'
+
+FORMATS = (JSON, MSGPACK, COLUMNAR_JSON, COLUMNAR_MSGPACK)
+ALIASES = {'application/x-msgpack': MSGPACK}
+
+
+def negotiate():
+    """Return the response mimetype that best matches the request's Accept header."""
+    accept = request.accept_mimetypes
+    best = accept.best_match(FORMATS + tuple(ALIASES), default=JSON)
+    return ALIASES.get(best, best)
+
+
+def is_columnar(mimetype):
+    return mimetype in (COLUMNAR_JSON, COLUMNAR_MSGPACK)
+
+
+def is_msgpack(mimetype):
+    return mimetype in (MSGPACK, COLUMNAR_MSGPACK)
+
+
+def _msgpack_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, np.ndarray):
+        return value.astype(value.dtype.newbyteorder('<'), copy=False).tobytes()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f'Cannot serialize {type(value).__name__}')
+
+
+def packer():
+    return msgpack.Packer(default=_msgpack_default, use_bin_type=True)
+
+
+def pack(payload, mimetype):
+    if is_msgpack(mimetype):
+        return packer().pack(payload)
+    return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+def compress(response):
+    """Compress `response` in place if the client accepts it and the body is large enough."""
+    response.vary.add('Accept-Encoding')
+    if response.direct_passthrough or 'Content-Encoding' in response.headers:
+        return response
+    body = response.get_data()
+    if len(body) < current_app.config.get('COMPRESSION_MIN_SIZE', 1024):
+        return response
+    offered = ('br', 'gzip') if brotli is not None else ('gzip',)
+    encoding = request.accept_encodings.best_match(offered)
+    if encoding == 'br':
+        body = brotli.compress(body, quality=current_app.config.get('COMPRESSION_BROTLI_QUALITY', 5))
+    elif encoding == 'gzip':
+        body = gzip.compress(body, compresslevel=current_app.config.get('COMPRESSION_GZIP_LEVEL', 6), mtime=0)
+    else:
+        return response
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def respond(body, mimetype, status=200, headers=None):
+    """Build the final response for an already encoded `body`."""
+    response = Response(body, status=status, headers=headers, mimetype=mimetype)
+    response.vary.add('Accept')
+    return compress(response)
+
+
+def negotiated_response(payload, columnar=None, status=200, headers=None):
+    """Encode `payload` in the negotiated format; `columnar()` builds the columnar variant."""
+    mimetype = negotiate()
+    if is_columnar(mimetype):
+        if columnar is None:
+            mimetype = MSGPACK if is_msgpack(mimetype) else JSON
+        else:
+            payload = columnar()
+    return respond(pack(payload, mimetype), mimetype, status, headers)
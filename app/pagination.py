@@ -0,0 +1,124 @@
+"""
+Keyset (seek) pagination for the time-ordered child tables.
+
+Pages are ordered newest first by (fecha, pk) and continued with an opaque
+cursor holding the last row's key, so every page is an index range scan on
+the composite (id_expediente, fecha) or (fecha) indexes instead of an
+OFFSET over the whole table.
+"""
+import base64
+from datetime import datetime
+
+import orjson
+from sqlalchemy import tuple_
+
+from .archive import archive_cutoff, may_reach_archive
+from .models import ARCHIVE_MODELS
+from .negotiation import negotiated_response
+from .serializers import encoder_for
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 200
+
+# Parametros que activan el listado filtrado/paginado
+PAGE_PARAMS = ('id_expediente', 'desde', 'hasta', 'limit', 'cursor')
+
+
+class PageError(ValueError):
+    pass
+
+
+def encode_cursor(fecha, pk):
+    return base64.urlsafe_b64encode(orjson.dumps([fecha.isoformat(), pk])).decode('ascii')
+
+
+def decode_cursor(cursor):
+    try:
+        fecha, pk = orjson.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return datetime.fromisoformat(fecha), int(pk)
+    except (ValueError, TypeError):
+        raise PageError('cursor inválido')
+
+
+def _parse_datetime(value, name):
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise PageError(f'{name} debe ser una fecha ISO 8601')
+
+
+def parse_page_args(args):
+    """Validate the query-string arguments of a paginated listing."""
+    page = {'id_expediente': None, 'desde': None, 'hasta': None, 'cursor': None, 'limit': DEFAULT_LIMIT}
+    if args.get('id_expediente') is not None:
+        try:
+            page['id_expediente'] = int(args['id_expediente'])
+        except ValueError:
+            raise PageError('id_expediente debe ser entero')
+    if args.get('desde'):
+        page['desde'] = _parse_datetime(args['desde'], 'desde')
+    if args.get('hasta'):
+        page['hasta'] = _parse_datetime(args['hasta'], 'hasta')
+    if args.get('cursor'):
+        page['cursor'] = decode_cursor(args['cursor'])
+    if args.get('limit') is not None:
+        try:
+            page['limit'] = int(args['limit'])
+        except ValueError:
+            raise PageError('limit debe ser entero')
+        if not 1 <= page['limit'] <= MAX_LIMIT:
+            raise PageError(f'limit debe estar entre 1 y {MAX_LIMIT}')
+    return page
+
+
+def _criteria(model, fecha_column, id_expediente, desde, hasta, cursor):
+    pk = model.__mapper__.primary_key[0]
+    criteria = []
+    if id_expediente is not None:
+        criteria.append(model.id_expediente == id_expediente)
+    if desde is not None:
+        criteria.append(fecha_column >= desde)
+    if hasta is not None:
+        criteria.append(fecha_column < hasta)
+    if cursor is not None:
+        criteria.append(tuple_(fecha_column, pk) < tuple_(*cursor))
+    return criteria, [fecha_column.desc(), pk.desc()]
+
+
+def keyset_page(model, fecha_column, id_expediente=None, desde=None, hasta=None, cursor=None, limit=DEFAULT_LIMIT):
+    """Return (rows, next_cursor) for one page of `model`, newest first."""
+    encoder = encoder_for(model)
+    criteria, order_by = _criteria(model, fecha_column, id_expediente, desde, hasta, cursor)
+    rows = encoder.rows(*criteria, order_by=order_by, limit=limit + 1)
+    fecha_index = encoder.names.index(fecha_column.key)
+    pk_index = encoder.names.index(model.__mapper__.primary_key[0].key)
+
+    # Las filas archivadas son anteriores al corte: la tabla de archivo solo se
+    # consulta si la pagina activa no se completo antes de llegar a el.
+    if may_reach_archive(model, desde) and (len(rows) <= limit or rows[-1][fecha_index] < archive_cutoff()):
+        archive = ARCHIVE_MODELS[model]
+        criteria, order_by = _criteria(archive, getattr(archive, fecha_column.key),
+                                       id_expediente, desde, hasta, cursor)
+        archived = encoder_for(archive).rows(*criteria, order_by=order_by, limit=limit + 1)
+        rows = sorted([*rows, *archived], key=lambda row: (row[fecha_index], row[pk_index]), reverse=True)
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last[fecha_index], last[pk_index])
+    return rows, next_cursor
+
+
+def page_response(model, fecha_column, args):
+    try:
+        page = parse_page_args(args)
+    except PageError as e:
+        return {'message': str(e)}, 400
+    rows, next_cursor = keyset_page(model, fecha_column, **page)
+    encoder = encoder_for(model)
+    to_raw = encoder.to_raw
+    return negotiated_response(
+        {'items': [to_raw(row) for row in rows], 'next_cursor': next_cursor},
+        columnar=lambda: {'columns': encoder.names, 'rows': [tuple(row) for row in rows], 'next_cursor': next_cursor},
+    )
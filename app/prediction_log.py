@@ -0,0 +1,268 @@
+"""
+Prediction log for model monitoring and retraining.
+
+`prediction_log.record()` appends the request features and the model output
+to a bounded deque; producers never take a lock or wait, and records that do
+not fit are dropped and counted. A background writer drains the buffer every
+PREDICTION_LOG_FLUSH_INTERVAL seconds into zstd-compressed Parquet files
+under PREDICTION_LOG_DIR, one row group per flush, rotated by row count or
+age. Files carry `patient_id`, the feature columns from `feature_columns.json`
+and `diagnosis` (the predicted disease), plus metadata columns prefixed with
+`_`, so `load_and_preprocess_data` can read them like the training CSV.
+Files are written as `*.parquet.inprogress` and renamed when closed. A
+batch that fails to write goes back to the front of the buffer (what does
+not fit is dropped and counted); files left `.inprogress` by a writer that
+died are renamed if they were complete, or removed, when a process starts.
+"""
+import atexit
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+logger = logging.getLogger(__name__)
+
+INPROGRESS_RE = re.compile(r'^predictions-\d{8}T\d{6}-(\d+)(?:-\d+)?\.parquet\.inprogress$')
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def build_schema(feature_columns):
+    fields = [pa.field('patient_id', pa.int64())]
+    for name in feature_columns:
+        fields.append(pa.field(name, pa.string() if name == 'sex' else pa.int32()))
+    fields += [
+        pa.field('diagnosis', pa.string()),
+        pa.field('_logged_at', pa.timestamp('ms')),
+        pa.field('_confidence', pa.float32()),
+        pa.field('_scores', pa.list_(pa.float32())),
+    ]
+    return pa.schema(fields)
+
+
+class PredictionLog:
+    def __init__(self):
+        self.app = None
+        self.enabled = False
+        self.schema = None
+        self.class_names = None
+        self._buffer = deque()
+        self._wakeup = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._pid = None
+        self._writer = None
+        self._path = None
+        self._opened_at = 0.0
+        self._file_rows = 0
+        self._sequence = 0
+        self.recorded = 0
+        self.dropped = 0
+        self.written = 0
+        self.files = 0
+        self.failures = 0
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('PREDICTION_LOG_ENABLED', True)
+        self.directory = app.config.get('PREDICTION_LOG_DIR', '/tmp/medibax_predictions')
+        self.capacity = app.config.get('PREDICTION_LOG_CAPACITY', 65536)
+        self.batch_size = app.config.get('PREDICTION_LOG_BATCH_SIZE', 4096)
+        self.flush_interval = app.config.get('PREDICTION_LOG_FLUSH_INTERVAL', 5.0)
+        self.rotate_rows = app.config.get('PREDICTION_LOG_ROTATE_ROWS', 500000)
+        self.rotate_seconds = app.config.get('PREDICTION_LOG_ROTATE_SECONDS', 3600)
+
+    def configure(self, feature_columns, class_names):
+        """Set the feature columns and class names of the loaded model."""
+        self.schema = build_schema(feature_columns)
+        self.feature_columns = list(feature_columns)
+        self.class_names = list(class_names)
+
+    # -------------------------------
+    # PRODUCTOR
+    # -------------------------------
+    def record(self, features, probabilities, id_paciente=None):
+        """Buffer one prediction. Never blocks; returns False if the record was dropped."""
+        if not self.enabled or self.schema is None:
+            return False
+        if self._pid != os.getpid():
+            self._start()
+        # deque.append es atomico: sin lock en la ruta de la peticion.
+        if len(self._buffer) >= self.capacity:
+            self.dropped += 1
+            return False
+        self._buffer.append((time.time(), id_paciente, features, probabilities))
+        self.recorded += 1
+        if len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    def _start(self):
+        with self._flush_lock:
+            if self._pid == os.getpid():
+                return
+            # Primer uso en este proceso (o despues de un fork): buffer y escritor propios.
+            os.makedirs(self.directory, exist_ok=True)
+            self._recover()
+            self._buffer = deque()
+            self._writer = None
+            self._pid = os.getpid()
+            threading.Thread(target=self._run, name='prediction-log-writer', daemon=True).start()
+            atexit.register(self.close)
+
+    def _recover(self):
+        """Close out `.inprogress` files of writers that are no longer running."""
+        for name in os.listdir(self.directory):
+            match = INPROGRESS_RE.match(name)
+            if match is None:
+                continue
+            pid = int(match.group(1))
+            # Este proceso aun no abre archivo: con su PID es de un arranque anterior
+            if pid != os.getpid() and _pid_alive(pid):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                # Cerrado pero sin renombrar: el pie del archivo esta completo
+                pq.ParquetFile(path)
+            except FileNotFoundError:
+                continue
+            except Exception:
+                logger.warning('Removing unreadable prediction log file %s left by process %s', path, pid)
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                continue
+            try:
+                os.rename(path, path[:-len('.inprogress')])
+            except FileNotFoundError:
+                continue  # otro worker ya lo recupero
+            logger.info('Recovered prediction log file %s left by process %s', path, pid)
+
+    # -------------------------------
+    # ESCRITOR
+    # -------------------------------
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                self.failures += 1
+                logger.exception('Prediction log flush failed')
+
+    def _drain(self):
+        records = []
+        buffer = self._buffer
+        while len(records) < self.batch_size:
+            try:
+                records.append(buffer.popleft())
+            except IndexError:
+                break
+        return records
+
+    def _to_table(self, records):
+        columns = {'patient_id': [record[1] for record in records]}
+        for name in self.feature_columns:
+            columns[name] = [record[2].get(name) for record in records]
+        scores = np.stack([record[3] for record in records]).astype(np.float32, copy=False)
+        best = scores.argmax(axis=1)
+        columns['diagnosis'] = [self.class_names[index] for index in best]
+        columns['_logged_at'] = [datetime.utcfromtimestamp(record[0]) for record in records]
+        columns['_confidence'] = scores[np.arange(len(records)), best]
+        columns['_scores'] = pa.FixedSizeListArray.from_arrays(
+            pa.array(scores.ravel(), pa.float32()), scores.shape[1]).cast(pa.list_(pa.float32()))
+        return pa.Table.from_pydict(columns, schema=self.schema)
+
+    def flush(self):
+        with self._flush_lock:
+            while True:
+                records = self._drain()
+                if not records:
+                    break
+                try:
+                    table = self._to_table(records)
+                except Exception:
+                    # Registros que no se pueden convertir: reintentar no los arregla
+                    self.dropped += len(records)
+                    raise
+                try:
+                    self._write(table)
+                except Exception:
+                    self._requeue(records)
+                    raise
+            if self._writer is not None and time.time() - self._opened_at >= self.rotate_seconds:
+                self._rotate()
+
+    def _requeue(self, records):
+        """Put a batch that failed to write back at the front of the buffer, within its capacity."""
+        room = max(0, self.capacity - len(self._buffer))
+        self._buffer.extendleft(reversed(records[:room]))
+        self.dropped += len(records) - min(room, len(records))
+
+    def _write(self, table):
+        if self._writer is None:
+            stamp = datetime.utcnow().strftime('%Y%m%dT%H%M%S')
+            self._sequence += 1
+            self._path = os.path.join(self.directory, f'predictions-{stamp}-{os.getpid()}-{self._sequence}.parquet')
+            self._writer = pq.ParquetWriter(f'{self._path}.inprogress', self.schema, compression='zstd')
+            self._opened_at = time.time()
+            self._file_rows = 0
+        try:
+            self._writer.write_table(table)
+        except Exception:
+            self._abandon()
+            raise
+        self._file_rows += table.num_rows
+        self.written += table.num_rows
+        if self._file_rows >= self.rotate_rows:
+            self._rotate()
+
+    def _rotate(self):
+        self._writer.close()
+        os.rename(f'{self._path}.inprogress', self._path)
+        self._writer = None
+        self.files += 1
+
+    def _abandon(self):
+        # Tras un error el escritor no es confiable: se cierra con los grupos ya escritos
+        # y el siguiente lote abre un archivo nuevo
+        try:
+            self._rotate()
+        except Exception:
+            logger.exception('Could not close prediction log file %s', self._path)
+            self._writer = None
+
+    def close(self):
+        """Write what is buffered and close the current file."""
+        self.flush()
+        with self._flush_lock:
+            if self._writer is not None:
+                self._rotate()
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'buffered': len(self._buffer),
+            'capacity': self.capacity if self.app else 0,
+            'recorded': self.recorded,
+            'dropped': self.dropped,
+            'written_rows': self.written,
+            'closed_files': self.files,
+            'failures': self.failures,
+        }
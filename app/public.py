@@ -0,0 +1,164 @@
+"""
+Public expediente view served by `token_unico` (the URL encoded in the QR).
+
+Summaries are rendered from the materialized chart when a transaction that
+touched the chart commits, and kept in a cache store keyed by token, so
+scanning a wristband normally never reaches the primary database. Each token
+is rate limited with an in-process token bucket.
+
+Anyone holding the QR can read the view without logging in, so it carries
+only what is needed to identify the paciente in an emergency (first name and
+surname initials) and their personal history, and responses are `private`
+with a short max-age: shared caches never store them and browsers
+revalidate with the ETag.
+"""
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import orjson
+from flask import Response, request
+from flask_restx import Namespace, Resource
+
+from .cache import create_backend
+from .charts import get_chart, on_chart_committed
+from .models import Expediente
+
+publico = Namespace('publico', description='Vista pública de expedientes por token', path='/expediente/publico')
+
+TOKEN_RE = re.compile(r'^[0-9a-fA-F-]{36}$')
+
+# Se incrementa al cambiar render(): las vistas del formato anterior quedan en otra tabla y no se sirven
+VIEW_FORMAT = 2
+
+
+class TokenBucketLimiter:
+    """Per-key token bucket; keeps at most `max_keys` buckets (LRU)."""
+
+    def __init__(self, rate_per_minute, burst=None, max_keys=100000):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = burst or rate_per_minute
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, key):
+        """Take one token for `key`. Returns 0 if allowed, otherwise seconds until the next token."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - last) * self.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return 0 if allowed else (1 - tokens) / self.rate
+
+
+class PublicViews:
+    """Pre-rendered public summaries keyed by token_unico."""
+
+    def __init__(self):
+        self.store = None
+        self.limiter = None
+        self.max_age = 60
+
+    def init_app(self, app):
+        self.store = create_backend(
+            app.config.get('PUBLIC_VIEW_BACKEND', 'memory'),
+            app.config.get('PUBLIC_VIEW_MAX_ENTRIES', 100000),
+            app.config.get('PUBLIC_VIEW_TTL', 86400),
+            app.config.get('CACHE_SHARED_PATH'),
+            table=f'public_views_v{VIEW_FORMAT}',
+        )
+        self.limiter = TokenBucketLimiter(app.config.get('PUBLIC_RATE_LIMIT', 30))
+        self.max_age = app.config.get('PUBLIC_VIEW_MAX_AGE', 60)
+
+    @staticmethod
+    def render(doc, entry):
+        paciente = doc['paciente']
+        # Nombre de pila e iniciales de los apellidos: suficiente para confirmar la identidad
+        iniciales = [f'{apellido[0]}.' for apellido in (paciente.get('apellido_paterno'), paciente.get('apellido_materno'))
+                     if apellido]
+        nombre = ' '.join(filter(None, [paciente.get('nombre'), *iniciales]))
+        body = orjson.dumps({
+            'token_unico': entry['token_unico'],
+            'paciente': nombre or None,
+            'antecedentes_personales': [a['descripcion'] for a in entry['antecedentes_personales']],
+        })
+        return hashlib.blake2b(body, digest_size=12).hexdigest(), body
+
+    def refresh(self, id_paciente, doc, previous_tokens):
+        if self.store is None:
+            return
+        current = set()
+        if doc is not None:
+            for entry in doc['expedientes']:
+                if entry.get('token_unico'):
+                    current.add(entry['token_unico'])
+                    self.store.set(entry['token_unico'], self.render(doc, entry))
+        stale = previous_tokens - current
+        if stale:
+            self.store.delete(*stale)
+
+    def get(self, token_unico):
+        if self.store is not None:
+            entry = self.store.get(token_unico)
+            if entry is not None:
+                return entry[1]
+        # Sin vista precalculada (reinicio o expediente sin documento): se arma desde el chart.
+        expediente = Expediente.get_expediente_by_token(token_unico)
+        if expediente is None:
+            return None
+        chart = get_chart(expediente.id_paciente)
+        if chart is None:
+            return None
+        doc = orjson.loads(chart[0])
+        entry = next((e for e in doc['expedientes'] if e['token_unico'] == token_unico), None)
+        if entry is None:
+            return None
+        view = self.render(doc, entry)
+        if self.store is not None:
+            self.store.set(token_unico, view)
+        return view
+
+
+views = PublicViews()
+on_chart_committed(views.refresh)
+
+
+@publico.route('/<string:token_unico>')
+class ExpedientePublico(Resource):
+    @publico.doc('get_expediente_publico', responses={304: 'Sin cambios', 404: 'No encontrado', 429: 'Demasiadas solicitudes'})
+    def get(self, token_unico):
+        if not TOKEN_RE.match(token_unico):
+            return {'message': 'Expediente no encontrado'}, 404
+
+        retry_after = views.limiter.acquire(token_unico)
+        if retry_after:
+            return {'message': 'Demasiadas solicitudes'}, 429, {'Retry-After': str(int(retry_after) + 1)}
+
+        view = views.get(token_unico)
+        if view is None:
+            return {'message': 'Expediente no encontrado'}, 404
+        etag, body = view
+
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = Response(body, mimetype='application/json')
+        response.set_etag(etag)
+        # Datos clinicos sin autenticacion: solo el navegador guarda la respuesta, y por poco tiempo
+        response.cache_control.private = True
+        response.cache_control.max_age = views.max_age
+        return response
+
+
+def init_public_routes(app, api_instance):
+    views.init_app(app)
+    api_instance.add_namespace(publico)
@@ -0,0 +1,224 @@
+"""
+JWT revocation by `jti`.
+
+`Logout` stores the token's jti in `tokens_revocados`. Every `@jwt_required()`
+request asks `revocation.is_revoked()`, which checks an in-process Bloom
+filter instead of querying the table: a miss means the token was never
+revoked and returns without touching the database. Only a filter hit is
+confirmed with a lookup by jti, so false positives cost one query and never
+reject a valid token.
+
+Each worker keeps its own filter and pulls new revocations at most every
+REVOCATION_SYNC_INTERVAL seconds, so a token revoked in another worker is
+rejected there within that interval. A sync reads the rows with
+`revocado_en` after the previous sync minus REVOCATION_SYNC_MARGIN seconds,
+not the ids after the last one seen: ids are assigned at INSERT, so a
+transaction that commits late can make a smaller id visible after a larger
+one. The overlapping window also covers clock skew between hosts; rows read
+again are already in the filter and are skipped.
+The filter is rebuilt from the unexpired rows when it fills up.
+`flask tokens purge` deletes rows whose tokens have already expired.
+"""
+import math
+import threading
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import delete, select
+
+tokens_cli = AppGroup('tokens', help='Tokens JWT revocados.')
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over str keys, using double hashing on `hash()`."""
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = max(1, capacity)
+        self.error_rate = error_rate
+        bits = math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.size = max(64, bits)
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    # hash() de str es estable dentro del proceso y se guarda en el objeto;
+    # el filtro nunca sale del proceso, asi que no hace falta un hash criptografico.
+    def add(self, key):
+        h = hash(key) & 0xFFFFFFFFFFFFFFFF
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        bits, size = self.bits, self.size
+        for i in range(self.hashes):
+            position = (h1 + i * h2) % size
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        h = hash(key) & 0xFFFFFFFFFFFFFFFF
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        bits, size = self.bits, self.size
+        for i in range(self.hashes):
+            position = (h1 + i * h2) % size
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    @property
+    def full(self):
+        return self.count >= self.capacity
+
+
+class RevocationList:
+    def __init__(self):
+        self.app = None
+        self.enabled = False
+        self._filter = None
+        self._synced_at = None
+        self._next_sync = 0.0
+        self._sync_lock = threading.Lock()
+        self.checks = 0
+        self.filter_hits = 0
+        self.false_positives = 0
+        self.revoked_hits = 0
+        self.syncs = 0
+        self.rebuilds = 0
+
+    def init_app(self, app, jwt):
+        self.app = app
+        self.enabled = app.config.get('REVOCATION_ENABLED', True)
+        self.capacity = app.config.get('REVOCATION_FILTER_CAPACITY', 100000)
+        self.error_rate = app.config.get('REVOCATION_FILTER_ERROR_RATE', 0.001)
+        self.sync_interval = app.config.get('REVOCATION_SYNC_INTERVAL', 1.0)
+        self.sync_margin = app.config.get('REVOCATION_SYNC_MARGIN', 60.0)
+        if self.enabled:
+            jwt.token_in_blocklist_loader(self._token_in_blocklist)
+
+    def _token_in_blocklist(self, jwt_header, jwt_payload):
+        return self.is_revoked(jwt_payload['jti'])
+
+    # -------------------------------
+    # CONSULTA
+    # -------------------------------
+    def is_revoked(self, jti):
+        self.checks += 1
+        if time.monotonic() >= self._next_sync:
+            self.sync()
+        if jti not in self._filter:
+            return False
+        self.filter_hits += 1
+        if self._lookup(jti):
+            self.revoked_hits += 1
+            return True
+        self.false_positives += 1
+        return False
+
+    def _lookup(self, jti):
+        from .models import TokenRevocado
+        from . import db
+        return db.session.execute(
+            select(TokenRevocado.id_token).where(TokenRevocado.jti == jti)
+        ).first() is not None
+
+    # -------------------------------
+    # SINCRONIZACION
+    # -------------------------------
+    def sync(self):
+        """Add revocations stored since the last sync (minus the margin); rebuild the filter when it is full."""
+        if not self._sync_lock.acquire(blocking=self._filter is None):
+            # Otro hilo ya sincroniza; se consulta el filtro actual
+            return
+        try:
+            from .models import TokenRevocado
+            from . import db
+            if self._filter is None or self._filter.full:
+                self._rebuild()
+            now = datetime.utcnow()
+            jtis = db.session.execute(
+                select(TokenRevocado.jti).where(
+                    TokenRevocado.revocado_en > self._synced_at - timedelta(seconds=self.sync_margin),
+                    TokenRevocado.expira > now,
+                )
+            ).scalars().all()
+            bloom = self._filter
+            for jti in jtis:
+                # La ventana se traslapa con la anterior: lo ya agregado no cuenta dos veces
+                if jti not in bloom:
+                    bloom.add(jti)
+            self._synced_at = now
+            self.syncs += 1
+            self._next_sync = time.monotonic() + self.sync_interval
+        finally:
+            self._sync_lock.release()
+
+    def _rebuild(self):
+        from .models import TokenRevocado
+        from . import db
+        now = datetime.utcnow()
+        jtis = db.session.execute(
+            select(TokenRevocado.jti).where(TokenRevocado.expira > now)
+        ).scalars().all()
+        # Espacio para el doble de lo que hay vigente, nunca menos que la capacidad configurada
+        bloom = BloomFilter(max(self.capacity, 2 * len(jtis)), self.error_rate)
+        for jti in jtis:
+            bloom.add(jti)
+        self._filter = bloom
+        self._synced_at = now
+        self.rebuilds += 1
+
+    # -------------------------------
+    # REVOCACION
+    # -------------------------------
+    def revoke(self, jwt_payload):
+        """Store the revocation of a decoded token and add it to this worker's filter."""
+        from .models import TokenRevocado
+        from . import db
+        jti = jwt_payload['jti']
+        if self._lookup(jti):
+            return False
+        db.session.add(TokenRevocado(
+            jti=jti,
+            id_usuario=int(jwt_payload['sub']),
+            expira=datetime.utcfromtimestamp(jwt_payload['exp']) if 'exp' in jwt_payload else datetime.max,
+        ))
+        db.session.commit()
+        if self._filter is None:
+            self.sync()
+        if jti not in self._filter:
+            self._filter.add(jti)
+        return True
+
+    def purge(self):
+        from .models import TokenRevocado
+        from . import db
+        result = db.session.execute(delete(TokenRevocado).where(TokenRevocado.expira <= datetime.utcnow()))
+        db.session.commit()
+        return result.rowcount
+
+    def stats(self):
+        bloom = self._filter
+        return {
+            'enabled': self.enabled,
+            'filter_entries': bloom.count if bloom else 0,
+            'filter_capacity': bloom.capacity if bloom else 0,
+            'filter_bits': bloom.size if bloom else 0,
+            'filter_hashes': bloom.hashes if bloom else 0,
+            'synced_at': self._synced_at.isoformat() if self._synced_at else None,
+            'checks': self.checks,
+            'filter_hits': self.filter_hits,
+            'revoked_hits': self.revoked_hits,
+            'false_positives': self.false_positives,
+            'syncs': self.syncs,
+            'rebuilds': self.rebuilds,
+        }
+
+
+@tokens_cli.command('purge')
+def purge_command():
+    """Elimina las revocaciones de tokens que ya expiraron."""
+    from . import revocation
+    click.echo(f'Revocaciones eliminadas: {revocation.purge()}')
+
+
+def init_revocation(app):
+    app.cli.add_command(tokens_cli)
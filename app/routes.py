@@ -1,4 +1,6 @@
 from flask_restx import Namespace, Resource
+from . import cache, audit, prediction_log, admission, revocation, epi_stats
+from ai.runtime import runtime
 
 api = Namespace('api', description='API operations')
 
@@ -7,6 +9,41 @@ class Index(Resource):
     def get(self):
         return {'message': 'Hello, World!'}
 
+@api.route('/metrics/cache')
+class CacheMetrics(Resource):
+    def get(self):
+        return cache.stats()
+
+@api.route('/metrics/audit')
+class AuditMetrics(Resource):
+    def get(self):
+        return audit.stats()
+
+@api.route('/metrics/predictions')
+class PredictionLogMetrics(Resource):
+    def get(self):
+        return prediction_log.stats()
+
+@api.route('/metrics/inference')
+class InferenceMetrics(Resource):
+    def get(self):
+        return runtime.stats()
+
+@api.route('/metrics/admission')
+class AdmissionMetrics(Resource):
+    def get(self):
+        return admission.stats()
+
+@api.route('/metrics/revocation')
+class RevocationMetrics(Resource):
+    def get(self):
+        return revocation.stats()
+
+@api.route('/metrics/epi')
+class EpiStatsMetrics(Resource):
+    def get(self):
+        return epi_stats.stats()
+
 def init_routes(api_instance):
     api_instance.add_namespace(api)
     
\ No newline at end of file
@@ -0,0 +1,124 @@
+"""
+Column-tuple serialization for list and export endpoints.
+
+Instead of hydrating ORM instances and calling ``as_dict`` on each one, the
+encoders here select the table's columns directly and turn every row tuple
+into a dict with a function generated once per model. List bodies can also
+be encoded as MessagePack or in the columnar layout (see `app/negotiation.py`).
+"""
+from datetime import date, datetime
+
+import orjson
+from flask import Response
+from sqlalchemy import select
+
+from . import db, negotiation
+
+CHUNK_SIZE = 1000
+
+_encoders = {}
+
+
+def _compile(names, temporal, convert_temporal):
+    items = []
+    for index, name in enumerate(names):
+        if convert_temporal and index in temporal:
+            items.append(f'{name!r}: None if row[{index}] is None else row[{index}].isoformat()')
+        else:
+            items.append(f'{name!r}: row[{index}]')
+    source = 'def encode(row):\n    return {' + ', '.join(items) + '}\n'
+    namespace = {}
+    exec(compile(source, '<row-encoder>', 'exec'), namespace)
+    return namespace['encode']
+
+
+class RowEncoder:
+    """Precompiled row -> dict encoder for one model's columns."""
+
+    def __init__(self, model, columns=None):
+        self.model = model
+        self.columns = list(columns) if columns is not None else list(model.__table__.columns)
+        self.names = tuple(column.name for column in self.columns)
+        temporal = {
+            index for index, column in enumerate(self.columns)
+            if getattr(column.type, 'python_type', None) in (datetime, date)
+        }
+        # `to_dict` matches the `as_dict` output (ISO strings); `to_raw` leaves
+        # datetimes as-is for orjson, which formats them natively.
+        self.to_dict = _compile(self.names, temporal, True)
+        self.to_raw = _compile(self.names, temporal, False)
+
+    def select(self, *criteria, order_by=None, limit=None):
+        stmt = select(*self.columns)
+        if criteria:
+            stmt = stmt.where(*criteria)
+        if order_by is not None:
+            stmt = stmt.order_by(*order_by) if isinstance(order_by, (list, tuple)) else stmt.order_by(order_by)
+        if limit is not None:
+            stmt = stmt.limit(limit)
+        return stmt
+
+    def rows(self, *criteria, order_by=None, limit=None):
+        return db.session.execute(self.select(*criteria, order_by=order_by, limit=limit)).tuples().all()
+
+    def dicts(self, *criteria, order_by=None, limit=None):
+        encode = self.to_dict
+        return [encode(row) for row in self.rows(*criteria, order_by=order_by, limit=limit)]
+
+    def stream(self, *criteria, order_by=None, limit=None, chunk_size=CHUNK_SIZE):
+        stmt = self.select(*criteria, order_by=order_by, limit=limit).execution_options(yield_per=chunk_size)
+        return db.session.execute(stmt).tuples().partitions()
+
+    def dumps(self, rows):
+        encode = self.to_raw
+        return orjson.dumps([encode(row) for row in rows])
+
+    def dumps_chunks(self, chunks, columnar=False):
+        # Encode each chunk separately so only one chunk of dicts is alive at a time.
+        encode = tuple if columnar else self.to_raw
+        parts = [orjson.dumps([encode(row) for row in chunk])[1:-1] for chunk in chunks]
+        body = b'[' + b','.join(part for part in parts if part) + b']'
+        if columnar:
+            return b'{"columns":' + orjson.dumps(self.names) + b',"rows":' + body + b'}'
+        return body
+
+    def pack_chunks(self, chunks, columnar=False):
+        """MessagePack counterpart of `dumps_chunks`."""
+        packer = negotiation.packer()
+        encode = tuple if columnar else self.to_raw
+        parts = [packer.pack(encode(row)) for chunk in chunks for row in chunk]
+        body = packer.pack_array_header(len(parts)) + b''.join(parts)
+        if columnar:
+            return (packer.pack_map_header(2) + packer.pack('columns') + packer.pack(self.names)
+                    + packer.pack('rows') + body)
+        return body
+
+    def encode_chunks(self, chunks, mimetype):
+        """Encode row chunks in the negotiated `mimetype` (see `app/negotiation.py`)."""
+        columnar = negotiation.is_columnar(mimetype)
+        if negotiation.is_msgpack(mimetype):
+            return self.pack_chunks(chunks, columnar)
+        return self.dumps_chunks(chunks, columnar)
+
+    def from_instance(self, instance):
+        return self.to_dict(tuple(getattr(instance, column.key) for column in self.columns))
+
+
+def encoder_for(model):
+    encoder = _encoders.get(model)
+    if encoder is None:
+        encoder = _encoders[model] = RowEncoder(model)
+    return encoder
+
+
+def json_response(body, status=200, headers=None):
+    if not isinstance(body, bytes):
+        body = orjson.dumps(body)
+    return Response(body, status=status, headers=headers, mimetype='application/json')
+
+
+def list_response(model, *criteria, order_by=None, limit=None):
+    encoder = encoder_for(model)
+    mimetype = negotiation.negotiate()
+    body = encoder.encode_chunks(encoder.stream(*criteria, order_by=order_by, limit=limit), mimetype)
+    return negotiation.respond(body, mimetype)
@@ -0,0 +1,192 @@
+"""
+Request payload validation compiled from the flask_restx models.
+
+`compile_model(model)` reads the constraints the models already declare for
+Swagger (required, Integer/Float min and max, String enum, pattern and
+lengths, Boolean, List, Nested, strict models) and generates one Python
+function with every check unrolled. The function is compiled once, when the
+namespace module is imported, so a request only pays for the comparisons
+themselves: no schema walking, no per-request validator objects.
+
+Every field is checked and all errors are returned together as a
+{field: message} dict, the same shape flask_restx uses for its own
+validation errors. Array payloads are checked item by item with keys like
+'[3].fever'. Fields that are not required may be null.
+
+`@validated(model)` runs the validator on the request body before the view
+and aborts with 400 and every error at once.
+"""
+import re
+from functools import wraps
+
+from flask import request
+from flask_restx import abort, fields
+
+_MISSING = object()
+
+
+class Validator:
+    def __init__(self, model, check, source):
+        self.model = model
+        self.check = check
+        self.source = source
+
+    def validate(self, payload, many=False, max_items=None):
+        """Errors for a single object or, with `many`, for an object or a list of them."""
+        errors = {}
+        if many and payload.__class__ is list:
+            if not payload:
+                errors['payload'] = 'Must be a non-empty list'
+            elif max_items is not None and len(payload) > max_items:
+                errors['payload'] = f'Must have at most {max_items} items'
+            else:
+                check = self.check
+                for i, item in enumerate(payload):
+                    check(item, errors, f'[{i}].')
+        else:
+            self.check(payload, errors, '')
+        return errors
+
+
+class _Compiler:
+    def __init__(self):
+        self.namespace = {'_MISSING': _MISSING}
+        self.functions = []
+        self.counter = 0
+
+    def constant(self, value):
+        self.counter += 1
+        name = f'_c{self.counter}'
+        self.namespace[name] = value
+        return name
+
+    def condition(self, field, var):
+        """(expression that is true when `var` is invalid, error message) for one field."""
+        if isinstance(field, fields.Boolean):
+            return f'{var}.__class__ is not bool', 'Must be a boolean'
+
+        if isinstance(field, (fields.Integer, fields.Float, fields.Arbitrary)):
+            if isinstance(field, fields.Integer):
+                tests = [f'{var}.__class__ is not int']
+                kind = 'an integer'
+            else:
+                tests = [f'{var}.__class__ is not int and {var}.__class__ is not float']
+                kind = 'a number'
+            minimum, maximum = field.minimum, field.maximum
+            if minimum is not None:
+                tests.append(f'{var} {"<=" if field.exclusiveMinimum else "<"} {minimum!r}')
+            if maximum is not None:
+                tests.append(f'{var} {">=" if field.exclusiveMaximum else ">"} {maximum!r}')
+            lower = '>' if field.exclusiveMinimum else '>='
+            upper = '<' if field.exclusiveMaximum else '<='
+            if minimum is not None and maximum is not None:
+                if field.exclusiveMinimum or field.exclusiveMaximum:
+                    message = f'Must be {kind} {lower} {minimum} and {upper} {maximum}'
+                else:
+                    message = f'Must be {kind} between {minimum} and {maximum}'
+            elif minimum is not None:
+                message = f'Must be {kind} {lower} {minimum}'
+            elif maximum is not None:
+                message = f'Must be {kind} {upper} {maximum}'
+            else:
+                message = f'Must be {kind}'
+            return ' or '.join(tests), message
+
+        if isinstance(field, fields.String):
+            tests = [f'{var}.__class__ is not str']
+            details = []
+            if field.enum:
+                tests.append(f'{var} not in {self.constant(frozenset(field.enum))}')
+                details.append(f'one of {list(field.enum)}')
+            if field.min_length is not None:
+                tests.append(f'len({var}) < {field.min_length}')
+                details.append(f'at least {field.min_length} characters')
+            if field.max_length is not None:
+                tests.append(f'len({var}) > {field.max_length}')
+                details.append(f'at most {field.max_length} characters')
+            if field.pattern:
+                tests.append(f'{self.constant(re.compile(field.pattern).search)}({var}) is None')
+                details.append(f'matching {field.pattern}')
+            message = 'Must be a string' + (f" ({', '.join(details)})" if details else '')
+            return ' or '.join(tests), message
+
+        if isinstance(field, fields.List):
+            tests = [f'{var}.__class__ is not list']
+            if field.min_items is not None:
+                tests.append(f'len({var}) < {field.min_items}')
+            if field.max_items is not None:
+                tests.append(f'len({var}) > {field.max_items}')
+            item, item_message = self.condition(field.container, '_item')
+            if item:
+                tests.append(f'any({item} for _item in {var})')
+            message = 'Must be a list'
+            if field.min_items is not None or field.max_items is not None:
+                message += f' of {field.min_items or 0} to {field.max_items or "any number of"} items'
+            if item:
+                message += f' where each item {item_message[0].lower()}{item_message[1:]}'
+            return ' or '.join(tests), message
+
+        # Raw y tipos sin restricciones: cualquier valor
+        return None, None
+
+    def model_function(self, model, partial):
+        self.counter += 1
+        name = f'_check{self.counter}'
+        lines = [
+            f'def {name}(data, errors, prefix):',
+            '    if data.__class__ is not dict:',
+            "        errors[prefix[:-1] or 'payload'] = 'Must be an object'",
+            '        return',
+            '    get = data.get',
+        ]
+        for key, field in model.items():
+            if isinstance(field, type):
+                # flask_restx acepta la clase sin instanciar (fields.String) como campo sin opciones
+                field = field()
+            lines.append(f'    value = get({key!r}, _MISSING)')
+            if field.required and not partial:
+                lines.append('    if value is _MISSING or value is None:')
+                lines.append(f"        errors[prefix + {key!r}] = 'Missing required field'")
+            else:
+                lines.append('    if value is _MISSING or value is None:')
+                lines.append('        pass')
+            if isinstance(field, fields.Nested):
+                nested = self.model_function(field.nested, partial)
+                lines.append('    else:')
+                lines.append(f'        {nested}(value, errors, prefix + {key + "."!r})')
+                continue
+            test, message = self.condition(field, 'value')
+            if test:
+                lines.append(f'    elif {test}:')
+                lines.append(f'        errors[prefix + {key!r}] = {message!r}')
+        if getattr(model, '__strict__', False):
+            known = self.constant(frozenset(model))
+            lines.append(f'    for key in data.keys() - {known}:')
+            lines.append("        errors[prefix + str(key)] = 'Unknown field'")
+        self.functions.append('\n'.join(lines))
+        return name
+
+
+def compile_model(model, partial=False):
+    """Build the Validator of a flask_restx model; with `partial`, required fields may be omitted."""
+    compiler = _Compiler()
+    name = compiler.model_function(model, partial)
+    source = '\n\n'.join(compiler.functions)
+    exec(compile(source, f'<validator {model.name}>', 'exec'), compiler.namespace)
+    return Validator(model, compiler.namespace[name], source)
+
+
+def validated(model, many=False, partial=False, max_items=None):
+    """Validate the JSON body against `model` before the view runs; 400 with every error otherwise."""
+    validator = compile_model(model, partial)
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            errors = validator.validate(request.get_json(silent=True), many=many, max_items=max_items)
+            if errors:
+                abort(400, 'Input payload validation failed', errors=errors)
+            return view(*args, **kwargs)
+        wrapper.validator = validator
+        return wrapper
+    return decorator
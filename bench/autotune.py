@@ -0,0 +1,152 @@
+"""
+Autotune the inference worker x thread split for /api/ai/predict.
+
+For every (workers, threads) combination that fits in the core budget, starts
+`workers` processes configured like production workers (INFERENCE_WORKERS,
+INFERENCE_THREADS, INFERENCE_PIN_CPUS), drives /api/ai/predict through the
+Flask test client in all of them at once and reports the combined throughput
+and latency percentiles. Each worker count is also run with the unbudgeted
+default (every worker using every core) for comparison.
+
+    python -m bench.autotune --duration 10 --json /tmp/autotune.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import time
+
+DATASET = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'ai', 'disease_dataset.csv')
+
+
+def _payloads(limit=1000):
+    import pandas as pd
+    return pd.read_csv(DATASET, nrows=limit).drop(columns=['patient_id', 'diagnosis']).to_dict('records')
+
+
+def _worker(settings, barrier, duration, results):
+    os.environ.update({
+        'INFERENCE_CPU_CORES': str(settings['cores']),
+        'INFERENCE_WORKERS': str(settings['workers']),
+        'INFERENCE_THREADS': str(settings['threads']),
+        'INFERENCE_PIN_CPUS': 'true' if settings['pin'] else 'false',
+        'PREDICTION_LOG_ENABLED': 'false',
+        'AUDIT_ENABLED': 'false',
+        'SCHEMA_CHECK': 'off',
+    })
+    os.environ.setdefault('SQLALCHEMY_DATABASE_URI', 'sqlite://')
+    os.environ.setdefault('SECRET_KEY', 'autotune')
+
+    from app import create_app
+    app = create_app()
+    client = app.test_client()
+    payloads = _payloads()
+    for payload in payloads[:20]:
+        client.post('/api/ai/predict', json=payload)
+
+    latencies = []
+    barrier.wait()
+    deadline = time.perf_counter() + duration
+    index = 0
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        response = client.post('/api/ai/predict', json=payloads[index % len(payloads)])
+        latencies.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            results.put({'error': response.status_code})
+            return
+        index += 1
+    results.put({'latencies': latencies})
+
+
+def _percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))] * 1000
+
+
+def run_trial(settings, duration):
+    ctx = multiprocessing.get_context('spawn')
+    barrier = ctx.Barrier(settings['workers'])
+    results = ctx.Queue()
+    processes = [ctx.Process(target=_worker, args=(settings, barrier, duration, results))
+                 for _ in range(settings['workers'])]
+    for process in processes:
+        process.start()
+    outputs = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    errors = [output['error'] for output in outputs if 'error' in output]
+    if errors:
+        raise RuntimeError(f'/api/ai/predict returned {errors[0]} during trial {settings}')
+    latencies = sorted(latency for output in outputs for latency in output['latencies'])
+    return {
+        **settings,
+        'requests': len(latencies),
+        'throughput_rps': len(latencies) / duration,
+        'p50_ms': _percentile(latencies, 0.50),
+        'p95_ms': _percentile(latencies, 0.95),
+        'p99_ms': _percentile(latencies, 0.99),
+    }
+
+
+def combinations(cores, max_workers=None):
+    """(workers, threads) pairs within the budget plus the unbudgeted default per worker count."""
+    counts = sorted({n for n in (1, 2, 4, 8, 16, 32, 64) if n <= cores} | {cores})
+    worker_counts = [n for n in counts if max_workers is None or n <= max_workers]
+    trials = []
+    for workers in worker_counts:
+        for threads in counts:
+            if workers * threads <= cores:
+                trials.append((workers, threads, False))
+        if workers * cores > cores:
+            trials.append((workers, cores, True))
+    return trials
+
+
+def print_report(report):
+    header = f"{'workers':>7} {'threads':>7} {'pin':>4} {'budget':>7} {'reqs':>7} {'req/s':>9} {'p50ms':>8} {'p95ms':>8} {'p99ms':>8}"
+    print(header)
+    print('-' * len(header))
+    for row in report['trials']:
+        budget = 'over' if row['oversubscribed'] else 'ok'
+        print(f"{row['workers']:>7} {row['threads']:>7} {'yes' if row['pin'] else 'no':>4} {budget:>7} "
+              f"{row['requests']:>7} {row['throughput_rps']:>9.1f} {row['p50_ms']:>8.2f} "
+              f"{row['p95_ms']:>8.2f} {row['p99_ms']:>8.2f}")
+    best = report['best']
+    print(f"\nBest for {report['cores']} cores: {best['workers']} workers x {best['threads']} threads "
+          f"({best['throughput_rps']:.1f} req/s)")
+    print(f"  INFERENCE_WORKERS={best['workers']} INFERENCE_THREADS={best['threads']} "
+          f"INFERENCE_PIN_CPUS={'true' if best['pin'] else 'false'}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cores', type=int, help='Core budget (default: every core available to this process)')
+    parser.add_argument('--max-workers', type=int)
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds per trial')
+    parser.add_argument('--pin', action='store_true', help='Also try every budgeted combination with CPU pinning')
+    parser.add_argument('--json', dest='json_path', help='Also write the report to this file')
+    args = parser.parse_args(argv)
+
+    cores = args.cores or len(os.sched_getaffinity(0))
+    trials = []
+    for workers, threads, oversubscribed in combinations(cores, args.max_workers):
+        for pin in ((False, True) if args.pin and not oversubscribed else (False,)):
+            settings = {'cores': cores, 'workers': workers, 'threads': threads, 'pin': pin}
+            result = run_trial(settings, args.duration)
+            result['oversubscribed'] = oversubscribed
+            trials.append(result)
+            print(f"  {workers} x {threads}{' pinned' if pin else ''}: {result['throughput_rps']:.1f} req/s",
+                  flush=True)
+
+    budgeted = [trial for trial in trials if not trial['oversubscribed']]
+    report = {'cores': cores, 'duration_s': args.duration, 'trials': trials,
+              'best': max(budgeted, key=lambda trial: trial['throughput_rps'])}
+    print()
+    print_report(report)
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Benchmark: paciente deletion through the ORM vs. database-side cascades.
+
+For each child-row count, seeds a batch of pacientes and deletes them one at a
+time, either loading and deleting every child row through the session (what
+an ORM cascade does) or with `Paciente.delete_pacientes` (one DELETE per root,
+ON DELETE CASCADE in the database).
+
+    python -m bench.deletes --db sqlite:////tmp/medibax_deletes.db
+"""
+import argparse
+import os
+import statistics
+import time
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='sqlite:////tmp/medibax_deletes.db')
+    parser.add_argument('--pacientes', type=int, default=20, help='Pacientes deleted per measurement')
+    parser.add_argument('--children', type=int, nargs='+', default=[10, 100, 1000],
+                        help='Rows per child table per expediente')
+    args = parser.parse_args(argv)
+
+    os.environ['SQLALCHEMY_DATABASE_URI'] = args.db
+    os.environ.setdefault('SECRET_KEY', 'bench')
+    os.environ.setdefault('AUDIT_ENABLED', 'false')
+
+    from app import create_app, db
+    from app.models import Paciente
+    from bench.seed import SeedPlan, seed
+
+    def orm_delete(id_paciente):
+        paciente = db.session.get(Paciente, id_paciente)
+        for expediente in paciente.expedientes:
+            for collection in (expediente.modificaciones, expediente.historias_clinicas,
+                               expediente.antecedentes_personales, expediente.antecedentes_familiares):
+                for row in collection:
+                    db.session.delete(row)
+            db.session.delete(expediente)
+        db.session.delete(paciente)
+        db.session.commit()
+
+    def cascade_delete(id_paciente):
+        Paciente.delete_pacientes(ids=[id_paciente])
+
+    app = create_app()
+    with app.app_context():
+        print(f"{'children':>9} {'rows/paciente':>14} {'ORM ms':>10} {'cascade ms':>11}")
+        for children in args.children:
+            plan = SeedPlan(args.pacientes, modificaciones_por_expediente=children,
+                            historias_por_expediente=children, antecedentes_por_expediente=children)
+            timings = {}
+            for name, delete in (('orm', orm_delete), ('cascade', cascade_delete)):
+                seeded = seed(plan, log=lambda *a: None)
+                samples = []
+                for offset in range(plan.pacientes):
+                    start = time.perf_counter()
+                    delete(seeded.first_paciente + offset)
+                    samples.append(time.perf_counter() - start)
+                    db.session.remove()
+                timings[name] = statistics.median(samples) * 1000
+            rows = plan.total_rows() // plan.pacientes - 2
+            print(f"{children:>9} {rows:>14} {timings['orm']:>10.2f} {timings['cascade']:>11.2f}")
+
+
+if __name__ == '__main__':
+    main()
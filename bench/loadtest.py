@@ -0,0 +1,224 @@
+"""
+Load-test harness for the expediente and auth endpoints.
+
+Seeds a local database with synthetic data, replays a weighted mix of requests
+through the Flask test client at a fixed concurrency and reports per-endpoint
+latency percentiles and SQL query counts.
+
+    python -m bench.loadtest --db sqlite:////tmp/medibax_lt.db --usuarios 200000 \
+        --requests 20000 --concurrency 16
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class QueryCounter:
+    """Counts SQL statements executed by the current thread."""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def install(self, engine):
+        from sqlalchemy import event
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self._local.count = getattr(self._local, 'count', 0) + 1
+
+    def reset(self):
+        self._local.count = 0
+
+    @property
+    def count(self):
+        return getattr(self._local, 'count', 0)
+
+
+class Endpoint:
+    def __init__(self, name, weight, build, expected=(200, 201)):
+        self.name = name
+        self.weight = weight
+        self.build = build
+        self.expected = expected
+
+
+def default_mix(seeded, include_lists=False):
+    def paciente_get(rng, ctx):
+        return 'GET', f'/expediente/paciente/{seeded.random_paciente(rng)}', {}
+
+    def paciente_put(rng, ctx):
+        return 'PUT', f'/expediente/paciente/{seeded.random_paciente(rng)}', {
+            'json': {'telefono': f'33{rng.randrange(10 ** 8):08d}'}
+        }
+
+    def expediente_get(rng, ctx):
+        return 'GET', f'/expediente/expediente/{seeded.random_expediente(rng)}', {}
+
+    def historia_post(rng, ctx):
+        return 'POST', '/expediente/historia_clinica', {
+            'json': {'id_expediente': seeded.random_expediente(rng), 'motivo_consulta': 'Consulta de control'}
+        }
+
+    def modificacion_post(rng, ctx):
+        return 'POST', '/expediente/modificacion', {
+            'json': {'id_expediente': seeded.random_expediente(rng), 'descripcion': 'Actualización'}
+        }
+
+    def login(rng, ctx):
+        from bench.seed import PASSWORD
+        return 'POST', '/auth/login', {
+            'json': {'email': seeded.email(seeded.random_usuario(rng)), 'password': PASSWORD}
+        }
+
+    def protected(rng, ctx):
+        return 'GET', '/auth/protected', {'headers': {'Authorization': f"Bearer {ctx['token']}"}}
+
+    mix = [
+        Endpoint('GET /expediente/paciente/<id>', 30, paciente_get),
+        Endpoint('GET /expediente/expediente/<id>', 25, expediente_get),
+        Endpoint('PUT /expediente/paciente/<id>', 5, paciente_put),
+        Endpoint('POST /expediente/historia_clinica', 8, historia_post),
+        Endpoint('POST /expediente/modificacion', 7, modificacion_post),
+        Endpoint('GET /auth/protected', 20, protected),
+        Endpoint('POST /auth/login', 5, login),
+    ]
+    if include_lists:
+        mix += [
+            Endpoint('GET /expediente/paciente', 1, lambda rng, ctx: ('GET', '/expediente/paciente', {})),
+            Endpoint('GET /expediente/expediente', 1, lambda rng, ctx: ('GET', '/expediente/expediente', {})),
+        ]
+    return mix
+
+
+class Stats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.queries = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    def record(self, name, elapsed, queries, status, ok):
+        with self._lock:
+            self.latencies[name].append(elapsed)
+            self.queries[name].append(queries)
+            self.statuses[name][status] += 1
+            if not ok:
+                self.errors[name] += 1
+
+    def report(self, wall_time):
+        rows = []
+        for name, values in sorted(self.latencies.items()):
+            values = sorted(values)
+            queries = self.queries[name]
+            rows.append({
+                'endpoint': name,
+                'requests': len(values),
+                'errors': self.errors[name],
+                'p50_ms': _percentile(values, 50) * 1000,
+                'p95_ms': _percentile(values, 95) * 1000,
+                'p99_ms': _percentile(values, 99) * 1000,
+                'max_ms': values[-1] * 1000,
+                'queries_avg': sum(queries) / len(queries),
+                'queries_max': max(queries),
+                'statuses': dict(self.statuses[name]),
+            })
+        total = sum(row['requests'] for row in rows)
+        return {'requests': total, 'wall_time_s': wall_time, 'throughput_rps': total / wall_time, 'endpoints': rows}
+
+
+def _percentile(sorted_values, pct):
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def print_report(report):
+    header = f"{'endpoint':<38} {'reqs':>7} {'err':>5} {'p50ms':>8} {'p95ms':>8} {'p99ms':>8} {'maxms':>8} {'q/avg':>6} {'q/max':>6}"
+    print(header)
+    print('-' * len(header))
+    for row in report['endpoints']:
+        print(f"{row['endpoint']:<38} {row['requests']:>7} {row['errors']:>5} {row['p50_ms']:>8.2f} "
+              f"{row['p95_ms']:>8.2f} {row['p99_ms']:>8.2f} {row['max_ms']:>8.2f} "
+              f"{row['queries_avg']:>6.1f} {row['queries_max']:>6}")
+    print(f"\n{report['requests']} requests in {report['wall_time_s']:.1f}s "
+          f"({report['throughput_rps']:.1f} req/s)")
+
+
+def replay(app, counter, mix, total_requests, concurrency, seed_value=42, duration=None):
+    stats = Stats()
+    weights = [endpoint.weight for endpoint in mix]
+    deadline = time.perf_counter() + duration if duration else None
+    remaining = iter(range(total_requests))
+    remaining_lock = threading.Lock()
+
+    def take():
+        if deadline and time.perf_counter() >= deadline:
+            return False
+        with remaining_lock:
+            return next(remaining, None) is not None
+
+    def worker(index):
+        rng = random.Random(seed_value + index)
+        client = app.test_client()
+        ctx = {'token': _login_token(app)}
+        while take():
+            endpoint = rng.choices(mix, weights)[0]
+            method, url, kwargs = endpoint.build(rng, ctx)
+            counter.reset()
+            start = time.perf_counter()
+            response = client.open(url, method=method, **kwargs)
+            elapsed = time.perf_counter() - start
+            stats.record(endpoint.name, elapsed, counter.count, response.status_code,
+                         response.status_code in endpoint.expected)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    return stats.report(time.perf_counter() - start)
+
+
+def _login_token(app):
+    from flask_jwt_extended import create_access_token
+    with app.app_context():
+        return create_access_token(identity="1")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='sqlite:////tmp/medibax_loadtest.db', help='SQLAlchemy URL of the local database')
+    parser.add_argument('--usuarios', type=int, default=100000, help='Usuarios (and pacientes) to seed')
+    parser.add_argument('--skip-seed', action='store_true', help='Reuse the data already in the database')
+    parser.add_argument('--requests', type=int, default=10000)
+    parser.add_argument('--duration', type=float, help='Stop after this many seconds')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--include-lists', action='store_true', help='Add the unpaginated list endpoints to the mix')
+    parser.add_argument('--json', dest='json_path', help='Also write the report to this file')
+    args = parser.parse_args(argv)
+
+    os.environ['SQLALCHEMY_DATABASE_URI'] = args.db
+    os.environ.setdefault('SECRET_KEY', 'loadtest')
+
+    from app import create_app, db
+    from bench.seed import SeedPlan, seed, detect
+
+    app = create_app()
+    counter = QueryCounter()
+    with app.app_context():
+        counter.install(db.engine)
+        seeded = detect() if args.skip_seed else seed(SeedPlan(args.usuarios))
+
+    mix = default_mix(seeded, include_lists=args.include_lists)
+    report = replay(app, counter, mix, args.requests, args.concurrency, duration=args.duration)
+    print_report(report)
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
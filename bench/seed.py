@@ -0,0 +1,203 @@
+import random
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, func, select
+
+from app import db, bcrypt
+from app.migrations import upgrade
+from app.models import (
+    User, Paciente, Expediente, ModificacionExpediente, HistoriaClinica,
+    AntecedentesPersonales, AntecedentesFamiliares
+)
+
+PASSWORD = 'Loadtest123'
+CHUNK_SIZE = 10000
+
+ESTADOS = {
+    'Jalisco': ['Guadalajara', 'Zapopan', 'Tlaquepaque'],
+    'Nuevo León': ['Monterrey', 'San Nicolás', 'Apodaca'],
+    'CDMX': ['Coyoacán', 'Iztapalapa', 'Benito Juárez'],
+    'Puebla': ['Puebla', 'Cholula', 'Tehuacán'],
+    'Yucatán': ['Mérida', 'Valladolid', 'Progreso'],
+}
+NOMBRES = ['María', 'José', 'Juan', 'Guadalupe', 'Luis', 'Ana', 'Carlos', 'Sofía', 'Miguel', 'Fernanda']
+APELLIDOS = ['Hernández', 'García', 'Martínez', 'López', 'González', 'Pérez', 'Rodríguez', 'Sánchez', 'Ramírez', 'Cruz']
+MOTIVOS = ['Fiebre', 'Dolor de cabeza', 'Tos persistente', 'Dolor abdominal', 'Control anual', 'Mareo']
+ANTECEDENTES = ['Diabetes tipo 2', 'Hipertensión', 'Asma', 'Alergia a penicilina', 'Cardiopatía', 'Ninguno']
+
+
+class SeedPlan:
+    """Row counts for a synthetic dataset, derived from the number of usuarios."""
+
+    def __init__(self, usuarios, expedientes_por_paciente=2, modificaciones_por_expediente=4,
+                 historias_por_expediente=4, antecedentes_por_expediente=2):
+        self.usuarios = usuarios
+        self.expedientes_por_paciente = expedientes_por_paciente
+        self.modificaciones_por_expediente = modificaciones_por_expediente
+        self.historias_por_expediente = historias_por_expediente
+        self.antecedentes_por_expediente = antecedentes_por_expediente
+
+    @property
+    def pacientes(self):
+        return self.usuarios
+
+    @property
+    def expedientes(self):
+        return self.pacientes * self.expedientes_por_paciente
+
+    def total_rows(self):
+        per_expediente = (self.modificaciones_por_expediente + self.historias_por_expediente
+                          + 2 * self.antecedentes_por_expediente)
+        return self.usuarios + self.pacientes + self.expedientes * (1 + per_expediente)
+
+
+class SeedResult:
+    """Id ranges of the rows inserted by `seed`, used to build requests against them."""
+
+    def __init__(self, first_usuario, first_paciente, first_expediente, plan):
+        self.first_usuario = first_usuario
+        self.first_paciente = first_paciente
+        self.first_expediente = first_expediente
+        self.plan = plan
+
+    def random_usuario(self, rng):
+        return self.first_usuario + rng.randrange(self.plan.usuarios)
+
+    def random_paciente(self, rng):
+        return self.first_paciente + rng.randrange(self.plan.pacientes)
+
+    def random_expediente(self, rng):
+        return self.first_expediente + rng.randrange(self.plan.expedientes)
+
+    @staticmethod
+    def email(id_usuario):
+        return f'user{id_usuario}@loadtest.local'
+
+
+def _next_id(column):
+    return (db.session.execute(select(func.max(column))).scalar() or 0) + 1
+
+
+def _random_date(rng, now, max_days):
+    return now - timedelta(days=rng.random() * max_days)
+
+
+def _insert_chunked(table, rows):
+    buffer = []
+    for row in rows:
+        buffer.append(row)
+        if len(buffer) >= CHUNK_SIZE:
+            db.session.execute(insert(table), buffer)
+            buffer = []
+    if buffer:
+        db.session.execute(insert(table), buffer)
+    db.session.commit()
+
+
+def _fast_sqlite_pragmas():
+    if db.engine.dialect.name == 'sqlite':
+        db.session.execute(db.text('PRAGMA synchronous=OFF'))
+        db.session.execute(db.text('PRAGMA journal_mode=WAL'))
+
+
+def seed(plan, seed_value=42, history_days=5 * 365, log=print):
+    """Bulk-insert a synthetic dataset following `plan`. Must run inside an app context."""
+    upgrade(log=log)
+    rng = random.Random(seed_value)
+    now = datetime.utcnow()
+    _fast_sqlite_pragmas()
+
+    first_usuario = _next_id(User.id_usuario)
+    first_paciente = _next_id(Paciente.id_paciente)
+    first_expediente = _next_id(Expediente.id_expediente)
+    password_hash = bcrypt.generate_password_hash(PASSWORD).decode('utf-8')
+
+    log(f'Seeding {plan.total_rows():,} rows...')
+
+    _insert_chunked(User.__table__, (
+        {
+            'id_usuario': first_usuario + i,
+            'email': SeedResult.email(first_usuario + i),
+            'password': password_hash,
+            'created_at': now,
+            'updated_at': now,
+        }
+        for i in range(plan.usuarios)
+    ))
+    log(f'  usuarios: {plan.usuarios:,}')
+
+    def pacientes():
+        estados = list(ESTADOS)
+        for i in range(plan.pacientes):
+            estado = rng.choice(estados)
+            created = _random_date(rng, now, history_days)
+            yield {
+                'id_paciente': first_paciente + i,
+                'nombre': rng.choice(NOMBRES),
+                'apellido_paterno': rng.choice(APELLIDOS),
+                'apellido_materno': rng.choice(APELLIDOS),
+                'curp': f'LT{first_paciente + i:016d}',
+                'telefono': f'33{rng.randrange(10 ** 8):08d}',
+                'direccion': f'Calle {rng.randrange(1, 500)} #{rng.randrange(1, 2000)}',
+                'estado': estado,
+                'ciudad': rng.choice(ESTADOS[estado]),
+                'estado_civil': rng.choice(['Soltero', 'Casado', 'Viudo']),
+                'ocupacion': rng.choice(['Docente', 'Comerciante', 'Estudiante', 'Obrero']),
+                'id_usuario': first_usuario + i,
+                'created_at': created,
+                'updated_at': created,
+            }
+    _insert_chunked(Paciente.__table__, pacientes())
+    log(f'  pacientes: {plan.pacientes:,}')
+
+    _insert_chunked(Expediente.__table__, (
+        {
+            'id_expediente': first_expediente + i,
+            'id_paciente': first_paciente + i // plan.expedientes_por_paciente,
+            'fecha_creacion': _random_date(rng, now, history_days),
+            'descripcion': f'Expediente {i % plan.expedientes_por_paciente + 1}',
+            'token_unico': str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+        }
+        for i in range(plan.expedientes)
+    ))
+    log(f'  expedientes: {plan.expedientes:,}')
+
+    def children(count, build):
+        for i in range(plan.expedientes):
+            for _ in range(count):
+                row = build()
+                row['id_expediente'] = first_expediente + i
+                yield row
+
+    _insert_chunked(ModificacionExpediente.__table__, children(plan.modificaciones_por_expediente, lambda: {
+        'fecha_modificacion': _random_date(rng, now, history_days),
+        'descripcion': 'Actualización de datos',
+    }))
+    log(f'  modificaciones_expedientes: {plan.expedientes * plan.modificaciones_por_expediente:,}')
+
+    _insert_chunked(HistoriaClinica.__table__, children(plan.historias_por_expediente, lambda: {
+        'motivo_consulta': rng.choice(MOTIVOS),
+        'fecha_registro': _random_date(rng, now, history_days),
+    }))
+    log(f'  historias_clinicas: {plan.expedientes * plan.historias_por_expediente:,}')
+
+    for model in (AntecedentesPersonales, AntecedentesFamiliares):
+        _insert_chunked(model.__table__, children(plan.antecedentes_por_expediente, lambda: {
+            'descripcion': rng.choice(ANTECEDENTES),
+            'fecha_registro': _random_date(rng, now, history_days),
+        }))
+        log(f'  {model.__tablename__}: {plan.expedientes * plan.antecedentes_por_expediente:,}')
+
+    return SeedResult(first_usuario, first_paciente, first_expediente, plan)
+
+
+def detect():
+    """Rebuild a `SeedResult` from an already seeded database."""
+    usuarios = db.session.execute(select(func.count(), func.min(User.id_usuario))).one()
+    pacientes = db.session.execute(select(func.count(), func.min(Paciente.id_paciente))).one()
+    expedientes = db.session.execute(select(func.count(), func.min(Expediente.id_expediente))).one()
+    if not usuarios[0] or not pacientes[0] or not expedientes[0]:
+        raise RuntimeError('La base de datos no tiene datos sembrados')
+    plan = SeedPlan(usuarios[0], expedientes_por_paciente=max(1, expedientes[0] // pacientes[0]))
+    return SeedResult(usuarios[1], pacientes[1], expedientes[1], plan)
@@ -0,0 +1,73 @@
+"""
+Micro-benchmark: ORM `as_dict` serialization vs. the column-tuple encoders.
+
+    python -m bench.serialization --db sqlite:////tmp/medibax_serialization.db --usuarios 50000
+"""
+import argparse
+import gc
+import json
+import os
+import time
+import tracemalloc
+
+
+def measure(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    gc.collect()
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='sqlite:////tmp/medibax_serialization.db')
+    parser.add_argument('--usuarios', type=int, default=50000)
+    parser.add_argument('--skip-seed', action='store_true')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    os.environ['SQLALCHEMY_DATABASE_URI'] = args.db
+    os.environ.setdefault('SECRET_KEY', 'bench')
+
+    from app import create_app, db
+    from app.models import Paciente, Expediente
+    from app.serializers import encoder_for
+    from bench.seed import SeedPlan, seed
+
+    app = create_app()
+    with app.app_context():
+        if not args.skip_seed:
+            seed(SeedPlan(args.usuarios, modificaciones_por_expediente=0, historias_por_expediente=0,
+                          antecedentes_por_expediente=0))
+
+        for model in (Paciente, Expediente):
+            def orm_path():
+                body = json.dumps([row.as_dict() for row in model.query.all()])
+                db.session.remove()
+                return body
+
+            def fast_path():
+                encoder = encoder_for(model)
+                body = encoder.dumps_chunks(encoder.stream())
+                db.session.remove()
+                return body
+
+            assert json.loads(orm_path()) == json.loads(fast_path())
+            orm_time, orm_peak = measure(orm_path, args.repeat)
+            fast_time, fast_peak = measure(fast_path, args.repeat)
+            print(f'{model.__tablename__}:')
+            print(f'  as_dict + json   {orm_time * 1000:9.1f} ms   peak {orm_peak / 2 ** 20:8.1f} MiB')
+            print(f'  row encoder      {fast_time * 1000:9.1f} ms   peak {fast_peak / 2 ** 20:8.1f} MiB')
+            print(f'  speedup          {orm_time / fast_time:9.1f}x  memory {orm_peak / fast_peak:6.1f}x less')
+
+
+if __name__ == '__main__':
+    main()
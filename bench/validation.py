@@ -0,0 +1,128 @@
+"""
+Micro-benchmark: compiled request validators vs. jsonschema.
+
+Validates /api/ai/predict and /expediente/paciente payloads (valid and
+invalid, single records and a batch) with:
+
+  compiled         app.validation.compile_model, built once
+  jsonschema       jsonschema.validate() per request, as a view would call it
+  jsonschema-reuse one Draft4Validator built up front, iter_errors per request
+
+The JSON Schema is the one flask_restx publishes for the same model (with
+optional fields allowed to be null, like the compiled validator), and every
+payload is checked to get the same set of invalid fields from all three.
+
+    python -m bench.validation --repeat 5
+"""
+import argparse
+import copy
+import os
+import time
+
+DATASET = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'ai', 'disease_dataset.csv')
+
+
+def json_schema(model):
+    schema = copy.deepcopy(model._schema)
+    required = set(schema.get('required', ()))
+    for name, prop in schema['properties'].items():
+        if name not in required and 'type' in prop:
+            prop['type'] = [prop['type'], 'null']
+            if 'enum' in prop:
+                prop['enum'] = prop['enum'] + [None]
+    return schema
+
+
+def batch_schema(schema):
+    return {'type': 'array', 'items': schema}
+
+
+def jsonschema_fields(validator, payload):
+    invalid = set()
+    for error in validator.iter_errors(payload):
+        path = list(error.absolute_path)
+        if error.validator == 'required':
+            path.append(error.message.split("'")[1])
+        invalid.add('.'.join(f'[{p}]' if isinstance(p, int) else p for p in path))
+    return invalid
+
+
+def measure(fn, payload, repeat, number):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn(payload)
+        best = min(best, time.perf_counter() - start)
+    return best / number
+
+
+def cases():
+    import pandas as pd
+    records = pd.read_csv(DATASET, nrows=1000).drop(columns=['patient_id', 'diagnosis']).to_dict('records')
+    invalid = dict(records[0], fever=2, age='35', sex='X')
+    del invalid['cough']
+    paciente = {
+        'nombre': 'Carmen', 'apellido_paterno': 'Gomez', 'apellido_materno': 'Ruiz',
+        'curp': 'GOMC800101MJCMRR09', 'telefono': '3312345678', 'direccion': 'Av. Juarez 100',
+        'estado': 'Jalisco', 'ciudad': 'Guadalajara', 'estado_civil': 'Casada', 'ocupacion': 'Docente',
+        'id_usuario': 1,
+    }
+    paciente_invalido = dict(paciente, curp='GOMC800101', telefono='33-1234', id_usuario='1')
+    return [
+        ('predict', 'valid', False, records[0]),
+        ('predict', 'invalid', False, invalid),
+        ('predict', 'batch x1000', True, records),
+        ('paciente', 'valid', False, paciente),
+        ('paciente', 'invalid', False, paciente_invalido),
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--number', type=int, default=2000, help='Validations per timing (divided by 100 for batches)')
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault('SECRET_KEY', 'bench')
+    os.environ.setdefault('PREDICTION_LOG_ENABLED', 'false')
+
+    import jsonschema
+    from app.ai import prediction_input, prediction_validator
+    from app.expediente import paciente_model
+    from app.validation import compile_model
+
+    validators = {
+        'predict': (prediction_validator, json_schema(prediction_input)),
+        'paciente': (compile_model(paciente_model), json_schema(paciente_model)),
+    }
+
+    header = f"{'payload':<10} {'case':<12} {'compiled us':>12} {'jsonschema us':>14} {'reuse us':>10} {'speedup':>8} {'vs reuse':>9}"
+    print(header)
+    print('-' * len(header))
+    for name, label, many, payload in cases():
+        compiled, schema = validators[name]
+        schema = batch_schema(schema) if many else schema
+        reused = jsonschema.Draft4Validator(schema)
+
+        expected = jsonschema_fields(reused, payload)
+        got = set(compiled.validate(payload, many=many))
+        if expected != got:
+            raise SystemExit(f'{name}/{label}: jsonschema reports {sorted(expected)}, compiled {sorted(got)}')
+
+        def per_request(data):
+            try:
+                jsonschema.validate(data, schema, cls=jsonschema.Draft4Validator)
+            except jsonschema.ValidationError:
+                pass
+
+        number = max(1, args.number // 100) if many else args.number
+        compiled_s = measure(lambda data: compiled.validate(data, many=many), payload, args.repeat, number)
+        jsonschema_s = measure(per_request, payload, args.repeat, max(1, number // 10))
+        reuse_s = measure(lambda data: list(reused.iter_errors(data)), payload, args.repeat, number)
+        print(f"{name:<10} {label:<12} {compiled_s * 1e6:>12.1f} {jsonschema_s * 1e6:>14.1f} {reuse_s * 1e6:>10.1f} "
+              f"{jsonschema_s / compiled_s:>7.0f}x {reuse_s / compiled_s:>8.0f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -3,4 +3,105 @@ import os
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY')
     SQLALCHEMY_DATABASE_URI = os.environ.get('SQLALCHEMY_DATABASE_URI')
-    SQLALCHEMY_TRACK_MODIFICATIONS = False
\ No newline at end of file
+    # Verificacion de la version del esquema al arrancar: 'warn', 'error' u 'off'
+    SCHEMA_CHECK = os.environ.get('SCHEMA_CHECK', 'warn')
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Cache de entidades: 'shared' (SQLite local compartido entre workers), 'memory' (LRU por proceso;
+    # solo con un worker, los demas no ven sus invalidaciones) o 'none'
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'shared')
+    CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 10000))
+    CACHE_TTL = float(os.environ.get('CACHE_TTL', 300))
+    CACHE_SHARED_PATH = os.environ.get('CACHE_SHARED_PATH', '/tmp/medibax_cache.sqlite')
+
+    # Vista publica de expedientes por token (QR)
+    PUBLIC_VIEW_BACKEND = os.environ.get('PUBLIC_VIEW_BACKEND', 'shared')
+    PUBLIC_VIEW_MAX_ENTRIES = int(os.environ.get('PUBLIC_VIEW_MAX_ENTRIES', 100000))
+    PUBLIC_VIEW_TTL = float(os.environ.get('PUBLIC_VIEW_TTL', 86400))
+    PUBLIC_VIEW_MAX_AGE = int(os.environ.get('PUBLIC_VIEW_MAX_AGE', 60))  # segundos, Cache-Control: private
+    PUBLIC_RATE_LIMIT = int(os.environ.get('PUBLIC_RATE_LIMIT', 30))  # solicitudes por minuto por token
+
+    # Auditoria diferida de modificaciones (write-behind)
+    AUDIT_ENABLED = os.environ.get('AUDIT_ENABLED', 'true').lower() == 'true'
+    AUDIT_QUEUE_SIZE = int(os.environ.get('AUDIT_QUEUE_SIZE', 10000))
+    AUDIT_BATCH_SIZE = int(os.environ.get('AUDIT_BATCH_SIZE', 500))
+    AUDIT_FLUSH_INTERVAL = float(os.environ.get('AUDIT_FLUSH_INTERVAL', 2.0))
+    AUDIT_FSYNC = os.environ.get('AUDIT_FSYNC', 'false').lower() == 'true'
+    AUDIT_SPILL_DIR = os.environ.get('AUDIT_SPILL_DIR', '/tmp/medibax_audit')
+
+    # Archivo historico: filas mas antiguas que ARCHIVE_AFTER_DAYS se mueven a las
+    # tablas *_archivo en lotes de ARCHIVE_BATCH_SIZE, con ARCHIVE_PAUSE segundos entre lotes
+    ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', 730))
+    ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', 1000))
+    ARCHIVE_PAUSE = float(os.environ.get('ARCHIVE_PAUSE', 0.1))
+
+    # Compresion (brotli/gzip segun Accept-Encoding) de respuestas negociadas de al menos este tamano en bytes
+    COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+    COMPRESSION_GZIP_LEVEL = int(os.environ.get('COMPRESSION_GZIP_LEVEL', 6))
+    COMPRESSION_BROTLI_QUALITY = int(os.environ.get('COMPRESSION_BROTLI_QUALITY', 5))
+
+    # Registro de predicciones en Parquet para monitoreo y reentrenamiento
+    PREDICTION_LOG_ENABLED = os.environ.get('PREDICTION_LOG_ENABLED', 'true').lower() == 'true'
+    PREDICTION_LOG_DIR = os.environ.get('PREDICTION_LOG_DIR', '/tmp/medibax_predictions')
+    PREDICTION_LOG_CAPACITY = int(os.environ.get('PREDICTION_LOG_CAPACITY', 65536))  # registros en memoria; el resto se descarta
+    PREDICTION_LOG_BATCH_SIZE = int(os.environ.get('PREDICTION_LOG_BATCH_SIZE', 4096))
+    PREDICTION_LOG_FLUSH_INTERVAL = float(os.environ.get('PREDICTION_LOG_FLUSH_INTERVAL', 5.0))
+    PREDICTION_LOG_ROTATE_ROWS = int(os.environ.get('PREDICTION_LOG_ROTATE_ROWS', 500000))
+    PREDICTION_LOG_ROTATE_SECONDS = int(os.environ.get('PREDICTION_LOG_ROTATE_SECONDS', 3600))
+
+    # Presupuesto de CPU para inferencia: hilos de torch/OpenMP/BLAS por worker = nucleos / workers
+    INFERENCE_CPU_CORES = int(os.environ.get('INFERENCE_CPU_CORES', 0)) or None  # por defecto todos los disponibles
+    INFERENCE_WORKERS = int(os.environ.get('INFERENCE_WORKERS', os.environ.get('WEB_CONCURRENCY', 1)))
+    INFERENCE_THREADS = int(os.environ.get('INFERENCE_THREADS', 0)) or None  # por defecto derivado del presupuesto
+    INFERENCE_PIN_CPUS = os.environ.get('INFERENCE_PIN_CPUS', 'false').lower() == 'true'
+    PREDICT_MAX_BATCH = int(os.environ.get('PREDICT_MAX_BATCH', 1000))  # registros por peticion a /api/ai/predict; mas, con /api/jobs
+
+    # Control de admision por namespace: limite de concurrencia, cola y espera maxima (s) por carril.
+    # Menor prioridad = se atiende primero; las lecturas de expedientes van antes que login y predicciones.
+    ADMISSION_ENABLED = os.environ.get('ADMISSION_ENABLED', 'true').lower() == 'true'
+    ADMISSION_MAX_CONCURRENT = int(os.environ.get('ADMISSION_MAX_CONCURRENT', 32))  # por worker, todos los carriles
+    ADMISSION_LANES = {
+        'expediente': {
+            'priority': 0,
+            'limit': int(os.environ.get('ADMISSION_EXPEDIENTE_LIMIT', 24)),
+            'queue': int(os.environ.get('ADMISSION_EXPEDIENTE_QUEUE', 128)),
+            'budget': float(os.environ.get('ADMISSION_EXPEDIENTE_BUDGET', 0.5)),
+        },
+        'auth': {
+            'priority': 1,
+            'limit': int(os.environ.get('ADMISSION_AUTH_LIMIT', 4)),
+            'queue': int(os.environ.get('ADMISSION_AUTH_QUEUE', 32)),
+            'budget': float(os.environ.get('ADMISSION_AUTH_BUDGET', 2.0)),
+        },
+        'AI': {
+            'priority': 2,
+            'limit': int(os.environ.get('ADMISSION_AI_LIMIT', 8)),
+            'queue': int(os.environ.get('ADMISSION_AI_QUEUE', 64)),
+            'budget': float(os.environ.get('ADMISSION_AI_BUDGET', 1.0)),
+        },
+    }
+
+    # Trabajos en segundo plano (`flask jobs worker`): cola SQLite local y resultados en disco
+    JOBS_DB_PATH = os.environ.get('JOBS_DB_PATH', '/tmp/medibax_jobs.sqlite')
+    JOBS_RESULTS_DIR = os.environ.get('JOBS_RESULTS_DIR', '/tmp/medibax_jobs')
+    JOBS_WORKERS = int(os.environ.get('JOBS_WORKERS', 2))
+    JOBS_POLL_INTERVAL = float(os.environ.get('JOBS_POLL_INTERVAL', 1.0))
+    JOBS_HEARTBEAT_TIMEOUT = float(os.environ.get('JOBS_HEARTBEAT_TIMEOUT', 600))  # segundos sin progreso antes de devolver un trabajo a la cola
+    JOBS_PREDICT_CHUNK = int(os.environ.get('JOBS_PREDICT_CHUNK', 5000))  # filas por lote de prediccion
+    JOBS_QR_MAX = int(os.environ.get('JOBS_QR_MAX', 100000))
+
+    # Revocacion de JWT (logout): filtro de Bloom en memoria por worker, sincronizado desde tokens_revocados
+    REVOCATION_ENABLED = os.environ.get('REVOCATION_ENABLED', 'true').lower() == 'true'
+    REVOCATION_FILTER_CAPACITY = int(os.environ.get('REVOCATION_FILTER_CAPACITY', 100000))
+    REVOCATION_FILTER_ERROR_RATE = float(os.environ.get('REVOCATION_FILTER_ERROR_RATE', 0.001))
+    REVOCATION_SYNC_INTERVAL = float(os.environ.get('REVOCATION_SYNC_INTERVAL', 1.0))  # segundos
+    # Cada sincronizacion vuelve a leer las revocaciones de este margen anterior a la ultima
+    # (commits que tardan en confirmarse y diferencias de reloj entre hosts)
+    REVOCATION_SYNC_MARGIN = float(os.environ.get('REVOCATION_SYNC_MARGIN', 60.0))  # segundos
+
+    # Conteos epidemiologicos de predicciones por (enfermedad, estado/ciudad, dia) para /api/ai/stats
+    EPI_STATS_ENABLED = os.environ.get('EPI_STATS_ENABLED', 'true').lower() == 'true'
+    EPI_STATS_PATH = os.environ.get('EPI_STATS_PATH', '/tmp/medibax_epi.sqlite')  # compartido por los workers del host
+    EPI_STATS_CHECKPOINT_INTERVAL = float(os.environ.get('EPI_STATS_CHECKPOINT_INTERVAL', 10.0))  # segundos
+    EPI_STATS_REFRESH_INTERVAL = float(os.environ.get('EPI_STATS_REFRESH_INTERVAL', 30.0))  # segundos
+    EPI_STATS_MAX_DAYS = int(os.environ.get('EPI_STATS_MAX_DAYS', 366))  # dias por consulta
\ No newline at end of file
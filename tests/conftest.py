@@ -0,0 +1,71 @@
+import os
+import tempfile
+
+import pytest
+
+# config.py lee el entorno al importarse: todo el estado local de la app va a un directorio temporal
+TMP_DIR = tempfile.mkdtemp(prefix='medibax-tests-')
+os.environ.update({
+    'SECRET_KEY': 'tests',
+    'JWT_SECRET_KEY': 'tests-jwt-secret-key-with-enough-bytes',
+    'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(TMP_DIR, 'app.db')}",
+    'SCHEMA_CHECK': 'off',
+    'CACHE_BACKEND': 'memory',
+    'CACHE_SHARED_PATH': os.path.join(TMP_DIR, 'cache.sqlite'),
+    'AUDIT_SPILL_DIR': os.path.join(TMP_DIR, 'audit'),
+    'PREDICTION_LOG_ENABLED': 'false',
+    'EPI_STATS_PATH': os.path.join(TMP_DIR, 'epi.sqlite'),
+    'JOBS_DB_PATH': os.path.join(TMP_DIR, 'jobs.sqlite'),
+    'JOBS_RESULTS_DIR': os.path.join(TMP_DIR, 'jobs'),
+    'ADMISSION_ENABLED': 'false',
+})
+
+from app import create_app, db  # noqa: E402
+from app.migrations import upgrade  # noqa: E402
+
+PASSWORD = 'Tests1234'
+
+
+@pytest.fixture(scope='session')
+def app():
+    app = create_app()
+    app.config['TESTING'] = True
+    with app.app_context():
+        upgrade(log=lambda message: None)
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def app_context(app):
+    with app.app_context():
+        yield
+        db.session.remove()
+
+
+@pytest.fixture
+def signup(client):
+    """Create a user (with its paciente and first expediente) and return its access token."""
+    created = []
+
+    def create():
+        email = f'user{len(created)}-{os.urandom(4).hex()}@tests.local'
+        response = client.post('/auth/signup', json={'email': email, 'password': PASSWORD})
+        assert response.status_code == 201, response.get_json()
+        created.append(email)
+        return response.get_json()['access_token']
+    return create
+
+
+@pytest.fixture
+def token(signup):
+    return signup()
+
+
+@pytest.fixture
+def auth_headers(token):
+    return {'Authorization': f'Bearer {token}'}
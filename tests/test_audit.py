@@ -0,0 +1,50 @@
+import os
+from datetime import datetime
+
+import orjson
+import pytest
+
+from app import audit, db
+from app.models import Expediente, ModificacionExpediente, Paciente
+
+
+@pytest.fixture
+def id_expediente(app_context):
+    paciente = Paciente.create_paciente(
+        nombre='Luis', apellido_paterno='Ruiz', apellido_materno='Paz', curp=None, telefono=None,
+        direccion=None, estado='Sonora', ciudad='Hermosillo', estado_civil=None, ocupacion=None, id_usuario=None)
+    return Expediente.create_expediente(paciente.id_paciente, 'Auditoria').id_expediente
+
+
+def _descripciones(id_expediente):
+    return set(db.session.execute(
+        db.select(ModificacionExpediente.descripcion).where(ModificacionExpediente.id_expediente == id_expediente)
+    ).scalars())
+
+
+def _seed_journal(name, id_expediente, descripcion):
+    os.makedirs(audit.spill_dir, exist_ok=True)
+    event = {'id_expedientes': [id_expediente], 'descripcion': descripcion,
+             'fecha_modificacion': datetime.utcnow().isoformat()}
+    with open(os.path.join(audit.spill_dir, name), 'wb') as f:
+        f.write(orjson.dumps(event) + b'\n')
+
+
+@pytest.mark.parametrize('owner', ['audit-{pid}-0badc0de', 'audit-{pid}'])
+def test_journal_of_previous_boot_with_same_pid_is_replayed(id_expediente, owner):
+    # Proceso anterior con el mismo PID (PID 1 tras reiniciar el contenedor) que murio sin vaciar su journal
+    _seed_journal(f'{owner.format(pid=os.getpid())}.journal', id_expediente, 'antes del reinicio')
+    audit.record('despues del reinicio', id_expediente=id_expediente)
+    audit.replay()
+    audit.flush()
+    assert _descripciones(id_expediente) >= {'antes del reinicio', 'despues del reinicio'}
+
+
+def test_paciente_events_go_to_current_expedientes(id_expediente):
+    id_paciente = db.session.get(Expediente, id_expediente).id_paciente
+    audit.record('evento del paciente', id_paciente=id_paciente)
+    # Un expediente creado despues del evento no lo recibe
+    nuevo = Expediente.create_expediente(id_paciente, 'Posterior').id_expediente
+    audit.flush()
+    assert 'evento del paciente' in _descripciones(id_expediente)
+    assert 'evento del paciente' not in _descripciones(nuevo)
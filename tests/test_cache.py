@@ -0,0 +1,54 @@
+import pytest
+
+from app import db
+from app.cache import EntityCache, LRUBackend, SharedBackend
+from app.models import Paciente
+
+
+@pytest.fixture(params=['memory', 'shared'])
+def entity_cache(request, app_context, tmp_path):
+    cache = EntityCache()
+    cache.db = db
+    if request.param == 'memory':
+        cache.backend = LRUBackend(100, 300)
+    else:
+        cache.backend = SharedBackend(str(tmp_path / 'cache.sqlite'), 100, 300)
+    return cache
+
+
+@pytest.fixture
+def paciente(app_context):
+    return Paciente.create_paciente(
+        nombre='Eva', apellido_paterno='Mora', apellido_materno='Gil', curp=None, telefono=None,
+        direccion=None, estado='Puebla', ciudad='Cholula', estado_civil=None, ocupacion=None, id_usuario=None)
+
+
+def test_invalidation_during_load_is_not_overwritten(entity_cache, paciente):
+    key = f'paciente:{paciente.id_paciente}'
+
+    def stale_loader():
+        # Otro worker confirma un cambio mientras esta lectura todavia trae la fila anterior
+        entity_cache.invalidate(key)
+        return paciente
+
+    assert entity_cache.get_entity(Paciente, key, stale_loader) is paciente
+    assert entity_cache.backend.get(key) is None
+
+    # Sin invalidaciones concurrentes la fila se guarda
+    entity_cache.get_entity(Paciente, key, lambda: paciente)
+    assert entity_cache.backend.get(key) is not None
+    assert entity_cache.stats()['entries'] == 1
+
+
+def test_generation_survives_eviction():
+    backend = LRUBackend(2, 300)
+    generation = backend.generation('a')
+    backend.delete('a', 'b', 'c')
+    backend.set('a', {'x': 1}, generation=generation)
+    assert backend.get('a') is None
+
+
+def test_stats_report_empty_backend(entity_cache):
+    stats = entity_cache.stats()
+    assert stats['backend'] in ('LRUBackend', 'SharedBackend')
+    assert stats['entries'] == 0
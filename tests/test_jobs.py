@@ -0,0 +1,69 @@
+import io
+import os
+import time
+
+import pandas as pd
+import pytest
+
+from app.jobs import DONE, FAILED, QUEUED, JobCancelled, job_queue, work
+
+DATASET = os.path.join(os.path.dirname(__file__), '..', 'ai', 'disease_dataset.csv')
+
+
+@pytest.fixture
+def rows():
+    return pd.read_csv(DATASET, nrows=5)
+
+
+def _submit_file(client, auth_headers, frame):
+    data = {'file': (io.BytesIO(frame.to_csv(index=False).encode()), 'pacientes.csv')}
+    response = client.post('/api/jobs/predict_batch', data=data, headers=auth_headers,
+                           content_type='multipart/form-data')
+    assert response.status_code == 202
+    return response.get_json()['id']
+
+
+def test_stale_heartbeat_is_requeued(app_context):
+    job_id = job_queue.submit('export', {'tabla': 'pacientes'})
+    assert job_queue.claim()['id'] == job_id
+    # El worker sigue vivo (este proceso) pero dejo de reportar progreso
+    job_queue._connection().execute('UPDATE jobs SET heartbeat_at = ? WHERE id = ?',
+                                    (time.time() - job_queue.heartbeat_timeout - 1, job_id))
+    assert job_queue.recover() == 1
+    assert job_queue.get(job_id)['status'] == QUEUED
+
+    # El worker colgado ya no puede reportar ni cerrar el trabajo
+    with pytest.raises(JobCancelled):
+        job_queue.progress(job_id, 1)
+    job_queue.finish(job_id, DONE)
+    assert job_queue.get(job_id)['status'] == QUEUED
+    job_queue.cancel(job_id)
+
+
+def test_recent_heartbeat_is_kept(app_context):
+    job_id = job_queue.submit('export', {'tabla': 'pacientes'})
+    job_queue.claim()
+    assert job_queue.recover() == 0
+    job_queue.finish(job_id, DONE)
+    assert job_queue.get(job_id)['status'] == DONE
+
+
+def test_uploaded_file_is_validated(app, client, auth_headers, rows):
+    rows.loc[1, 'age'] = 200
+    rows.loc[3, 'sex'] = 'X'
+    job_id = _submit_file(client, auth_headers, rows)
+    assert work(app, max_jobs=1) == 1
+
+    job = job_queue.get(job_id)
+    assert job['status'] == FAILED
+    assert '[1].age: Must be an integer between 0 and 120' in job['message']
+    assert "[3].sex: Must be a string (one of ['M', 'F'])" in job['message']
+
+
+def test_uploaded_file_with_valid_rows(app, client, auth_headers, rows):
+    job_id = _submit_file(client, auth_headers, rows)
+    assert work(app, max_jobs=1) == 1
+
+    job = job_queue.get(job_id)
+    assert job['status'] == DONE, job['message']
+    assert len(pd.read_csv(os.path.join(job_queue.job_dir(job_id), job['result']))) == len(rows)
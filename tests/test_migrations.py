@@ -0,0 +1,123 @@
+import pytest
+from sqlalchemy import create_engine, event, inspect, select
+
+from app import db
+from app.migrations import MIGRATIONS, current_version, missing_schema, upgrade
+
+# Esquema creado por db.create_all() antes de las migraciones versionadas (SQLite)
+BASELINE_SCHEMA = [
+    """CREATE TABLE usuarios (
+        id_usuario INTEGER NOT NULL, email VARCHAR(120), password VARCHAR(128),
+        created_at DATETIME, updated_at DATETIME,
+        PRIMARY KEY (id_usuario))""",
+    'CREATE INDEX ix_usuarios_id_usuario ON usuarios (id_usuario)',
+    'CREATE UNIQUE INDEX ix_usuarios_email ON usuarios (email)',
+    """CREATE TABLE pacientes (
+        id_paciente INTEGER NOT NULL, nombre VARCHAR(120), nombre_segundo VARCHAR(120),
+        apellido_paterno VARCHAR(120), apellido_materno VARCHAR(120), curp VARCHAR(18),
+        telefono VARCHAR(15), direccion VARCHAR(120), estado VARCHAR(120), ciudad VARCHAR(120),
+        estado_civil VARCHAR(120), ocupacion VARCHAR(120), id_usuario INTEGER,
+        created_at DATETIME, updated_at DATETIME,
+        PRIMARY KEY (id_paciente), UNIQUE (curp),
+        FOREIGN KEY(id_usuario) REFERENCES usuarios (id_usuario) ON DELETE CASCADE)""",
+    'CREATE INDEX ix_pacientes_id_paciente ON pacientes (id_paciente)',
+    """CREATE TABLE expedientes (
+        id_expediente INTEGER NOT NULL, id_paciente INTEGER, fecha_creacion DATETIME,
+        descripcion VARCHAR(120), token_unico VARCHAR(36),
+        PRIMARY KEY (id_expediente),
+        FOREIGN KEY(id_paciente) REFERENCES pacientes (id_paciente) ON DELETE CASCADE, UNIQUE (token_unico))""",
+    'CREATE INDEX ix_expedientes_id_expediente ON expedientes (id_expediente)',
+    """CREATE TABLE modificaciones_expedientes (
+        id_modificacion INTEGER NOT NULL, id_expediente INTEGER, fecha_modificacion DATETIME,
+        descripcion VARCHAR(120),
+        PRIMARY KEY (id_modificacion),
+        FOREIGN KEY(id_expediente) REFERENCES expedientes (id_expediente) ON DELETE CASCADE)""",
+    'CREATE INDEX ix_modificaciones_expedientes_id_modificacion ON modificaciones_expedientes (id_modificacion)',
+    """CREATE TABLE historias_clinicas (
+        id_historia_clinica INTEGER NOT NULL, id_expediente INTEGER, motivo_consulta VARCHAR(120),
+        fecha_registro DATETIME,
+        PRIMARY KEY (id_historia_clinica),
+        FOREIGN KEY(id_expediente) REFERENCES expedientes (id_expediente) ON DELETE CASCADE)""",
+    'CREATE INDEX ix_historias_clinicas_id_historia_clinica ON historias_clinicas (id_historia_clinica)',
+    """CREATE TABLE antecedentes_personales (
+        id_antecedente_personal INTEGER NOT NULL, id_expediente INTEGER, descripcion VARCHAR(120),
+        fecha_registro DATETIME,
+        PRIMARY KEY (id_antecedente_personal),
+        FOREIGN KEY(id_expediente) REFERENCES expedientes (id_expediente) ON DELETE CASCADE)""",
+    'CREATE INDEX ix_antecedentes_personales_id_antecedente_personal '
+    'ON antecedentes_personales (id_antecedente_personal)',
+    """CREATE TABLE antecedentes_familiares (
+        id_antecedente_familiar INTEGER NOT NULL, id_expediente INTEGER, descripcion VARCHAR(120),
+        fecha_registro DATETIME,
+        PRIMARY KEY (id_antecedente_familiar),
+        FOREIGN KEY(id_expediente) REFERENCES expedientes (id_expediente) ON DELETE CASCADE)""",
+    'CREATE INDEX ix_antecedentes_familiares_id_antecedente_familiar '
+    'ON antecedentes_familiares (id_antecedente_familiar)',
+]
+
+
+def _sqlite_engine(path):
+    engine = create_engine(f'sqlite:///{path}')
+    event.listen(engine, 'connect', lambda conn, record: conn.execute('PRAGMA foreign_keys=ON'))
+    return engine
+
+
+@pytest.fixture
+def baseline_engine(tmp_path):
+    engine = _sqlite_engine(tmp_path / 'baseline.db')
+    with engine.begin() as conn:
+        for statement in BASELINE_SCHEMA:
+            conn.exec_driver_sql(statement)
+        conn.exec_driver_sql("INSERT INTO usuarios (id_usuario, email) VALUES (1, 'a@b.mx')")
+        conn.exec_driver_sql("INSERT INTO pacientes (id_paciente, nombre, id_usuario) VALUES (1, 'Ana', 1)")
+        conn.exec_driver_sql("INSERT INTO expedientes (id_expediente, id_paciente, descripcion) VALUES (1, 1, 'x')")
+    yield engine
+    engine.dispose()
+
+
+def test_upgrade_from_baseline(app_context, baseline_engine):
+    with baseline_engine.connect() as conn:
+        assert current_version(conn) == 0
+        assert 'documentos_pacientes' in missing_schema(conn)
+
+    applied = upgrade(log=lambda message: None, engine=baseline_engine)
+
+    assert applied == [version for version, _, _ in MIGRATIONS]
+    with baseline_engine.connect() as conn:
+        assert current_version(conn) == MIGRATIONS[-1][0]
+        assert missing_schema(conn) == []
+        indexes = {index['name'] for index in inspect(conn).get_indexes('modificaciones_expedientes')}
+        assert 'ix_modificaciones_expediente_fecha' in indexes
+        assert 'ix_tokens_revocados_revocado_en' in {
+            index['name'] for index in inspect(conn).get_indexes('tokens_revocados')}
+        # Las filas existentes conservan sus datos y reciben el valor por omision de las columnas nuevas
+        pacientes = db.metadata.tables['pacientes']
+        assert conn.execute(select(pacientes.c.nombre, pacientes.c.version)).all() == [('Ana', 1)]
+
+
+def test_upgrade_is_idempotent(app_context, baseline_engine):
+    upgrade(target=3, log=lambda message: None, engine=baseline_engine)
+    with baseline_engine.connect() as conn:
+        assert current_version(conn) == 3
+
+    assert upgrade(log=lambda message: None, engine=baseline_engine) == [4, 5, 6]
+    assert upgrade(log=lambda message: None, engine=baseline_engine) == []
+    # Volver a aplicar cada migracion sobre el esquema completo no falla (checkfirst)
+    with baseline_engine.begin() as conn:
+        for _, _, migrate in MIGRATIONS:
+            migrate(conn)
+
+
+def test_upgrade_empty_database(app_context, tmp_path):
+    engine = _sqlite_engine(tmp_path / 'empty.db')
+    assert upgrade(log=lambda message: None, engine=engine) == [version for version, _, _ in MIGRATIONS]
+    with engine.connect() as conn:
+        assert current_version(conn) == MIGRATIONS[-1][0]
+        assert missing_schema(conn) == []
+    engine.dispose()
+
+
+def test_schema_check_command(app):
+    result = app.test_cli_runner().invoke(args=['schema', 'check'])
+    assert result.exit_code == 0, result.output
+    assert 'Todas las tablas y columnas' in result.output
@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import insert
+
+from app import db
+from app.models import Expediente, ModificacionExpediente, Paciente
+from app.pagination import PageError, decode_cursor, encode_cursor
+
+
+@pytest.fixture
+def id_expediente(app_context):
+    paciente = Paciente.create_paciente(
+        nombre='Ana', apellido_paterno='Lopez', apellido_materno='Diaz', curp=None, telefono=None,
+        direccion=None, estado='Jalisco', ciudad='Zapopan', estado_civil=None, ocupacion=None, id_usuario=None)
+    expediente = Expediente.create_expediente(paciente.id_paciente, 'Paginacion')
+    base = datetime(2026, 3, 1, 12, 0, 0, 250000)
+    # Varias filas con la misma fecha: el cursor desempata por id_modificacion
+    fechas = [base - timedelta(minutes=i // 3) for i in range(10)]
+    db.session.execute(insert(ModificacionExpediente.__table__), [
+        {'id_expediente': expediente.id_expediente, 'descripcion': f'm{i}', 'fecha_modificacion': fecha}
+        for i, fecha in enumerate(fechas)
+    ])
+    db.session.commit()
+    return expediente.id_expediente
+
+
+def test_cursor_round_trip():
+    fecha = datetime(2026, 3, 1, 12, 30, 15, 123456)
+    cursor = encode_cursor(fecha, 42)
+    assert decode_cursor(cursor) == (fecha, 42)
+    # Seguro en la URL sin escapar
+    assert '/' not in cursor and '+' not in cursor
+
+
+@pytest.mark.parametrize('cursor', ['nope', 'e30=', encode_cursor(datetime(2026, 1, 1), 1)[:-4] + '!!!!'])
+def test_invalid_cursor(cursor):
+    with pytest.raises(PageError):
+        decode_cursor(cursor)
+
+
+def test_pages_follow_cursor(client, id_expediente):
+    seen = []
+    cursor = None
+    for _ in range(10):
+        query = {'id_expediente': id_expediente, 'limit': 3}
+        if cursor:
+            query['cursor'] = cursor
+        response = client.get('/expediente/modificacion', query_string=query)
+        assert response.status_code == 200
+        page = response.get_json()
+        assert len(page['items']) <= 3
+        seen += [(item['fecha_modificacion'], item['id_modificacion']) for item in page['items']]
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+
+    # Cada fila una sola vez, de la mas reciente a la mas antigua por (fecha, id)
+    assert len(seen) == 10
+    assert len(set(seen)) == 10
+    assert seen == sorted(seen, reverse=True)
+
+
+def test_invalid_cursor_is_400(client):
+    response = client.get('/expediente/modificacion', query_string={'cursor': 'nope'})
+    assert response.status_code == 400
+    assert response.get_json()['message'] == 'cursor inválido'
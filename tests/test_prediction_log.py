@@ -0,0 +1,84 @@
+import os
+
+import numpy as np
+import pyarrow.parquet as pq
+import pytest
+
+from app.prediction_log import PredictionLog
+
+
+@pytest.fixture
+def log(tmp_path):
+    log = PredictionLog()
+    log.app = object()
+    log.enabled = True
+    log.directory = str(tmp_path)
+    log.capacity = 4
+    log.batch_size = 2
+    log.rotate_rows = 100
+    log.rotate_seconds = 3600
+    log.configure(['age', 'sex'], ['gripe', 'covid'])
+    # Sin hilo escritor: las pruebas llaman a flush()
+    log._pid = os.getpid()
+    return log
+
+
+def _record(log, age):
+    return log.record({'age': age, 'sex': 'F'}, np.array([0.2, 0.8]))
+
+
+def _files(log, suffix='.parquet'):
+    return sorted(name for name in os.listdir(log.directory) if name.endswith(suffix))
+
+
+def test_failed_write_goes_back_to_buffer(log, monkeypatch):
+    for age in (1, 2, 3):
+        _record(log, age)
+    with monkeypatch.context() as patch:
+        patch.setattr(pq, 'ParquetWriter', _broken_writer)
+        with pytest.raises(OSError):
+            log.flush()
+    assert [record[2]['age'] for record in log._buffer] == [1, 2, 3]
+    assert log.dropped == 0
+
+    log.close()
+    [name] = _files(log)
+    assert pq.read_table(os.path.join(log.directory, name)).column('age').to_pylist() == [1, 2, 3]
+
+
+def test_failed_write_beyond_capacity_is_counted(log, monkeypatch):
+    for age in (1, 2, 3, 4):
+        _record(log, age)
+
+    def busy_writer(*args, **kwargs):
+        # El buffer se llena otra vez mientras el lote fallido se escribe
+        _record(log, 5)
+        _record(log, 6)
+        _broken_writer()
+
+    monkeypatch.setattr(pq, 'ParquetWriter', busy_writer)
+    with pytest.raises(OSError):
+        log.flush()
+    assert [record[2]['age'] for record in log._buffer] == [3, 4, 5, 6]
+    assert log.dropped == 2
+
+
+def test_inprogress_files_are_recovered(log):
+    complete = os.path.join(log.directory, f'predictions-20260101T000000-{os.getpid()}-1.parquet')
+    _record(log, 7)
+    log._path = complete
+    log._write(log._to_table(log._drain()))
+    log._writer.close()
+    log._writer = None
+    broken = os.path.join(log.directory, f'predictions-20260101T000001-{os.getpid()}.parquet.inprogress')
+    with open(broken, 'wb') as f:
+        f.write(b'PAR1 sin pie')
+
+    log._recover()
+    assert _files(log, '.inprogress') == []
+    [name] = _files(log)
+    assert pq.read_table(os.path.join(log.directory, name)).column('age').to_pylist() == [7]
+
+
+def _broken_writer(*args, **kwargs):
+    raise OSError('No space left on device')
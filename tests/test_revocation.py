@@ -0,0 +1,98 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db
+from app.models import TokenRevocado
+from app.revocation import BloomFilter, RevocationList
+
+
+@pytest.fixture
+def worker(app, app_context):
+    """A second worker's revocation list, with its own filter."""
+    revocations = RevocationList()
+    revocations.app = app
+    revocations.enabled = True
+    revocations.capacity = 1000
+    revocations.error_rate = 0.001
+    revocations.sync_interval = 0
+    revocations.sync_margin = 60
+    return revocations
+
+
+def _revoked_row(id_token=None, revocado_en=None):
+    jti = str(uuid.uuid4())
+    db.session.add(TokenRevocado(id_token=id_token, jti=jti, expira=datetime.utcnow() + timedelta(hours=1),
+                                 revocado_en=revocado_en or datetime.utcnow()))
+    db.session.commit()
+    return jti
+
+
+def test_bloom_filter():
+    bloom = BloomFilter(10000, 0.01)
+    keys = [str(uuid.uuid4()) for _ in range(10000)]
+    for key in keys:
+        bloom.add(key)
+    assert all(key in bloom for key in keys)
+    assert bloom.full
+    false_positives = sum(str(uuid.uuid4()) in bloom for _ in range(10000))
+    assert false_positives < 300
+
+
+def test_logout_revokes_token(client, auth_headers):
+    assert client.get('/auth/protected', headers=auth_headers).status_code == 200
+    assert client.post('/auth/logout', headers=auth_headers).status_code == 200
+
+    response = client.get('/auth/protected', headers=auth_headers)
+    assert response.status_code == 401
+    assert response.get_json()['msg'] == 'Token has been revoked'
+
+
+def test_missing_or_malformed_token(client):
+    assert client.get('/auth/protected').status_code == 401
+    assert client.get('/auth/protected', headers={'Authorization': 'Bearer abc'}).status_code == 422
+
+
+def test_other_tokens_still_valid(client, signup):
+    first, second = signup(), signup()
+    client.post('/auth/logout', headers={'Authorization': f'Bearer {first}'})
+    assert client.get('/auth/protected', headers={'Authorization': f'Bearer {second}'}).status_code == 200
+
+
+def test_worker_sees_revocations_from_others(worker):
+    worker.sync()
+    jti = _revoked_row()
+    assert worker.is_revoked(jti)
+    assert not worker.is_revoked(str(uuid.uuid4()))
+
+
+def test_sync_catches_late_commits(worker):
+    # Una transaccion obtiene un id y tarda en confirmarse; otra con un id mayor se confirma antes
+    reserved = db.session.execute(db.select(db.func.coalesce(db.func.max(TokenRevocado.id_token), 0))).scalar() + 1
+    started_at = datetime.utcnow() - timedelta(seconds=5)
+    later = _revoked_row(id_token=reserved + 1)
+    worker.sync()
+    assert worker.is_revoked(later)
+
+    late = _revoked_row(id_token=reserved, revocado_en=started_at)
+    assert worker.is_revoked(late)
+
+
+def test_overlapping_syncs_do_not_refill_filter(worker):
+    worker.sync()
+    _revoked_row()
+    worker.sync()
+    entries = worker.stats()['filter_entries']
+    worker.sync()
+    worker.sync()
+    assert worker.stats()['filter_entries'] == entries
+
+
+def test_purge_removes_expired(app_context):
+    jti = str(uuid.uuid4())
+    db.session.add(TokenRevocado(jti=jti, expira=datetime.utcnow() - timedelta(seconds=1)))
+    db.session.commit()
+    from app import revocation
+    assert revocation.purge() >= 1
+    assert db.session.execute(db.select(TokenRevocado).where(TokenRevocado.jti == jti)).first() is None
@@ -0,0 +1,124 @@
+import pytest
+from flask_restx import Model, fields
+
+from app.ai import prediction_input, prediction_validator
+from app.expediente import paciente_model
+from app.validation import compile_model
+
+direccion = Model('Direccion', {
+    'calle': fields.String(required=True, min_length=1),
+    'cp': fields.String(pattern=r'^[0-9]{5}$'),
+})
+
+registro = Model('Registro', {
+    'edad': fields.Integer(required=True, min=0, max=120),
+    'peso': fields.Float(min=0, exclusiveMin=True),
+    'activo': fields.Boolean,
+    'sexo': fields.String(enum=['M', 'F']),
+    'etiquetas': fields.List(fields.String(max_length=3), max_items=2),
+    'direccion': fields.Nested(direccion),
+})
+
+estricto = Model('Estricto', {'a': fields.Integer}, strict=True)
+
+
+@pytest.fixture(scope='module')
+def validator():
+    return compile_model(registro)
+
+
+def test_valid_payload(validator):
+    assert validator.validate({'edad': 30, 'peso': 70.5, 'activo': True, 'sexo': 'F',
+                               'etiquetas': ['a', 'bc'], 'direccion': {'calle': 'Juarez', 'cp': '44100'}}) == {}
+
+
+def test_optional_fields_may_be_null(validator):
+    assert validator.validate({'edad': 30, 'peso': None, 'sexo': None, 'direccion': None}) == {}
+
+
+def test_every_error_is_reported(validator):
+    errors = validator.validate({
+        'peso': 0, 'activo': 1, 'sexo': 'X', 'etiquetas': ['abcd'],
+        'direccion': {'cp': '4410'},
+    })
+    assert errors == {
+        'edad': 'Missing required field',
+        'peso': 'Must be a number > 0',
+        'activo': 'Must be a boolean',
+        'sexo': "Must be a string (one of ['M', 'F'])",
+        'etiquetas': 'Must be a list of 0 to 2 items where each item must be a string (at most 3 characters)',
+        'direccion.calle': 'Missing required field',
+        'direccion.cp': 'Must be a string (matching ^[0-9]{5}$)',
+    }
+
+
+@pytest.mark.parametrize('edad', [-1, 121, '30', 30.0, True])
+def test_integer_bounds_and_types(validator, edad):
+    assert validator.validate({'edad': edad}) == {'edad': 'Must be an integer between 0 and 120'}
+
+
+@pytest.mark.parametrize('field,valor,message', [
+    (fields.Float(min=0, max=1, exclusiveMax=True), 1, 'Must be a number >= 0 and < 1'),
+    (fields.Float(min=0, max=1, exclusiveMin=True, exclusiveMax=True), 0, 'Must be a number > 0 and < 1'),
+    (fields.Integer(max=10, exclusiveMax=True), 10, 'Must be an integer < 10'),
+    (fields.Integer(max=10), 11, 'Must be an integer <= 10'),
+])
+def test_exclusive_bounds_in_message(field, valor, message):
+    assert compile_model(Model('Limites', {'x': field})).validate({'x': valor}) == {'x': message}
+
+
+@pytest.mark.parametrize('payload', [None, [], 'x', 3])
+def test_payload_must_be_an_object(validator, payload):
+    assert validator.validate(payload) == {'payload': 'Must be an object'}
+
+
+def test_strict_models_reject_unknown_fields():
+    assert compile_model(estricto).validate({'a': 1, 'b': 2}) == {'b': 'Unknown field'}
+
+
+def test_partial_skips_required(validator):
+    assert compile_model(registro, partial=True).validate({}) == {}
+    assert validator.validate({}) == {'edad': 'Missing required field'}
+
+
+def test_batches(validator):
+    errors = validator.validate([{'edad': 1}, {'edad': -5}, 'x'], many=True)
+    assert errors == {'[1].edad': 'Must be an integer between 0 and 120', '[2]': 'Must be an object'}
+    assert validator.validate([], many=True) == {'payload': 'Must be a non-empty list'}
+    assert validator.validate([{'edad': 1}] * 3, many=True, max_items=2) == {'payload': 'Must have at most 2 items'}
+    # Un objeto suelto tambien es valido con many
+    assert validator.validate({'edad': 1}, many=True) == {}
+
+
+def test_prediction_validator_matches_model():
+    errors = prediction_validator.validate({'age': 200, 'sex': 'X', 'fever': 2})
+    assert errors['age'] == 'Must be an integer between 0 and 120'
+    assert errors['sex'] == "Must be a string (one of ['M', 'F'])"
+    assert errors['fever'] == 'Must be an integer between 0 and 1'
+    assert errors['cough'] == 'Missing required field'
+    assert set(errors) == {'age', 'sex', 'fever'} | {
+        name for name, field in prediction_input.items() if field.required and name not in ('age', 'sex', 'fever')}
+
+
+@pytest.mark.parametrize('telefono,valido', [
+    ('3312345678', True), ('+523312345678', True), ('+12345678901234', True),
+    ('123456789', False), ('123456789012345', False), ('33-1234-5678', False),
+])
+def test_telefono_pattern(telefono, valido):
+    errors = compile_model(paciente_model, partial=True).validate({'telefono': telefono})
+    assert (errors == {}) is valido
+
+
+def test_validated_endpoint_returns_400_with_errors(client):
+    response = client.post('/expediente/paciente', json={'curp': 'ABC', 'telefono': '12', 'id_usuario': 0})
+    assert response.status_code == 400
+    body = response.get_json()
+    assert body['message'] == 'Input payload validation failed'
+    assert set(body['errors']) >= {'curp', 'telefono', 'id_usuario'}
+
+
+def test_qr_job_rejects_malformed_ids(client, auth_headers):
+    for payload in ({'id_expedientes': 'abc'}, {'id_expedientes': {'a': 1}}, {'id_expedientes': [1, 'x']}):
+        response = client.post('/api/jobs/qr', json=payload, headers=auth_headers)
+        assert response.status_code == 400
+        assert 'id_expedientes' in response.get_json()['errors']